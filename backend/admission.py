@@ -0,0 +1,209 @@
+# admission.py
+#
+# Admission control for PDF generation. Each review has a gate that lets at
+# most `limit` renders run at once on this host; further requests wait in a
+# bounded queue, and when the queue is full (or the wait runs out) the
+# caller gets Busy with a Retry-After estimate instead of another thread and,
+# for Review IV, another LibreOffice process.
+#
+# The limit holds across processes: under gunicorn every worker has its own
+# gates, so a render also needs one of `limit` slot files (flock) in
+# ADMISSION_DIR that all workers share; a process that dies gives its slots
+# back. With workers x threads request threads in all (gunicorn.conf.py),
+# each worker only ever queues GUNICORN_THREADS requests itself: there the
+# wait timeout, not the queue size, is what turns requests away with 429.
+# Without flock (Windows, waitress: one process) the gates alone apply.
+#
+# Interactive requests (a reviewer clicking "Generate PDF") go ahead of bulk
+# ones (batch generation sent with "X-Priority: bulk", and dossiers, which
+# are bulk unless sent with "X-Priority: interactive"): waiting
+# interactive requests are admitted first, and bulk renders never take the
+# last free slot.
+#
+#   REVIEW_PDF_CONCURRENCY     renders per review on the host (default: CPUs)
+#   REVIEW4_PDF_CONCURRENCY    the same for Review IV / LibreOffice (default 2)
+#   REVIEW_PDF_QUEUE           waiting requests per review and process (default 4 x limit)
+#   REVIEW_PDF_QUEUE_TIMEOUT   seconds a request may wait (default 15)
+#   REVIEW_ADMISSION_DIR       where the slot files live (default cache/admission)
+
+import os
+import math
+import time
+import threading
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+from collections import deque
+from contextlib import contextmanager
+import backend.metrics as metrics
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+
+DEFAULT_LIMIT = int(os.environ.get('REVIEW_PDF_CONCURRENCY', os.cpu_count() or 2))
+LIMITS = {4: int(os.environ.get('REVIEW4_PDF_CONCURRENCY', 2))}
+QUEUE_SIZE = os.environ.get('REVIEW_PDF_QUEUE')
+QUEUE_TIMEOUT = float(os.environ.get('REVIEW_PDF_QUEUE_TIMEOUT', 15))
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ADMISSION_DIR = os.environ.get('REVIEW_ADMISSION_DIR', os.path.join(BASE_DIR, 'cache', 'admission'))
+SLOT_POLL = 0.1  # how often a request admitted here retries for a slot another process holds
+
+
+class Busy(Exception):
+    """No render slot; retry after `retry_after` seconds."""
+
+    def __init__(self, retry_after, reason):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+class HostSlots:
+    """`limit` render slots shared by the processes of the host: slot i is taken
+    while some process holds an flock on its file. Not thread-safe; the gate
+    calls it under its lock."""
+
+    def __init__(self, name, limit, directory=ADMISSION_DIR):
+        self.directory = directory
+        self.paths = [os.path.join(directory, f"review{name}-{i}.lock") for i in range(limit)]
+        self._files = None
+        self._pid = None
+        self._held = set()  # slots this process holds; its own flock would be granted again
+
+    def _open(self):
+        if self._pid != os.getpid():  # an inherited descriptor would share the parent's locks
+            os.makedirs(self.directory, exist_ok=True)
+            self._files = [open(path, 'a') for path in self.paths]
+            self._pid = os.getpid()
+            self._held = set()
+        return self._files
+
+    def take(self, count):
+        """Lock a free slot among the first `count`; its index, or None."""
+        files = self._open()
+        for index in range(min(count, len(files))):
+            if index in self._held:
+                continue
+            try:
+                fcntl.flock(files[index], fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:  # held by another process
+                continue
+            self._held.add(index)
+            return index
+        return None
+
+    def give(self, index):
+        self._held.discard(index)
+        fcntl.flock(self._files[index], fcntl.LOCK_UN)
+
+
+class Gate:
+    def __init__(self, name, limit, queue_size=None, timeout=QUEUE_TIMEOUT, host_wide=fcntl is not None):
+        self.name = name
+        self.limit = max(1, limit)
+        self.queue_size = queue_size if queue_size is not None else 4 * self.limit
+        self.timeout = timeout
+        self.bulk_limit = max(1, self.limit - 1)  # keep a slot for interactive requests
+        self.active = {INTERACTIVE: 0, BULK: 0}
+        self.waiting = {INTERACTIVE: deque(), BULK: deque()}
+        self.avg_seconds = 1.0  # moving average of render time, for Retry-After
+        self.host_slots = HostSlots(name, self.limit) if host_wide else None
+        self._cond = threading.Condition()
+
+    def _can_start(self, priority, ticket):
+        if self.waiting[priority][0] is not ticket:
+            return False  # first come, first served within a priority
+        running = self.active[INTERACTIVE] + self.active[BULK]
+        if priority == INTERACTIVE:
+            return running < self.limit
+        return not self.waiting[INTERACTIVE] and running < self.limit and self.active[BULK] < self.bulk_limit
+
+    def _queued(self):
+        return len(self.waiting[INTERACTIVE]) + len(self.waiting[BULK])
+
+    def retry_after(self):
+        return max(1, math.ceil(self.avg_seconds * (self._queued() + 1) / self.limit))
+
+    def _reject(self, priority, reason):
+        metrics.PDF_REJECTED.inc(review=self.name, priority=priority)
+        raise Busy(self.retry_after(), reason)
+
+    def _take_host_slot(self, priority):
+        """A slot file, or None if other processes hold them; bulk leaves the last one."""
+        return self.host_slots.take(self.limit if priority == INTERACTIVE else self.bulk_limit)
+
+    def acquire(self, priority=INTERACTIVE):
+        """Wait for a render slot; returns the host slot taken (None without host slots)."""
+        ticket = object()
+        host_slot = None
+        with self._cond:
+            queue = self.waiting[priority]
+            queue.append(ticket)
+            metrics.PDF_JOBS.inc(review=self.name)
+            deadline = time.monotonic() + self.timeout
+            try:
+                if not self._can_start(priority, ticket) and self._queued() > self.queue_size:
+                    self._reject(priority, 'queue full')
+                while True:
+                    wait = None
+                    if self._can_start(priority, ticket):
+                        if self.host_slots is None:
+                            break
+                        host_slot = self._take_host_slot(priority)
+                        if host_slot is not None:
+                            break
+                        wait = SLOT_POLL  # another process frees it without notifying us
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._reject(priority, 'timed out waiting for a render slot')
+                    self._cond.wait(remaining if wait is None else min(wait, remaining))
+            finally:
+                queue.remove(ticket)
+                metrics.PDF_JOBS.dec(review=self.name)
+                self._cond.notify_all()  # the next ticket may now be at the head
+            self.active[priority] += 1
+        metrics.PDF_ACTIVE.inc(review=self.name)
+        return host_slot
+
+    def release(self, priority, seconds, host_slot=None):
+        metrics.PDF_ACTIVE.dec(review=self.name)
+        with self._cond:
+            if host_slot is not None:
+                self.host_slots.give(host_slot)
+            self.active[priority] -= 1
+            self.avg_seconds = 0.8 * self.avg_seconds + 0.2 * seconds
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority=INTERACTIVE):
+        """Hold a render slot for the block; raises Busy if none comes free in time."""
+        host_slot = self.acquire(priority)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(priority, time.perf_counter() - start, host_slot)
+
+
+_gates = {}
+_gates_lock = threading.Lock()
+
+
+def gate(review_num):
+    if review_num not in _gates:
+        with _gates_lock:
+            if review_num not in _gates:
+                limit = LIMITS.get(review_num, DEFAULT_LIMIT)
+                _gates[review_num] = Gate(review_num, limit, int(QUEUE_SIZE) if QUEUE_SIZE else None)
+    return _gates[review_num]
+
+
+def slot(review_num, priority=INTERACTIVE):
+    return gate(review_num).slot(priority)
+
+
+def priority_of(request, default=INTERACTIVE):
+    """The request's X-Priority (interactive or bulk), else `default`."""
+    priority = request.headers.get('X-Priority', '').lower()
+    return priority if priority in (INTERACTIVE, BULK) else default
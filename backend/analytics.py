@@ -0,0 +1,154 @@
+# analytics.py
+#
+# Cohort-wide statistics over the stored review marks (see review_marks.py):
+# per-student totals, section averages, percentiles, z-scores and evaluator
+# leniency. Everything is computed column-wise with pandas/NumPy on a
+# students x (review, criterion) score matrix. Results are cached in
+# shared_cache per data version, which is bumped whenever marks or project
+# assignments change.
+
+import time
+import logging
+import backend.sheet1 as sheet1
+import backend.shared_cache as shared_cache
+import backend.review_marks as review_marks
+
+logger = logging.getLogger(__name__)
+
+CACHE_TTL = 3600  # safety net for edits made outside the app
+PERCENTILES = (10, 25, 50, 75, 90)
+STUDENT_KEY = ['group_id', 'member_no']
+
+
+def load_frames():
+    """Read marks, projects and members with one query each."""
+    import pandas as pd
+    conn = sheet1.connect_db()
+    cursor = conn.cursor()
+    try:
+        review_marks.ensure_table(cursor)
+        frames = {}
+        for name, query in (
+            ('marks', "SELECT group_id, review_no, member_no, criterion, marks FROM review_marks"),
+            ('projects', "SELECT group_id, evaluator1_name, evaluator2_name FROM projects"),
+            # in sheet order: member_no below is the position within the group
+            ('members', "SELECT group_id, roll_no, student_name FROM members ORDER BY group_id, id"),
+        ):
+            cursor.execute(query)
+            frames[name] = pd.DataFrame(cursor.fetchall(), columns=[d[0] for d in cursor.description])
+    finally:
+        cursor.close()
+        conn.close()
+    return frames['marks'], frames['projects'], frames['members']
+
+
+def compute_analytics(marks, projects, members):
+    """Cohort statistics from the three frames; returns a JSON-ready dict."""
+    import numpy as np
+    import pandas as pd
+
+    if marks.empty:
+        return {"student_count": 0, "reviews": {}, "overall_percentiles": {}, "sections": [], "students": [], "evaluators": []}
+
+    marks = marks.assign(marks=marks['marks'].astype(float), review_no=marks['review_no'].astype(int),
+                         member_no=marks['member_no'].astype(int))
+
+    # students x (review, criterion) score matrix; NaN where a cell has no mark
+    matrix = marks.pivot_table(index=STUDENT_KEY, columns=['review_no', 'criterion'], values='marks', aggfunc='sum')
+    totals = matrix.T.groupby(level='review_no').sum(min_count=1).T  # students x review
+    review_cols = list(totals.columns)
+    values = totals.to_numpy(dtype=float)
+
+    mean = np.nanmean(values, axis=0)
+    std = np.nanstd(values, axis=0)
+    z = (values - mean) / np.where(std > 0, std, np.nan)
+
+    overall = np.nansum(values, axis=1)
+    # percentile rank of the overall total (100 = top of the cohort)
+    percentile_rank = pd.Series(overall).rank(pct=True, method='average').to_numpy() * 100
+
+    students = totals.reset_index()[STUDENT_KEY]
+    for i, review_no in enumerate(review_cols):
+        students[f'review{review_no}'] = values[:, i]
+        students[f'z{review_no}'] = z[:, i]
+    students['total'] = overall
+    students['percentile'] = percentile_rank
+    students['mean_z'] = pd.DataFrame(z).mean(axis=1).to_numpy()  # skips NaN without warnings
+    students['raw_delta'] = pd.DataFrame(values - mean).mean(axis=1).to_numpy()
+
+    # member_no is the member's position in the group as printed on the sheet
+    if not members.empty:
+        members = members.assign(member_no=members.groupby('group_id').cumcount() + 1)
+        students = students.merge(members, on=STUDENT_KEY, how='left')
+
+    # Section (review, criterion) averages over every student that has the cell
+    sections = (
+        matrix.agg(['mean', 'std', 'min', 'max', 'count']).T
+        .reset_index()
+        .sort_values(['review_no', 'criterion'], key=lambda col: pd.to_numeric(col, errors='coerce'))
+        .astype({'count': int})
+    )
+
+    reviews = {}
+    for i, review_no in enumerate(review_cols):
+        column = values[:, i]
+        column = column[~np.isnan(column)]
+        reviews[str(review_no)] = {
+            "mean": round(float(column.mean()), 3),
+            "std": round(float(column.std()), 3),
+            "students": int(column.size),
+            "percentiles": dict(zip(map(str, PERCENTILES), np.percentile(column, PERCENTILES).round(2).tolist())),
+        }
+
+    # Evaluator leniency: how far above/below the cohort their groups score, in
+    # z units and in raw marks per review
+    evaluators = []
+    if not projects.empty:
+        panel = projects.melt(id_vars='group_id', value_vars=['evaluator1_name', 'evaluator2_name'],
+                              value_name='evaluator')[['group_id', 'evaluator']]
+        panel['evaluator'] = panel['evaluator'].fillna('').astype(str).str.strip()
+        panel = panel[panel['evaluator'] != '']
+        per_group = students.groupby('group_id').agg(
+            mean_z=('mean_z', 'mean'), raw_delta=('raw_delta', 'mean'), students=('member_no', 'size')
+        )
+        scored = panel.merge(per_group, left_on='group_id', right_index=True, how='inner')
+        if not scored.empty:
+            leniency = scored.groupby('evaluator').agg(
+                groups=('group_id', 'nunique'),
+                students=('students', 'sum'),
+                leniency_z=('mean_z', 'mean'),
+                leniency_marks=('raw_delta', 'mean'),
+            ).reset_index().sort_values('leniency_z', ascending=False)
+            evaluators = _records(leniency)
+
+    return {
+        "student_count": int(len(students)),
+        "reviews": reviews,
+        "overall_percentiles": dict(zip(map(str, PERCENTILES), np.percentile(overall, PERCENTILES).round(2).tolist())),
+        "sections": _records(sections),
+        "students": _records(students.drop(columns='raw_delta').sort_values('total', ascending=False)),
+        "evaluators": evaluators,
+    }
+
+
+def _records(df):
+    """DataFrame -> list of dicts with NaN as None and values rounded for JSON."""
+    df = df.round(3).astype(object)
+    return df.where(df.notna(), None).to_dict(orient='records')
+
+
+def get_analytics(refresh=False):
+    """Analytics for the current data version, computed at most once per version."""
+    version = shared_cache.get_version('data')
+    if not refresh:
+        cached = shared_cache.get('analytics', version)
+        if cached is not None:
+            return cached
+
+    start = time.perf_counter()
+    result = compute_analytics(*load_frames())
+    result["version"] = version
+    result["computed_in_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    shared_cache.set('analytics', version, result, CACHE_TTL)
+    logger.info(f"Analytics for {result['student_count']} students computed in {result['computed_in_ms']} ms")
+    return result
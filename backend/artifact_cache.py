@@ -0,0 +1,140 @@
+# artifact_cache.py
+#
+# Content-addressed cache of generated review sheets. The key is a hash of
+# everything that determines the output:
+#
+#     (review number, template version, normalized form data, project row version)
+#
+# so re-downloading the same sheet serves the stored file instead of filling
+# and saving the template again. Files live on disk (shared by every worker
+# process) and the directory is kept under a size budget by evicting the
+# least recently used entries; a hit refreshes the file's mtime. Other
+# caches of PDF files (header_layer's bases) use the same functions with
+# their own directory and budget.
+
+import os
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.environ.get('REVIEW_ARTIFACT_DIR', os.path.join(BASE_DIR, 'generated_pdfs', 'cache'))
+MAX_BYTES = int(os.environ.get('REVIEW_ARTIFACT_MAX_MB', 512)) * 1024 * 1024
+
+_evict_lock = threading.Lock()
+
+
+def normalize_form_data(form_data):
+    """Canonical form of a request payload for hashing.
+
+    Values are compared as stripped strings and empty values are dropped,
+    because the fill treats a blank field and a missing one the same way.
+    """
+    normalized = {}
+    for key, value in (form_data or {}).items():
+        if value is None:
+            continue
+        value = str(value).strip()
+        if value:
+            normalized[str(key)] = value
+    return normalized
+
+
+def project_version(project_details):
+    """Hash of the project/member rows a sheet was filled from."""
+    payload = json.dumps(project_details, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def cache_key(review_num, template_version, form_data, project_details):
+    payload = json.dumps(
+        [review_num, template_version, normalize_form_data(form_data), project_version(project_details)],
+        sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _path(key, directory=None):
+    return os.path.join(directory or CACHE_DIR, f"{key}.pdf")
+
+
+def get(key, directory=None):
+    """Return the cached file path for `key`, or None."""
+    path = _path(key, directory)
+    try:
+        os.utime(path)  # mark as recently used
+    except FileNotFoundError:
+        return None
+    return path
+
+
+def put(key, source_path, directory=None, max_bytes=None):
+    """Move a generated file into the cache and return its cached path.
+
+    The file leaves the output directory, so generated sheets are only kept
+    within the cache's size budget.
+    """
+    return _store(key, lambda tmp_path: shutil.move(source_path, tmp_path), directory, max_bytes)
+
+
+def put_bytes(key, data, directory=None, max_bytes=None):
+    """Store a PDF given as bytes; returns its cached path."""
+    def write(tmp_path):
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+    return _store(key, write, directory, max_bytes)
+
+
+def _store(key, write, directory, max_bytes):
+    directory = directory or CACHE_DIR
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    os.close(fd)
+    path = _path(key, directory)
+    try:
+        write(tmp_path)  # a move is a rename unless the cache is on another filesystem
+        os.replace(tmp_path, path)  # atomic; concurrent writers of one key agree on content
+        os.utime(path)  # newest entry, not the first one evicted
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    evict(max_bytes, directory)
+    return path
+
+
+def evict(max_bytes=None, directory=None):
+    """Delete least recently used entries until the cache fits the budget."""
+    max_bytes = MAX_BYTES if max_bytes is None else max_bytes
+    directory = directory or CACHE_DIR
+    with _evict_lock:
+        entries = []
+        total = 0
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if entry.name.endswith('.pdf'):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+                        total += stat.st_size
+        except FileNotFoundError:
+            return 0
+
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                removed += 1
+            except FileNotFoundError:
+                pass
+        if removed:
+            logger.info(f"Evicted {removed} files from {directory} ({total} bytes kept)")
+        return removed
@@ -0,0 +1,293 @@
+# cli.py
+#
+# Offline mass generation of review sheets, without going through HTTP:
+#
+#   python -m backend.cli --review 1 --all
+#   python -m backend.cli --review 2 3 --track AI --marks marks.csv --out out/
+#   python -m backend.cli --review dossier --division A --workers 8
+#
+# Groups are selected with --all, --track, --division and --group (combined
+# with AND); with none of them, the groups in the marks file. Each sheet's
+# form is the group's stored draft or recorded marks (see dossier.review_form)
+# with the fields from the marks file on top:
+#
+#   JSON  {"BIA-01": {"1": {"1.1.1": "4", ...}, "2": {...}}, ...}
+#         or a list of rows like the CSV's
+#   CSV   one row per group and review: group_id, review, then form fields;
+#         without a review column a row applies to every --review. Blank
+#         cells are left out.
+#
+# Marks from the file are recorded, as generating the sheet on its page does.
+# Its group ids match the stored ones whatever their case; marks for a group
+# that isn't selected (or doesn't exist) are reported and not used.
+#
+# Sheets are rendered in a process pool and written to --out as
+# Review_<n>_<group>.pdf (Dossier_<group>.pdf). Every finished task is
+# appended to <out>/manifest.jsonl; a rerun skips the sheets the manifest
+# has as done with the same input, so an interrupted run picks up where it
+# stopped (--force renders everything again). Dossiers without some reviews
+# are recorded as partial and rendered again by the next run. Exits with 1
+# if any sheet failed.
+
+import os
+import sys
+import csv
+import json
+import time
+import shutil
+import hashlib
+import logging
+import argparse
+from collections import Counter
+from concurrent.futures import as_completed
+import backend.dossier as dossier
+import backend.render_pool as render_pool
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = 'manifest.jsonl'
+DOSSIER = 'dossier'
+
+
+# --- SELECTION ---
+def select_groups(all_groups=False, track=None, division=None, group_ids=None):
+    """Group ids matching every given filter, in order."""
+    import backend.storage as storage
+    clauses, params = [], []
+    if track:
+        clauses.append("p.group_id IN (SELECT group_id FROM panel_assignments WHERE track = %s)")
+        params.append(track)
+    if division:
+        clauses.append("p.division = %s")
+        params.append(division)
+    if group_ids:
+        clauses.append(f"p.group_id IN ({', '.join(['%s'] * len(group_ids))})")
+        params.extend(group_ids)
+    if not clauses and not all_groups:
+        return []
+
+    conn = storage.connect()
+    cursor = conn.cursor()
+    try:
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ''
+        cursor.execute(f"SELECT p.group_id FROM projects p{where} ORDER BY p.group_id", params)
+        return [row[0] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+        conn.close()
+
+
+# --- MARKS FILES ---
+def load_marks(path, reviews):
+    """Read a JSON or CSV marks file into {group_id: {review: fields}}."""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        if path.lower().endswith('.json'):
+            data = json.load(f)
+            if isinstance(data, dict):
+                return {str(group_id): {_review_key(review): fields for review, fields in by_review.items()}
+                        for group_id, by_review in data.items()}
+            rows = data
+        else:
+            rows = list(csv.DictReader(f))
+
+    marks = {}
+    for number, row in enumerate(rows, start=1):
+        group_id = str(row.get('group_id') or '').strip()
+        if not group_id:
+            raise ValueError(f"{path}: row {number} has no group_id")
+        fields = {key: value for key, value in row.items()
+                  if key not in ('group_id', 'review') and value is not None and str(value).strip()}
+        row_reviews = [_review_key(row['review'])] if str(row.get('review') or '').strip() else reviews
+        for review in row_reviews:
+            marks.setdefault(group_id, {}).setdefault(review, {}).update(fields)
+    return marks
+
+
+def match_marks(marks, group_ids):
+    """Key the marks by the selected group ids, matched case-insensitively as the
+    database does; returns (marks, [marks-file ids that matched no group])."""
+    selected = {group_id.upper(): group_id for group_id in group_ids}
+    matched, unmatched = {}, []
+    for group_id, by_review in marks.items():
+        key = selected.get(group_id.strip().upper())
+        if key is None:
+            unmatched.append(group_id)
+            continue
+        for review, fields in by_review.items():
+            matched.setdefault(key, {}).setdefault(review, {}).update(fields)
+    return matched, unmatched
+
+
+def _review_key(value):
+    value = str(value).strip().lower()
+    return DOSSIER if value == DOSSIER else int(value)
+
+
+# --- MANIFEST ---
+def fingerprint(review, fields):
+    payload = json.dumps([review, fields], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def read_manifest(out_dir):
+    """{(group_id, review): entry} of the last entry per sheet; a torn last line is ignored."""
+    entries = {}
+    try:
+        with open(os.path.join(out_dir, MANIFEST)) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                entries[entry['group_id'], _review_key(entry['review'])] = entry
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def is_done(entry, input_hash):
+    return (entry is not None and entry.get('status') == 'ok' and not entry.get('missing')  # older partial entries
+            and entry.get('input') == input_hash and os.path.isfile(entry.get('path') or ''))
+
+
+# --- TASKS ---
+def output_name(group_id, review):
+    safe_group = str(group_id).replace(os.sep, '_').replace('/', '_')
+    return f"Dossier_{safe_group}.pdf" if review == DOSSIER else f"Review_{review}_{safe_group}.pdf"
+
+
+def run_task(group_id, review, fields, destination):
+    """Render one sheet (or dossier) to `destination`; never raises, returns a manifest entry."""
+    start = time.perf_counter()
+    entry = {"group_id": group_id, "review": review, "path": destination}
+    try:
+        if review == DOSSIER:
+            result = dossier.build(group_id, {"reviews": fields or {}}, destination)
+            if result['missing']:
+                entry["missing"] = result['missing']
+        else:
+            form = dossier.review_form(group_id, review, fields)
+            path = dossier.generate(review, form)
+            shutil.move(path, destination)
+            dossier.record_marks(dossier.marks_to_record({review: form}, {review: fields}))
+        entry["status"] = 'partial' if entry.get("missing") else 'ok'
+    except Exception as e:
+        entry.update(status='failed', error=str(e) or type(e).__name__)
+    entry["seconds"] = round(time.perf_counter() - start, 3)
+    return entry
+
+
+def run(tasks, out_dir, workers, progress=True):
+    """Render the tasks [(group_id, review, fields, input_hash)]; yields manifest entries."""
+    from tqdm import tqdm
+
+    with open(os.path.join(out_dir, MANIFEST), 'a') as manifest, \
+            tqdm(total=len(tasks), unit='sheet', disable=not progress, dynamic_ncols=True) as bar:
+        failed = 0
+
+        def record(entry, input_hash):
+            nonlocal failed
+            entry["input"] = input_hash
+            manifest.write(json.dumps(entry) + '\n')
+            manifest.flush()  # a crash loses at most the sheets in flight
+            bar.update()
+            if entry['status'] == 'failed':
+                failed += 1
+                bar.set_postfix(failed=failed)
+            return entry
+
+        if workers <= 1:
+            for group_id, review, fields, input_hash in tasks:
+                yield record(run_task(group_id, review, fields, os.path.join(out_dir, output_name(group_id, review))),
+                             input_hash)
+            return
+
+        with render_pool.process_pool(workers) as executor:
+            futures = {
+                executor.submit(run_task, group_id, review, fields,
+                                os.path.join(out_dir, output_name(group_id, review))): input_hash
+                for group_id, review, fields, input_hash in tasks
+            }
+            for future in as_completed(futures):
+                yield record(future.result(), futures[future])
+
+
+def summarize(entries, skipped, seconds):
+    done = [entry for entry in entries if entry['status'] != 'failed']
+    failed = [entry for entry in entries if entry['status'] == 'failed']
+    lines = [f"Rendered {len(done)}, failed {len(failed)}, skipped {skipped} (already done) "
+             f"in {seconds:.1f} s"]
+    if entries:
+        durations = sorted(entry['seconds'] for entry in entries)
+        p95 = durations[min(len(durations) - 1, int(0.95 * len(durations)))]
+        lines.append(f"Throughput {len(entries) / max(seconds, 1e-6):.2f} sheets/s; per sheet mean "
+                     f"{sum(durations) / len(durations):.2f} s, p95 {p95:.2f} s")
+    partial = [entry for entry in done if entry['status'] == 'partial']
+    if partial:
+        lines.append(f"{len(partial)} dossiers without some reviews (see the manifest; the next run retries them)")
+    if failed:
+        lines.append("Failures:")
+        for error, count in Counter(entry['error'] for entry in failed).most_common(10):
+            lines.append(f"  {count} x {error}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m backend.cli',
+                                     description="Generate review sheets for many groups")
+    parser.add_argument('--review', nargs='+', required=True, metavar='N',
+                        help="review numbers 1-5 and/or 'dossier'")
+    parser.add_argument('--all', action='store_true', help="every group")
+    parser.add_argument('--track', help="groups of this panel track")
+    parser.add_argument('--division', help="groups of this division")
+    parser.add_argument('--group', action='append', dest='groups', metavar='GROUP_ID', help="repeatable")
+    parser.add_argument('--marks', help="JSON or CSV file of form fields")
+    parser.add_argument('--out', default=os.path.join(dossier.pdf_output.OUTPUT_DIR, 'batch'))
+    parser.add_argument('--workers', type=int, default=dossier.WORKERS)
+    parser.add_argument('--force', action='store_true', help="ignore the manifest and render everything")
+    parser.add_argument('--no-progress', action='store_true')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.ERROR, format='%(message)s')
+
+    try:
+        reviews = [_review_key(review) for review in args.review]
+    except ValueError:
+        parser.error("--review takes 1-5 or 'dossier'")
+    if any(review != DOSSIER and review not in dossier.GENERATORS for review in reviews):
+        parser.error("--review takes 1-5 or 'dossier'")
+
+    marks = load_marks(args.marks, reviews) if args.marks else {}
+    if args.all or args.track or args.division or args.groups:
+        group_ids = select_groups(args.all, args.track, args.division, args.groups)
+    else:
+        group_ids = select_groups(group_ids=sorted(marks))
+    if not group_ids:
+        parser.error("no groups selected (use --all, --track, --division, --group or --marks)")
+    marks, unmatched = match_marks(marks, group_ids)
+    if unmatched:
+        print(f"Marks not used, no such group selected: {', '.join(sorted(unmatched))}", file=sys.stderr)
+
+    os.makedirs(args.out, exist_ok=True)
+    manifest = {} if args.force else read_manifest(args.out)
+    tasks, skipped = [], 0
+    for group_id in group_ids:
+        for review in reviews:
+            fields = marks.get(group_id, {}).get(review)
+            if review == DOSSIER:  # a dossier takes the marks of every review
+                fields = {r: f for r, f in marks.get(group_id, {}).items() if r != DOSSIER} or None
+            input_hash = fingerprint(review, fields)
+            if is_done(manifest.get((group_id, review)), input_hash):
+                skipped += 1
+            else:
+                tasks.append((group_id, review, fields, input_hash))
+
+    print(f"{len(group_ids)} groups x {len(reviews)} reviews: {len(tasks)} to render, {skipped} already done "
+          f"-> {args.out}", file=sys.stderr)
+    start = time.perf_counter()
+    entries = list(run(tasks, args.out, max(1, args.workers), progress=not args.no_progress))
+    print(summarize(entries, skipped, time.perf_counter() - start), file=sys.stderr)
+    return 1 if any(entry['status'] == 'failed' for entry in entries) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,11 +3,15 @@
 from flask import Blueprint, render_template, request, jsonify, send_file
 import logging
 import io
-import pandas as pd
-import mysql.connector
 from datetime import datetime
 import re
+import time
 import backend.sheet1 as sheet1  # Must provide connect_db() and fetch_project_details
+import backend.excel_mapping as excel_mapping
+import backend.shared_cache as shared_cache
+import backend.search_index as search_index
+import backend.header_layer as header_layer
+import backend.metrics as metrics
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +20,7 @@ bp = Blueprint('data_manager', __name__, template_folder='templates')
 # --- Small helper for mobile/contact numbers from Excel ---
 def clean_mobile(value):
     """Return mobile/contact as string without trailing .0 or nan."""
+    import pandas as pd
     if pd.isnull(value):
         return ''
     s = str(value).strip()
@@ -92,6 +97,7 @@ def save_projects():
             return jsonify({'success': False, 'error': 'No data provided'}), 400
         
         spreadsheet_data = data['data']
+        start = time.perf_counter()
         conn = sheet1.connect_db()
         cursor = conn.cursor()
         
@@ -153,6 +159,11 @@ def save_projects():
         conn.commit()
         cursor.close()
         conn.close()
+        metrics.record_import('projects', sum(len(p['members']) for p in projects.values()),
+                              time.perf_counter() - start)
+        shared_cache.invalidate_project_data()
+        search_index.refresh()
+        header_layer.warm_in_background()
         return jsonify({'success': True, 'message': 'Data saved successfully'})
         
     except Exception as e:
@@ -245,6 +256,7 @@ def save_schedule():
         conn.commit()
         cursor.close()
         conn.close()
+        shared_cache.invalidate_project_data()
         return jsonify({'success': True, 'message': 'Schedule updated successfully'})
         
     except Exception as e:
@@ -254,58 +266,36 @@ def save_schedule():
 # --- ENHANCED EXCEL IMPORT (KEEPING YOUR WORKING VERSION) ---
 @bp.route('/api/import-excel', methods=['POST'])
 def import_excel_to_db():
+    import pandas as pd  # heavy; only the import/export routes need it
+
     try:
         file = request.files.get('excel')
         if not file:
             return jsonify({'success': False, 'error': 'No file provided'}), 400
 
+        start = time.perf_counter()
         # Read Excel file
         xls = pd.ExcelFile(io.BytesIO(file.read()))
-        sheet_names = xls.sheet_names
-        logger.info(f"Available sheets in order: {sheet_names}")
+        logger.info(f"Available sheets in order: {xls.sheet_names}")
 
-        # ENHANCED SHEET DETECTION - Handle any sequence
-        div_a_sheet = None
-        div_b_sheet = None
-        schedule_sheet = None
-        
-        # Check each sheet name for content patterns
-        for sheet_name in sheet_names:
-            sheet_upper = sheet_name.upper()
-            if any(keyword in sheet_upper for keyword in ['DIV A', 'DIVA', 'DIVISION A', 'FINAL  DIV A']):
-                div_a_sheet = sheet_name
-                logger.info(f"Found Division A sheet: {sheet_name}")
-            elif any(keyword in sheet_upper for keyword in ['DIV B', 'DIVB', 'DIVISION B', 'FINAL  DIV B']):
-                div_b_sheet = sheet_name
-                logger.info(f"Found Division B sheet: {sheet_name}")
-            elif any(keyword in sheet_upper for keyword in ['SCHEDULE', 'SCHED']):
-                schedule_sheet = sheet_name
-                logger.info(f"Found Schedule sheet: {sheet_name}")
-
-        # Validate all sheets found
-        if not all([div_a_sheet, div_b_sheet, schedule_sheet]):
-            return jsonify({
-                'success': False,
-                'error': f"Required sheets not found. Available: {sheet_names}. Found: DivA={div_a_sheet}, DivB={div_b_sheet}, Schedule={schedule_sheet}"
-            }), 400
-
-        # Load data with error handling
+        # Sheet roles and column mappings are cached per workbook layout
         try:
-            logger.info(f"Loading Division A from: {div_a_sheet}")
-            div_a = pd.read_excel(xls, sheet_name=div_a_sheet, skiprows=3)
-            
-            logger.info(f"Loading Division B from: {div_b_sheet}")
-            div_b = pd.read_excel(xls, sheet_name=div_b_sheet, skiprows=3)
-            
-            logger.info(f"Loading Schedule from: {schedule_sheet}")
-            sched = pd.read_excel(xls, sheet_name=schedule_sheet, skiprows=2)
-            
+            sheet_roles, frames = excel_mapping.read_workbook(xls)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         except Exception as e:
             return jsonify({
                 'success': False,
                 'error': f"Error reading Excel sheets: {str(e)}"
             }), 400
 
+        div_a_sheet = sheet_roles['div_a']
+        div_b_sheet = sheet_roles['div_b']
+        schedule_sheet = sheet_roles['schedule']
+        div_a = frames['div_a']
+        div_b = frames['div_b']
+        sched = frames['schedule']
+
         logger.info(f"Division A columns: {list(div_a.columns)}")
         logger.info(f"Division B columns: {list(div_b.columns)}")
         logger.info(f"Schedule columns: {list(sched.columns)}")
@@ -330,7 +320,7 @@ def import_excel_to_db():
             for i, row in df.iterrows():
                 try:
                     # Check for group ID - handle multiple formats
-                    group_no_value = row.get('Group No.', '')
+                    group_no_value = row.get('group_no', '')
                     if pd.notnull(group_no_value) and str(group_no_value).strip():
                         group_id = str(group_no_value).strip()
                         
@@ -345,10 +335,10 @@ def import_excel_to_db():
                         
                         # Insert project
                         try:
-                            project_domain = str(row.get('Project Domain', '')).strip()[:255] if pd.notnull(row.get('Project Domain', '')) else ""
-                            project_title = str(row.get(' Proposed Title of the Project if any', '')).strip()[:500] if pd.notnull(row.get(' Proposed Title of the Project if any', '')) else ""
-                            sponsor_company = str(row.get('Name of the sponsored company ', '')).strip()[:255] if pd.notnull(row.get('Name of the sponsored company ', '')) else ""
-                            guide_name = str(row.get('Name of the Guide', '')).strip()[:100] if pd.notnull(row.get('Name of the Guide', '')) else ""
+                            project_domain = str(row.get('project_domain', '')).strip()[:255] if pd.notnull(row.get('project_domain', '')) else ""
+                            project_title = str(row.get('project_title', '')).strip()[:500] if pd.notnull(row.get('project_title', '')) else ""
+                            sponsor_company = str(row.get('sponsor_company', '')).strip()[:255] if pd.notnull(row.get('sponsor_company', '')) else ""
+                            guide_name = str(row.get('guide_name', '')).strip()[:100] if pd.notnull(row.get('guide_name', '')) else ""
                             
                             cur.execute(
                                 """INSERT IGNORE INTO projects 
@@ -367,12 +357,12 @@ def import_excel_to_db():
                     
                     # Insert member
                     if (group_id and 
-                        pd.notnull(row.get('Roll No.', '')) and 
-                        pd.notnull(row.get('Name of the group member', ''))):
+                        pd.notnull(row.get('roll_no', '')) and 
+                        pd.notnull(row.get('student_name', ''))):
                         
                         try:
-                            roll_no = str(row.get('Roll No.', '')).strip()
-                            student_name = str(row.get('Name of the group member', '')).strip()[:100]
+                            roll_no = str(row.get('roll_no', '')).strip()
+                            student_name = str(row.get('student_name', '')).strip()[:100]
                             
                             if roll_no and student_name:
                                 cur.execute(
@@ -403,7 +393,7 @@ def import_excel_to_db():
             
             # Check each column value
             for col_name, cell_value in row.items():
-                if pd.isnull(cell_value) or col_name.lower() in ['track', 'name of the panel', 'location']:
+                if pd.isnull(cell_value) or col_name in ['track', 'panel', 'location']:
                     continue
                 
                 cell_str = str(cell_value).upper().strip()
@@ -475,14 +465,14 @@ def import_excel_to_db():
         
         for i, row in sched.iterrows():
             try:
-                track = row.get('Track')
+                track = row.get('track')
                 if pd.isnull(track):
                     continue
                     
                 track = int(track)
                 
                 # Extract panel professors
-                panel_text = str(row.get('Name of the Panel', ''))
+                panel_text = str(row.get('panel', ''))
                 panel_profs = []
                 if panel_text and panel_text != 'nan':
                     # Split by newlines and commas, clean up
@@ -496,7 +486,7 @@ def import_excel_to_db():
                     panel_profs = [f"Default Panel {track} Prof 1", f"Default Panel {track} Prof 2", f"Default Panel {track} Prof 3"]
                 
                 # Extract location
-                location = str(row.get('Location', '')).strip() if pd.notnull(row.get('Location', '')) else f"Room {track}"
+                location = str(row.get('location', '')).strip() if pd.notnull(row.get('location', '')) else f"Room {track}"
                 
                 # Extract ALL group IDs from this row
                 group_ids = extract_all_group_ids(row)
@@ -590,6 +580,10 @@ def import_excel_to_db():
         conn.commit()
         cur.close()
         conn.close()
+        metrics.record_import('excel', div_a_members + div_b_members, time.perf_counter() - start)
+        shared_cache.invalidate_project_data()
+        search_index.refresh()
+        header_layer.warm_in_background()
 
         # Final verification counts using working database logic
         conn = sheet1.connect_db()
@@ -783,6 +777,8 @@ def debug_all_evaluators():
 # --- EXPORT EXCEL ---
 @bp.route('/api/export-excel', methods=['POST'])
 def export_excel():
+    import pandas as pd
+
     try:
         data = request.get_json()
         if not data or 'data' not in data:
@@ -805,3 +801,52 @@ def export_excel():
     except Exception as e:
         logger.error(f"Export error: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
+
+# --- CANONICAL EXPORT TEMPLATE (ROUND-TRIPS THROUGH /api/import-excel) ---
+@bp.route('/api/export-template', methods=['GET'])
+def export_template():
+    try:
+        projects = []
+        schedule = []
+        if request.args.get('empty') != '1':
+            conn = sheet1.connect_db()
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT p.group_id, p.division, p.project_domain, p.project_title, p.sponsor_company,
+                       p.guide_name, m.roll_no, m.student_name
+                FROM projects p
+                LEFT JOIN members m ON p.group_id = m.group_id
+                ORDER BY p.division, p.group_id, m.roll_no
+            """)
+            projects = cursor.fetchall()
+
+            cursor.execute("""
+                SELECT track, panel_professors, location, group_id
+                FROM panel_assignments
+                WHERE track IS NOT NULL AND TRIM(track) != ''
+                ORDER BY track, group_id
+            """)
+            tracks = {}
+            for row in cursor.fetchall():
+                entry = tracks.setdefault(str(row['track']), {
+                    'track': row['track'],
+                    'panel_professors': row['panel_professors'],
+                    'location': row['location'],
+                    'group_ids': []
+                })
+                entry['group_ids'].append(row['group_id'])
+            schedule = list(tracks.values())
+            cursor.close()
+            conn.close()
+
+        output = excel_mapping.build_export_template(projects, schedule)
+        return send_file(
+            output,
+            as_attachment=True,
+            download_name=f'review_import_template_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx',
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+
+    except Exception as e:
+        logger.error(f"Template export error: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
@@ -0,0 +1,162 @@
+# docx_template.py
+#
+# Placeholder engine for the Review IV DOCX. The python-docx loop
+# (sheet4.replace_placeholders) parses the template on every request, then
+# tests every placeholder against every paragraph and table cell and assigns
+# .text, which rebuilds the runs and drops their formatting.
+#
+# Here a template is compiled once per template version: the {{...}}
+# placeholders are located in the XML of the document, header and footer
+# parts, including placeholders Word has split across several runs (the
+# whole placeholder moves into its first run and the other runs keep their
+# remaining text), and each part is serialized once and cut at the
+# placeholders into a list of literal XML chunks. A render joins the chunks
+# with the escaped values, one pass in document order, and zips the parts;
+# the XML is not parsed again. Every run keeps its formatting; a value with
+# line breaks or tabs becomes <w:br/> / <w:tab/>, as python-docx writes them.
+# Placeholders without a value are left in the document, as before.
+#
+#   REVIEW_DOCX_ENGINE=python-docx   fill with the python-docx loop (old behavior)
+
+import io
+import os
+import re
+import zipfile
+import logging
+import threading
+from xml.sax.saxutils import escape
+import backend.template_cache as template_cache
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get('REVIEW_DOCX_ENGINE', 'compiled') == 'compiled'
+
+W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+XML_SPACE = '{http://www.w3.org/XML/1998/namespace}space'
+PARTS = re.compile(r'word/(document|header\d*|footer\d*|footnotes|endnotes)\.xml$')
+PLACEHOLDER = re.compile(r'\{\{[^{}]+\}\}')
+# Slot markers while compiling: private-use characters, never in a template
+MARK = '\ue000{}\ue001'
+SLOT = re.compile('\ue000(\\d+)\ue001')
+
+# Inside a <w:t>: close it, add the break, reopen
+BREAK = '</w:t><w:br/><w:t xml:space="preserve">'
+TAB = '</w:t><w:tab/><w:t xml:space="preserve">'
+
+_templates = {}  # template path -> (template version, Template)
+_lock = threading.Lock()
+
+
+def xml_text(value):
+    """A value as the content of a <w:t>."""
+    text = escape(str(value))
+    if '\n' in text or '\r' in text or '\t' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n').replace('\n', BREAK).replace('\t', TAB)
+    return text
+
+
+class Template:
+    """A compiled DOCX: the unchanged parts as bytes, the others as chunks and slots."""
+
+    def __init__(self, members, compiled):
+        self.members = members    # [(ZipInfo, bytes or None)], in archive order
+        self.compiled = compiled  # part name -> (chunks, slots); len(chunks) == len(slots) + 1
+
+    @property
+    def placeholders(self):
+        return {slot for _, slots in self.compiled.values() for slot in slots}
+
+    def fill(self, name, values):
+        chunks, slots = self.compiled[name]
+        out = [chunks[0]]
+        for slot, chunk in zip(slots, chunks[1:]):
+            out.append(xml_text(values[slot]) if slot in values else escape(slot))
+            out.append(chunk)
+        return ''.join(out).encode('utf-8')
+
+    def render(self, values):
+        """The filled document as DOCX bytes; values maps placeholders ("{{date}}") to values."""
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            for info, data in self.members:
+                archive.writestr(info, self.fill(info.filename, values) if data is None else data)
+        return buffer.getvalue()
+
+    def save(self, values, path):
+        with open(path, 'wb') as f:
+            f.write(self.render(values))
+
+
+# --- COMPILE ---
+def index_paragraph(paragraph, slots):
+    """Put each placeholder of the paragraph whole into its first run, as a slot marker."""
+    nodes = [t for t in paragraph.iter(W + 't') if next(t.iterancestors(W + 'p')) is paragraph]
+    text = ''.join(t.text or '' for t in nodes)
+    matches = list(PLACEHOLDER.finditer(text)) if '{{' in text else []
+    if not matches:
+        return
+
+    start = 0
+    for t in nodes:
+        end = start + len(t.text or '')
+        out, cursor = [], start
+        for match in matches:
+            if match.end() <= start or match.start() >= end:
+                continue
+            out.append(text[cursor:max(match.start(), start)])
+            if match.start() >= start:  # the placeholder begins in this run
+                out.append(MARK.format(len(slots)))
+                slots.append(match.group())
+                t.set(XML_SPACE, 'preserve')
+            cursor = min(match.end(), end)
+        if out:
+            out.append(text[cursor:end])
+            t.text = ''.join(out)
+        start = end
+
+
+def compile_part(xml):
+    """(chunks, slots) of one XML part; chunks are the literal XML between the placeholders."""
+    from lxml import etree
+    root = etree.fromstring(xml)
+    slots = []
+    for paragraph in root.iter(W + 'p'):
+        index_paragraph(paragraph, slots)
+    if not slots:
+        return None
+    serialized = etree.tostring(root, xml_declaration=True, encoding='UTF-8', standalone=True).decode('utf-8')
+    pieces = SLOT.split(serialized)
+    chunks = pieces[0::2]
+    ordered = [slots[int(index)] for index in pieces[1::2]]
+    return chunks, ordered
+
+
+def compile_template(data):
+    """Compile DOCX bytes into a Template."""
+    members, compiled = [], {}
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        for info in archive.infolist():
+            content = archive.read(info)
+            part = compile_part(content) if PARTS.match(info.filename) else None
+            if part is None:
+                members.append((info, content))
+            else:
+                compiled[info.filename] = part
+                members.append((info, None))
+    return Template(members, compiled)
+
+
+def get_template(template_path):
+    """The compiled template, recompiled when the file changes."""
+    version = template_cache.get_template_version(template_path)
+    with _lock:
+        cached = _templates.get(template_path)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    template = compile_template(template_cache.get_template_bytes(template_path))
+    logger.info(f"Compiled {os.path.basename(template_path)}: {len(template.placeholders)} placeholders "
+                f"in {sum(len(slots) for _, slots in template.compiled.values())} places")
+    with _lock:
+        _templates[template_path] = (version, template)
+    return template
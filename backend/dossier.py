@@ -0,0 +1,305 @@
+# dossier.py
+#
+# End-of-semester dossier: Review I-V of one group merged into a single PDF.
+#
+# Each review's form is assembled from what the server already stores: the
+# group's draft of that review if there is one, else the marks recorded when
+# the sheet was last generated (Review V gets the recorded totals). Posted
+# fields go on top, and Review V's totals include the posted marks. Those
+# marks are recorded like a sheet generation would, but only once the
+# dossier is built, and only for the sheets in it: a request that fails (or
+# is turned away) changes nothing. Recording replaces a review's marks, so a
+# retried request records the same thing again.
+#
+# The five sheets render concurrently, in the flatten mode so the values are
+# page content and survive the merge (copying pages drops form widgets), and
+# are merged into one file saved with garbage=4, which also stores the fonts
+# and images the sheets have in common once. A sheet that fails (e.g. Review IV
+# without LibreOffice) is left out and reported; the per-sheet files are
+# removed after the merge.
+#
+# Whole cohorts go through a process pool, one dossier per task:
+#
+#   python -m backend.dossier --all --out dossiers/
+#   python -m backend.dossier BIA-01 BIA-02 --marks marks.json
+#
+# marks.json maps group ids to {review number: form fields}.
+#
+#   REVIEW_DOSSIER_WORKERS   processes for cohort builds (default: CPUs)
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import importlib
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import backend.pdf_output as pdf_output
+import backend.metrics as metrics
+import backend.render_pool as render_pool
+
+logger = logging.getLogger(__name__)
+
+REVIEWS = (1, 2, 3, 4, 5)
+GENERATORS = {
+    1: ('backend.sheet1', 'generate_fillable_pdf'),
+    2: ('backend.sheet2', 'generate_2_pdf'),
+    3: ('backend.sheet3', 'generate_3_pdf'),
+    4: ('backend.sheet4', 'generate_review4_pdf'),
+    5: ('backend.sheet5', 'generate_5_pdf'),
+}
+WORKERS = int(os.environ.get('REVIEW_DOSSIER_WORKERS', os.cpu_count() or 2))
+
+# Shared fonts and images are stored once; same streams the level-3 sheet save compresses
+SAVE_OPTIONS = dict(garbage=4, deflate=True, deflate_fonts=True, deflate_images=True)
+
+
+class GroupNotFound(LookupError):
+    pass
+
+
+class DossierError(RuntimeError):
+    """No sheet of the dossier could be rendered; `errors` maps reviews to their exceptions."""
+
+    def __init__(self, message, errors):
+        super().__init__(message)
+        self.errors = errors
+
+
+def generate(review_num, form):
+    """Render one sheet in this thread; returns its path."""
+    module_name, function_name = GENERATORS[review_num]
+    return getattr(importlib.import_module(module_name), function_name)(form)
+
+
+# --- FORMS ---
+def review_form(group_id, review_num, fields=None, recorded=None, totals=None):
+    """One review's form: the group's draft, else its recorded marks, then `fields`.
+
+    Review V gets the totals of the other reviews: `totals` (review_marks
+    totals), else the recorded ones. `recorded` is the group's
+    review_marks.get_mark_fields(), if the caller already has it. Nothing is
+    recorded; see record_marks().
+    """
+    import backend.drafts as drafts
+    import backend.review_marks as review_marks
+
+    draft = drafts.load_draft(group_id=group_id, review_num=review_num)
+    if draft is not None:
+        form = dict(draft['fields'])
+    else:
+        recorded = review_marks.get_mark_fields(group_id) if recorded is None else recorded
+        form = dict(recorded.get(review_num, {}))
+    if review_num == 5:  # as its page does
+        totals = totals or review_marks.get_review_totals(group_id)
+        form.update({field: f"{value:g}" for field, value in totals['fields'].items()})
+    form.update(fields or {})
+    form['group_id'] = group_id
+    return form
+
+
+def marks_to_record(forms, posted):
+    """{review: form} of the forms whose posted fields ({review: fields}) carry marks."""
+    import backend.review_marks as review_marks
+    return {review_num: form for review_num, form in forms.items()
+            if review_marks.extract_marks(review_num, posted.get(review_num) or {})}
+
+
+def record_marks(marks):
+    """Store the marks of {review: form}, as a sheet generation does."""
+    import backend.review_marks as review_marks
+    for review_num, form in sorted(marks.items()):
+        review_marks.save_marks(review_num, form)
+
+
+def collect_forms(group_id, posted=None):
+    """The form of every review (see review_form()), in the flatten mode by
+    default, and the forms whose posted marks are to be recorded; ({review:
+    form}, {review: form}).
+
+    `posted` is {"reviews": {review: fields}, ...}; its other keys (date,
+    render_mode, ...) apply to every review. Raises GroupNotFound for an
+    unknown group and ValueError for an unknown review.
+    """
+    import backend.sheet1 as sheet1
+    import backend.review_marks as review_marks
+
+    posted = dict(posted or {})
+    posted_reviews = {int(review): fields for review, fields in (posted.pop('reviews', None) or {}).items()}
+    shared = {key: value for key, value in posted.items() if key != 'group_id'}
+
+    unknown = set(posted_reviews) - set(REVIEWS)
+    if unknown:
+        raise ValueError(f"Unknown reviews: {sorted(unknown)}")
+    try:
+        sheet1.fetch_project_details(group_id)
+    except ValueError:
+        raise GroupNotFound(f"Group not found: {group_id}")
+
+    recorded = review_marks.get_mark_fields(group_id)
+    fields = {review_num: {**shared, **posted_reviews.get(review_num, {})} for review_num in REVIEWS}
+    forms = {review_num: review_form(group_id, review_num, fields[review_num], recorded)
+             for review_num in REVIEWS if review_num != 5}
+    marks = marks_to_record(forms, fields)
+    # Review V totals include the marks posted for I-IV
+    forms[5] = review_form(group_id, 5, fields[5], recorded, review_marks.totals_with(group_id, marks))
+    for form in forms.values():
+        form.setdefault('render_mode', 'flatten')
+    return dict(sorted(forms.items())), marks
+
+
+# --- RENDER AND MERGE ---
+def render_sheets(forms, render=generate):
+    """Render the sheets concurrently; returns ({review: path}, {review: exception})."""
+    paths, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=len(forms), thread_name_prefix='dossier') as executor:
+        # each task in its own copy of the caller's context (query log, profile)
+        futures = {executor.submit(contextvars.copy_context().run, render, review_num, form): review_num
+                   for review_num, form in forms.items()}
+        for future in as_completed(futures):
+            review_num = futures[future]
+            try:
+                paths[review_num] = future.result()
+            except Exception as e:
+                logger.warning(f"Dossier: review {review_num} of {forms[review_num].get('group_id')} failed: {e}")
+                errors[review_num] = e
+    return paths, errors
+
+
+def merge(paths, destination):
+    """Concatenate the PDFs in order into `destination`; returns its page count."""
+    import fitz
+    merged = fitz.open()
+    try:
+        for path in paths:
+            with fitz.open(path) as sheet:
+                merged.insert_pdf(sheet)
+        pages = merged.page_count
+        tmp_path = destination + '.tmp'
+        merged.save(tmp_path, **SAVE_OPTIONS)
+        os.replace(tmp_path, destination)
+        return pages
+    finally:
+        merged.close()
+
+
+def build(group_id, posted=None, destination=None, render=generate, record=True):
+    """Build one group's dossier; returns {group_id, path, pages, missing, errors,
+    marks, seconds}.
+
+    The posted marks of the sheets in the dossier (`marks`) are recorded once it
+    is built; with record=False the caller does it (record_marks()) if it
+    keeps the dossier. Raises DossierError when no sheet could be rendered.
+    """
+    start = time.perf_counter()
+    forms, marks = collect_forms(group_id, posted)
+    paths, errors = render_sheets(forms, render)
+    try:
+        if not paths:
+            raise DossierError(f"No review sheet rendered for {group_id}: "
+                               + '; '.join(f"review {n}: {e}" for n, e in sorted(errors.items())), errors)
+        destination = destination or pdf_output.output_path('Dossier', group_id)
+        with metrics.pdf_phase('Dossier', 'merge'):
+            pages = merge([paths[n] for n in sorted(paths)], destination)
+    finally:
+        for path in paths.values():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    # Only marks that made it onto a sheet are recorded
+    marks = {review_num: form for review_num, form in marks.items() if review_num in paths}
+    if record:
+        record_marks(marks)
+    seconds = time.perf_counter() - start
+    logger.info(f"Dossier {destination}: {len(paths)} reviews, {pages} pages in {seconds:.1f} s")
+    return {
+        "group_id": group_id,
+        "path": destination,
+        "pages": pages,
+        "missing": sorted(errors),
+        "errors": errors,
+        "marks": marks,
+        "seconds": seconds,
+    }
+
+
+# --- COHORT ---
+def _build_task(group_id, posted, out_dir):
+    """Process pool task; never raises, errors travel back as text."""
+    destination = os.path.join(out_dir, f"Dossier_{_safe_name(group_id)}.pdf") if out_dir else None
+    try:
+        result = build(group_id, posted, destination)
+        result['errors'] = {n: str(e) for n, e in result['errors'].items()}
+        return result
+    except Exception as e:
+        return {"group_id": group_id, "path": None, "error": str(e)}
+
+
+def _safe_name(group_id):
+    return str(group_id).replace(os.sep, '_').replace('/', '_')
+
+
+def build_cohort(group_ids, posted_by_group=None, out_dir=None, workers=WORKERS):
+    """Build the dossiers of many groups in a process pool; yields results as they finish."""
+    posted_by_group = posted_by_group or {}
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    if workers <= 1:
+        for group_id in group_ids:
+            yield _build_task(group_id, posted_by_group.get(group_id), out_dir)
+        return
+
+    with render_pool.process_pool(workers) as executor:
+        futures = [executor.submit(_build_task, group_id, posted_by_group.get(group_id), out_dir)
+                   for group_id in group_ids]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def all_group_ids():
+    import backend.storage as storage
+    conn = storage.connect()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT group_id FROM projects ORDER BY group_id")
+        return [row[0] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+        conn.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Merge Review I-V of each group into one PDF")
+    parser.add_argument('groups', nargs='*', help="group ids (default with --all: every group)")
+    parser.add_argument('--all', action='store_true', help="every group in the database")
+    parser.add_argument('--marks', help="JSON file: {group_id: {review: form fields}}")
+    parser.add_argument('--out', default=os.path.join(pdf_output.OUTPUT_DIR, 'dossiers'))
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format='%(message)s')
+
+    group_ids = all_group_ids() if args.all else args.groups
+    if not group_ids:
+        parser.error("give group ids or --all")
+    posted_by_group = {}
+    if args.marks:
+        with open(args.marks) as f:
+            posted_by_group = {group_id: {"reviews": reviews} for group_id, reviews in json.load(f).items()}
+
+    start = time.perf_counter()
+    built = failed = 0
+    for result in build_cohort(group_ids, posted_by_group, args.out, args.workers):
+        if result.get('path'):
+            built += 1
+            missing = ', '.join(f"review {n}: {e}" for n, e in sorted(result['errors'].items()))
+            print(f"{result['group_id']}: {result['path']} ({result['pages']} pages)"
+                  + (f" - missing {missing}" if missing else ''))
+        else:
+            failed += 1
+            print(f"❌ {result['group_id']}: {result['error']}", file=sys.stderr)
+    print(f"Built {built} dossiers, {failed} failed in {time.perf_counter() - start:.1f} s")
+    sys.exit(1 if failed else 0)
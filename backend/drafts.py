@@ -0,0 +1,228 @@
+# drafts.py
+#
+# Server-side drafts of the review forms. The pages send debounced partial
+# patches (only the fields that changed, null/"" to clear one); a request
+# may carry several queued patches, which are merged in order and written
+# with a single read-modify-write. One draft per (group, review), stored as
+# zlib-compressed JSON of its non-empty fields.
+#
+# The PDF endpoints accept {"draft_id": ...} in place of the full form.
+
+from flask import Blueprint, request, jsonify
+import json
+import zlib
+import uuid
+import logging
+import threading
+import backend.sheet1 as sheet1  # For database connection
+import backend.storage as storage
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint('drafts', __name__)
+
+REVIEW_DRAFTS_DDL = """
+    CREATE TABLE IF NOT EXISTS review_drafts (
+        draft_id CHAR(32) NOT NULL PRIMARY KEY,
+        group_id VARCHAR(50) NOT NULL,
+        review_no TINYINT NOT NULL,
+        payload MEDIUMBLOB NOT NULL,
+        version INT NOT NULL DEFAULT 1,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        UNIQUE KEY unique_draft (group_id, review_no)
+    )
+"""
+
+MAX_PATCHES = 50
+MAX_FIELDS = 1000
+
+_table_ready = threading.Event()
+
+
+def ensure_table(cursor):
+    if not _table_ready.is_set():
+        cursor.execute(REVIEW_DRAFTS_DDL)
+        _table_ready.set()
+
+
+def encode_fields(fields):
+    return zlib.compress(json.dumps(fields, separators=(',', ':'), sort_keys=True).encode('utf-8'))
+
+
+def decode_fields(payload):
+    return json.loads(zlib.decompress(payload).decode('utf-8'))
+
+
+def merge_patches(fields, patches):
+    """Apply patches in order; None or blank values remove the field."""
+    for patch in patches:
+        for key, value in patch.items():
+            if value is None or not str(value).strip():
+                fields.pop(key, None)
+            else:
+                fields[key] = value
+    return fields
+
+
+def _row_to_draft(row):
+    return {
+        "draft_id": row['draft_id'],
+        "group_id": row['group_id'],
+        "review": row['review_no'],
+        "version": row['version'],
+        "updated_at": row['updated_at'].isoformat() if row.get('updated_at') else None,
+        "fields": decode_fields(row['payload']),
+    }
+
+
+def save_patches(group_id, review_num, patches):
+    """Merge patches into the (group, review) draft, creating it if needed."""
+    for attempt in range(2):
+        conn = sheet1.connect_db()
+        cursor = conn.cursor(dictionary=True)
+        try:
+            ensure_table(cursor)
+            conn.start_transaction()
+            cursor.execute(
+                "SELECT draft_id, payload, version FROM review_drafts WHERE group_id = %s AND review_no = %s FOR UPDATE",
+                (group_id, review_num)
+            )
+            row = cursor.fetchone()
+            fields = merge_patches(decode_fields(row['payload']) if row else {}, patches)
+            if len(fields) > MAX_FIELDS:
+                raise ValueError(f"Draft has more than {MAX_FIELDS} fields")
+
+            if row:
+                draft_id, version = row['draft_id'], row['version'] + 1
+                cursor.execute(
+                    "UPDATE review_drafts SET payload = %s, version = %s WHERE draft_id = %s",
+                    (encode_fields(fields), version, draft_id)
+                )
+            else:
+                draft_id, version = uuid.uuid4().hex, 1
+                cursor.execute(
+                    "INSERT INTO review_drafts (draft_id, group_id, review_no, payload, version) VALUES (%s, %s, %s, %s, %s)",
+                    (draft_id, group_id, review_num, encode_fields(fields), version)
+                )
+            conn.commit()
+            return {"draft_id": draft_id, "version": version, "fields": len(fields)}
+        except storage.IntegrityError:
+            # Another request created the draft first; retry as an update
+            conn.rollback()
+            if attempt:
+                raise
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+
+
+def load_draft(draft_id=None, group_id=None, review_num=None):
+    """Fetch a draft by id, or by (group, review); None if it doesn't exist."""
+    conn = sheet1.connect_db()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        ensure_table(cursor)
+        if draft_id:
+            cursor.execute("SELECT * FROM review_drafts WHERE draft_id = %s", (draft_id,))
+        else:
+            cursor.execute(
+                "SELECT * FROM review_drafts WHERE group_id = %s AND review_no = %s", (group_id, review_num)
+            )
+        row = cursor.fetchone()
+    finally:
+        cursor.close()
+        conn.close()
+    return _row_to_draft(row) if row else None
+
+
+def resolve_payload(review_num, data):
+    """Expand {"draft_id": ...} into the stored form; fields in `data` override the draft.
+
+    Raises LookupError for an unknown draft and ValueError for one of another review.
+    """
+    draft_id = data.get('draft_id')
+    if not draft_id:
+        return data
+    draft = load_draft(draft_id=draft_id)
+    if draft is None:
+        raise LookupError(f"Draft not found: {draft_id}")
+    if draft['review'] != review_num:
+        raise ValueError(f"Draft {draft_id} belongs to review {draft['review']}")
+
+    resolved = dict(draft['fields'])
+    resolved.update({key: value for key, value in data.items() if key != 'draft_id'})
+    resolved.setdefault('group_id', draft['group_id'])
+    return resolved
+
+
+# --- DRAFT API ---
+@bp.route('/api/drafts', methods=['POST', 'PATCH'])
+def patch_draft():
+    try:
+        data = request.get_json(silent=True) or {}
+        group_id = str(data.get('group_id') or '').strip()
+        try:
+            review_num = int(data.get('review'))
+        except (TypeError, ValueError):
+            review_num = None
+        if not group_id or review_num not in range(1, 6):
+            return jsonify({'success': False, 'error': 'group_id and review (1-5) are required'}), 400
+
+        patches = data.get('patches') or ([data['patch']] if isinstance(data.get('patch'), dict) else [])
+        if not patches or len(patches) > MAX_PATCHES or not all(isinstance(p, dict) for p in patches):
+            return jsonify({'success': False, 'error': f'Send 1-{MAX_PATCHES} patch objects'}), 400
+
+        result = save_patches(group_id, review_num, patches)
+        return jsonify({'success': True, **result})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Draft save failed: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@bp.route('/api/drafts', methods=['GET'])
+def get_draft():
+    try:
+        group_id = request.args.get('group_id')
+        review_num = request.args.get('review', type=int)
+        if not group_id or not review_num:
+            return jsonify({'success': False, 'error': 'group_id and review are required'}), 400
+        draft = load_draft(group_id=group_id, review_num=review_num)
+        if draft is None:
+            return jsonify({'success': False, 'error': 'No draft'}), 404
+        return jsonify({'success': True, 'draft': draft})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@bp.route('/api/drafts/<draft_id>', methods=['GET'])
+def get_draft_by_id(draft_id):
+    try:
+        draft = load_draft(draft_id=draft_id)
+        if draft is None:
+            return jsonify({'success': False, 'error': 'No draft'}), 404
+        return jsonify({'success': True, 'draft': draft})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@bp.route('/api/drafts/<draft_id>', methods=['DELETE'])
+def delete_draft(draft_id):
+    try:
+        conn = sheet1.connect_db()
+        cursor = conn.cursor()
+        try:
+            ensure_table(cursor)
+            cursor.execute("DELETE FROM review_drafts WHERE draft_id = %s", (draft_id,))
+            deleted = cursor.rowcount
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+        return jsonify({'success': True, 'deleted': deleted})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
@@ -0,0 +1,257 @@
+# excel_mapping.py
+#
+# Header resolution for the DIV A / DIV B / SCHEDULE workbook.
+# Sheet roles and column mappings are resolved once per layout and cached,
+# keyed by a fingerprint of the sheet names / header rows, so repeat imports
+# of the same workbook layout skip detection entirely.
+
+import io
+import re
+import json
+import hashlib
+import difflib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# --- WORKBOOK LAYOUT ---
+# Rows above the header row in each sheet (passed to pd.read_excel as skiprows)
+SHEET_HEADER_ROWS = {'div_a': 3, 'div_b': 3, 'schedule': 2}
+
+# Sheet names used by the canonical export template
+CANONICAL_SHEET_NAMES = {'div_a': 'FINAL DIV A', 'div_b': 'FINAL DIV B', 'schedule': 'SCHEDULE'}
+
+SHEET_KEYWORDS = {
+    'div_a': ['DIV A', 'DIVA', 'DIVISION A', 'FINAL  DIV A'],
+    'div_b': ['DIV B', 'DIVB', 'DIVISION B', 'FINAL  DIV B'],
+    'schedule': ['SCHEDULE', 'SCHED'],
+}
+
+# (canonical key, canonical header label, aliases)
+DIVISION_COLUMNS = [
+    ('group_no', 'Group No.', ['group no', 'group number', 'group id', 'grp no']),
+    ('roll_no', 'Roll No.', ['roll no', 'roll number', 'roll']),
+    ('student_name', 'Name of the group member', ['name of group member', 'member name', 'student name', 'name of student']),
+    ('project_domain', 'Project Domain', ['domain']),
+    ('project_title', 'Proposed Title of the Project if any', ['project title', 'title of the project', 'proposed title']),
+    ('sponsor_company', 'Name of the sponsored company', ['sponsor company', 'sponsored company', 'company name']),
+    ('guide_name', 'Name of the Guide', ['guide name', 'guide', 'project guide']),
+]
+
+SCHEDULE_COLUMNS = [
+    ('track', 'Track', ['track no', 'batch']),
+    ('panel', 'Name of the Panel', ['panel', 'panel members', 'panel professors']),
+    ('location', 'Location', ['room', 'venue']),
+]
+
+SHEET_COLUMNS = {'div_a': DIVISION_COLUMNS, 'div_b': DIVISION_COLUMNS, 'schedule': SCHEDULE_COLUMNS}
+
+# Columns that must resolve for an import to make sense
+REQUIRED_COLUMNS = {
+    'div_a': ['group_no', 'roll_no', 'student_name'],
+    'div_b': ['group_no', 'roll_no', 'student_name'],
+    'schedule': ['track'],
+}
+
+# Header cells that score below this are left unmapped
+MATCH_THRESHOLD = 0.75
+
+_MAX_CACHED_LAYOUTS = 32
+_sheet_cache = OrderedDict()
+_column_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def normalize_header(value):
+    """Lowercase a header cell and strip punctuation / repeated whitespace."""
+    text = re.sub(r'[^0-9a-z]+', ' ', str(value).lower())
+    return ' '.join(text.split())
+
+
+def _fingerprint(obj):
+    return hashlib.sha1(json.dumps(obj, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def _cache_get(cache, key):
+    with _cache_lock:
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+
+
+def _cache_put(cache, key, value):
+    with _cache_lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > _MAX_CACHED_LAYOUTS:
+            cache.popitem(last=False)
+
+
+def clear_cache():
+    """Forget all cached layouts (mainly for tests and benchmarks)."""
+    with _cache_lock:
+        _sheet_cache.clear()
+        _column_cache.clear()
+
+
+# --- SHEET DETECTION ---
+def resolve_sheets(sheet_names):
+    """Map each sheet role ('div_a', 'div_b', 'schedule') to a sheet name.
+
+    Cached by the tuple of sheet names; raises ValueError if a role is missing.
+    """
+    key = _fingerprint(list(sheet_names))
+    cached = _cache_get(_sheet_cache, key)
+    if cached is not None:
+        return dict(cached)
+
+    roles = {}
+    for sheet_name in sheet_names:
+        sheet_upper = sheet_name.upper()
+        for role, keywords in SHEET_KEYWORDS.items():
+            if role not in roles and any(keyword in sheet_upper for keyword in keywords):
+                roles[role] = sheet_name
+                logger.info(f"Detected {role} sheet: {sheet_name}")
+                break
+
+    missing = [role for role in SHEET_KEYWORDS if role not in roles]
+    if missing:
+        raise ValueError(
+            f"Required sheets not found. Available: {list(sheet_names)}. "
+            f"Found: DivA={roles.get('div_a')}, DivB={roles.get('div_b')}, Schedule={roles.get('schedule')}"
+        )
+
+    _cache_put(_sheet_cache, key, roles)
+    return dict(roles)
+
+
+# --- COLUMN RESOLUTION ---
+def _score(header, label, aliases):
+    """Best similarity between a normalized header and a column's label/aliases."""
+    best = 0.0
+    for candidate in [label] + aliases:
+        candidate = normalize_header(candidate)
+        if header == candidate:
+            return 1.0
+        ratio = difflib.SequenceMatcher(None, header, candidate).ratio()
+        # Long descriptive headers ("Name of the Guide (Internal)") still contain the alias
+        if len(candidate) > 3 and candidate in header:
+            ratio = max(ratio, 0.9)
+        best = max(best, ratio)
+    return best
+
+
+def match_columns(headers, columns):
+    """Fuzzily match raw header cells to canonical keys.
+
+    Returns {raw_header: canonical_key}. Each canonical key is assigned to at
+    most one header, highest score first.
+    """
+    candidates = []
+    for raw in headers:
+        normalized = normalize_header(raw)
+        if not normalized or normalized.startswith('unnamed'):
+            continue
+        for key, label, aliases in columns:
+            score = _score(normalized, label, aliases)
+            if score >= MATCH_THRESHOLD:
+                candidates.append((score, raw, key))
+
+    mapping = {}
+    used_keys = set()
+    for score, raw, key in sorted(candidates, key=lambda c: -c[0]):
+        if raw in mapping or key in used_keys:
+            continue
+        mapping[raw] = key
+        used_keys.add(key)
+    return mapping
+
+
+def resolve_columns(role, headers):
+    """Return the cached {raw_header: canonical_key} mapping for one sheet."""
+    headers = [str(h) for h in headers]
+    key = _fingerprint([role, headers])
+    cached = _cache_get(_column_cache, key)
+    if cached is not None:
+        return dict(cached)
+
+    mapping = match_columns(headers, SHEET_COLUMNS[role])
+    missing = [col for col in REQUIRED_COLUMNS[role] if col not in mapping.values()]
+    if missing:
+        raise ValueError(f"Columns {missing} not found in {role} sheet. Headers: {headers}")
+
+    logger.info(f"Resolved {role} columns: {mapping}")
+    _cache_put(_column_cache, key, mapping)
+    return dict(mapping)
+
+
+def read_workbook(xls):
+    """Read the three sheets of an import workbook with canonical column names.
+
+    Returns (sheet_roles, frames) where frames maps role -> DataFrame.
+    """
+    import pandas as pd
+
+    roles = resolve_sheets(xls.sheet_names)
+    frames = {}
+    for role, sheet_name in roles.items():
+        df = pd.read_excel(xls, sheet_name=sheet_name, skiprows=SHEET_HEADER_ROWS[role])
+        frames[role] = df.rename(columns=resolve_columns(role, df.columns))
+    return roles, frames
+
+
+# --- CANONICAL EXPORT TEMPLATE ---
+def build_export_template(projects=None, schedule=None):
+    """Build an .xlsx in the exact layout read_workbook expects.
+
+    projects: rows with group_id, division, roll_no, student_name and the
+    project columns (one row per member, as /api/projects returns them).
+    schedule: rows with track, panel_professors, location, group_ids.
+    Without rows the workbook is an empty template with headers only.
+    """
+    import pandas as pd
+
+    projects = projects or []
+    schedule = schedule or []
+    division_labels = [label for _, label, _ in DIVISION_COLUMNS]
+    schedule_labels = [label for _, label, _ in SCHEDULE_COLUMNS] + ['Groups']
+
+    def division_frame(division):
+        rows = []
+        last_group = None
+        for row in projects:
+            if (row.get('division') or '') != division:
+                continue
+            first_of_group = row.get('group_id') != last_group
+            last_group = row.get('group_id')
+            rows.append([
+                row.get('group_id') if first_of_group else '',
+                row.get('roll_no') or '',
+                row.get('student_name') or '',
+                (row.get('project_domain') or '') if first_of_group else '',
+                (row.get('project_title') or '') if first_of_group else '',
+                (row.get('sponsor_company') or '') if first_of_group else '',
+                (row.get('guide_name') or '') if first_of_group else '',
+            ])
+        return pd.DataFrame(rows, columns=division_labels)
+
+    schedule_frame = pd.DataFrame([
+        [row.get('track'), row.get('panel_professors') or '', row.get('location') or '',
+         ', '.join(row.get('group_ids') or [])]
+        for row in schedule
+    ], columns=schedule_labels)
+
+    frames = {'div_a': division_frame('A'), 'div_b': division_frame('B'), 'schedule': schedule_frame}
+    titles = {'div_a': 'Division A - Project Groups', 'div_b': 'Division B - Project Groups', 'schedule': 'Review Schedule'}
+
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        for role, df in frames.items():
+            sheet_name = CANONICAL_SHEET_NAMES[role]
+            df.to_excel(writer, sheet_name=sheet_name, startrow=SHEET_HEADER_ROWS[role], index=False)
+            writer.sheets[sheet_name].cell(row=1, column=1, value=titles[role])
+    output.seek(0)
+    return output
@@ -0,0 +1,137 @@
+# flatten.py
+#
+# "flatten" render mode for the PDF review sheets. The form mode fills the
+# AcroForm widgets and restyles every one of them (transparent, read-only)
+# on each request; this mode draws the values straight into the page content
+# stream at the widget positions and ships the page without widgets.
+#
+# Per template version we read a manifest of widget positions once and keep
+# a widget-free copy of the template, so a fill is: open the base, write the
+# text in base-14 Helvetica (measured with a cached fitz.Font), save.
+
+import os
+import logging
+import threading
+import backend.template_cache as template_cache
+
+logger = logging.getLogger(__name__)
+
+MODES = ('form', 'flatten')
+DEFAULT_MODE = os.environ.get('REVIEW_RENDER_MODE', 'form')
+
+FONTNAME = 'helv'  # base-14 Helvetica: referenced, never embedded
+MIN_FONTSIZE = 6
+PADDING = 2  # same inset the widget appearance streams use
+LINEHEIGHT = 1.15
+
+_manifests = {}  # template path -> (template version, manifest, base PDF bytes)
+_lock = threading.Lock()
+_font = None
+
+
+def render_mode(form_data):
+    """'form' or 'flatten', from the request's render_mode or REVIEW_RENDER_MODE."""
+    mode = str((form_data or {}).get('render_mode') or DEFAULT_MODE).lower()
+    return mode if mode in MODES else 'form'
+
+
+def get_font():
+    """Helvetica metrics as a fitz.Font, created once per process."""
+    global _font
+    if _font is None:
+        import fitz
+        _font = fitz.Font(FONTNAME)
+    return _font
+
+
+def get_manifest(template_path):
+    """Return (manifest, base_pdf_bytes) for a template, rebuilt when it changes.
+
+    Manifest entries are (page_no, field_name, rect, fontsize, multiline, align).
+    """
+    version = template_cache.get_template_version(template_path)
+    with _lock:
+        cached = _manifests.get(template_path)
+    if cached and cached[0] == version:
+        return cached[1], cached[2]
+
+    import fitz
+    doc = template_cache.open_template(template_path)
+    manifest = []
+    try:
+        for page in doc:
+            for widget in list(page.widgets()):
+                if widget.field_name:
+                    manifest.append((
+                        page.number,
+                        widget.field_name,
+                        tuple(widget.rect),
+                        widget.text_fontsize or 12,
+                        bool(widget.field_flags & fitz.PDF_TX_FIELD_IS_MULTILINE),
+                        _alignment(doc, widget),
+                    ))
+                page.delete_widget(widget)
+        doc.xref_set_key(doc.pdf_catalog(), 'AcroForm', 'null')
+        base = doc.tobytes(garbage=3, deflate=True)
+    finally:
+        doc.close()
+
+    with _lock:
+        _manifests[template_path] = (version, manifest, base)
+    logger.info(f"Built flatten manifest for {os.path.basename(template_path)}: {len(manifest)} fields")
+    return manifest, base
+
+
+def _alignment(doc, widget):
+    # Widget.text_format doesn't report /Q in this PyMuPDF; read it off the annotation
+    kind, value = doc.xref_get_key(widget.xref, 'Q')
+    return int(value) if kind == 'int' else 0
+
+
+def _write_line(shape, rect, text, fontsize, align):
+    font = get_font()
+    width = rect.width - 2 * PADDING
+    while fontsize > MIN_FONTSIZE and font.text_length(text, fontsize) > width:
+        fontsize -= 1
+    text_width = font.text_length(text, fontsize)
+    x = rect.x0 + PADDING + (width - text_width) * align / 2  # 0 left, 1 center, 2 right
+    y = rect.y0 + (rect.height + fontsize * (font.ascender + font.descender)) / 2  # vertically centred
+    shape.insert_text((x, y), text, fontname=FONTNAME, fontsize=fontsize)
+
+
+def _write_box(shape, rect, text, fontsize, align):
+    box = rect + (PADDING, PADDING, -PADDING, -PADDING)
+    while fontsize > MIN_FONTSIZE:
+        # A negative result means the text didn't fit and nothing was written
+        if shape.insert_textbox(box, text, fontname=FONTNAME, fontsize=fontsize, lineheight=LINEHEIGHT, align=align) >= 0:
+            return
+        fontsize -= 1
+    shape.insert_textbox(box, text, fontname=FONTNAME, fontsize=fontsize, lineheight=LINEHEIGHT, align=align)
+
+
+def fill(template_path, values):
+    """Draw `values` onto the widget-free template; returns (doc, filled_count)."""
+    import fitz
+    manifest, base = get_manifest(template_path)
+    doc = fitz.open("pdf", base)
+    shapes = {}
+    filled_count = 0
+
+    for page_no, name, rect, fontsize, multiline, align in manifest:
+        val = values.get(name)
+        val = "" if val is None else str(val).strip()
+        if not val:
+            continue
+        shape = shapes.get(page_no)
+        if shape is None:
+            shape = shapes[page_no] = doc[page_no].new_shape()
+        if multiline:
+            _write_box(shape, fitz.Rect(rect), val, fontsize, align)
+        else:
+            _write_line(shape, fitz.Rect(rect), val, fontsize, align)
+        filled_count += 1
+
+    # One content stream per page
+    for shape in shapes.values():
+        shape.commit()
+    return doc, filled_count
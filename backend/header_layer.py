@@ -0,0 +1,188 @@
+# header_layer.py
+#
+# Pre-filled header bases for the PDF review sheets (I, II, III, V) in the
+# form render mode. The project header of a sheet (group, title, guide,
+# mentor, reviewers and the member rows) is the same on every evaluation of
+# a group; only the date, marks and comments change. After an import a
+# background job fills the header widgets of each group's sheets once (and
+# restyles every widget, the expensive part of a form fill) and stores the
+# result; a generation then opens that base and fills only the widgets that
+# have a value.
+#
+# A base is a compressed PDF of 75-160 KB, so bases are files under
+# BASE_CACHE_DIR, kept within REVIEW_HEADER_CACHE_MB by evicting the least
+# recently used (artifact_cache); the shared cache only holds each base's
+# count of filled header fields.
+#
+# The flatten mode already draws onto a cached widget-free template, where
+# the header is a few text runs, so it always fills from the template.
+#
+# Bases are keyed by review, template version and a hash of the header
+# values, so a changed project row or template can never be served
+# from an old base, and the bases of groups an import didn't change stay
+# valid: the warm-up after an import only builds the changed ones. A request
+# whose form overrides a header field, or whose base isn't built (or was
+# evicted), is filled from the template as before.
+#
+#   REVIEW_HEADER_LAYER=0          always fill from the template
+#   REVIEW_HEADER_WARMUP_LIMIT     groups pre-rendered after an import (default 200)
+#   REVIEW_HEADER_CACHE_MB         disk budget of the bases (default 128)
+#
+#   python -m backend.header_layer       build every missing base now
+
+import os
+import json
+import time
+import hashlib
+import logging
+import importlib
+import threading
+import backend.shared_cache as shared_cache
+import backend.artifact_cache as artifact_cache
+import backend.pdf_output as pdf_output
+import backend.template_cache as template_cache
+import backend.flatten as flatten
+import backend.metrics as metrics
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get('REVIEW_HEADER_LAYER', '1') == '1'
+WARMUP_LIMIT = int(os.environ.get('REVIEW_HEADER_WARMUP_LIMIT', 200))
+NAMESPACE = 'header_base'
+BASE_CACHE_DIR = os.path.join(artifact_cache.CACHE_DIR, 'header_bases')
+MAX_BYTES = int(os.environ.get('REVIEW_HEADER_CACHE_MB', 128)) * 1024 * 1024
+
+SHEETS = {
+    1: 'backend.sheet1',
+    2: 'backend.sheet2',
+    3: 'backend.sheet3',
+    5: 'backend.sheet5',
+}
+
+
+def base_key(review_num, template_path, header):
+    payload = json.dumps([review_num, template_cache.get_template_version(template_path), header], sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def build_base(template_path, header, process_fields):
+    """Fill only the header; returns (pdf bytes, filled_count)."""
+    doc = template_cache.open_template(template_path)
+    try:
+        filled_count = process_fields(doc, header)  # also restyles every other widget once
+        # Level 1: compressed, but every widget kept for the fill that follows
+        return doc.tobytes(**pdf_output.SAVE_OPTIONS[1]), filled_count
+    finally:
+        doc.close()
+
+
+def get_base(key):
+    """(path of the base, header filled_count), or None."""
+    header_count = shared_cache.get(NAMESPACE, key)
+    if header_count is None:
+        return None
+    path = artifact_cache.get(key, BASE_CACHE_DIR)
+    return None if path is None else (path, header_count)
+
+
+def store_base(key, base, header_count):
+    artifact_cache.put_bytes(key, base, BASE_CACHE_DIR, MAX_BYTES)
+    shared_cache.set(NAMESPACE, key, header_count)
+
+
+def _usable(header, values):
+    """A base only fits if the final values keep every header field as it is."""
+    return all(values.get(name) == value for name, value in header.items())
+
+
+def fill(review_num, label, template_path, header, values, mode, process_fields):
+    """Fill a sheet, on its cached header base when there is one; returns (doc, filled_count)."""
+    import fitz
+    entry = None
+    if ENABLED and mode == 'form':
+        if _usable(header, values):
+            entry = get_base(base_key(review_num, template_path, header))
+            metrics.HEADER_BASE.inc(review=review_num, result='hit' if entry else 'miss')
+        else:
+            metrics.HEADER_BASE.inc(review=review_num, result='bypass')
+
+    if entry is None:
+        if mode == 'flatten':
+            with metrics.pdf_phase(label, 'fill'):
+                return flatten.fill(template_path, values)
+        with metrics.pdf_phase(label, 'open'):
+            doc = template_cache.open_template(template_path)
+        with metrics.pdf_phase(label, 'fill'):
+            return doc, process_fields(doc, values)
+
+    path, header_count = entry
+    rest = {name: value for name, value in values.items() if name not in header}
+    with metrics.pdf_phase(label, 'open'):
+        with open(path, 'rb') as f:  # read whole: eviction may remove the file
+            doc = fitz.open("pdf", f.read())
+    with metrics.pdf_phase(label, 'fill'):
+        filled_count = process_fields(doc, rest, only={name for name, value in rest.items()
+                                                       if str(value or '').strip()})
+    return doc, header_count + filled_count
+
+
+# --- WARM-UP ---
+def _group_ids(limit):
+    import backend.storage as storage
+    conn = storage.connect()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT group_id FROM projects ORDER BY group_id LIMIT %s", (limit,))
+        return [row[0] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def warm(group_ids=None, reviews=None, should_stop=None):
+    """Build the missing bases of the given groups (default: all, up to
+    WARMUP_LIMIT); returns how many were built."""
+    group_ids = group_ids if group_ids is not None else _group_ids(WARMUP_LIMIT)
+    built = 0
+    start = time.perf_counter()
+    for review_num in reviews or SHEETS:
+        module = importlib.import_module(SHEETS[review_num])
+        template_path = template_cache.REVIEW_TEMPLATES[review_num]
+        if not os.path.isfile(template_path):
+            continue
+        for group_id in group_ids:
+            if should_stop and should_stop():
+                logger.info(f"Header warm-up superseded after {built} bases")
+                return built
+            try:
+                header = module.header_fields(module.fetch_project_details(group_id))
+                key = base_key(review_num, template_path, header)
+                if get_base(key) is None:
+                    store_base(key, *build_base(template_path, header, module.process_fields))
+                    built += 1
+            except Exception as e:  # a broken group must not stop the others
+                logger.warning(f"Header base for review {review_num}, {group_id} not built: {e}")
+    logger.info(f"Header warm-up built {built} bases in {time.perf_counter() - start:.1f} s")
+    return built
+
+
+def warm_in_background():
+    """Start a warm-up after an import; a newer data version stops an older run."""
+    if not ENABLED or WARMUP_LIMIT <= 0 or flatten.DEFAULT_MODE != 'form':
+        return None
+    version = shared_cache.get_version('projects')
+
+    def run():
+        try:
+            warm(should_stop=lambda: shared_cache.get_version('projects') != version)
+        except Exception as e:
+            logger.warning(f"Header warm-up failed: {e}")
+
+    thread = threading.Thread(target=run, name='header-warm-up', daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    print(f"Built {warm()} header bases")
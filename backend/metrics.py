@@ -0,0 +1,396 @@
+# metrics.py
+#
+# Minimal Prometheus-style metrics: counters, gauges and histograms kept in
+# process memory and rendered in the text exposition format at /metrics.
+# Recording is a dict update under a lock; nothing is formatted until
+# something scrapes.
+#
+# With several worker processes (gunicorn) set REVIEW_METRICS_DIR: each
+# worker then writes a snapshot there at most every FLUSH_INTERVAL seconds
+# after a request, and /metrics merges the snapshots of every worker.
+# Counters and histograms of exited workers are kept (folded into one
+# archive file); their gauges are dropped.
+#
+# REVIEW_METRICS=0 turns recording off entirely.
+
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get('REVIEW_METRICS', '1') == '1'
+METRICS_DIR = os.environ.get('REVIEW_METRICS_DIR')
+FLUSH_INTERVAL = 5.0
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+SIZE_BUCKETS = (25_000, 50_000, 100_000, 200_000, 500_000, 1_000_000, 2_000_000, 5_000_000, 10_000_000)
+
+_lock = threading.Lock()
+_families = {}
+
+
+class _Family:
+    kind = None
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.samples = {}  # sorted label items -> value
+        _families[name] = self
+
+    @staticmethod
+    def _key(labels):
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Counter(_Family):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        if not ENABLED:
+            return
+        key = self._key(labels)
+        with _lock:
+            self.samples[key] = self.samples.get(key, 0) + amount
+
+
+class Gauge(_Family):
+    kind = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        if not ENABLED:
+            return
+        key = self._key(labels)
+        with _lock:
+            self.samples[key] = self.samples.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        if not ENABLED:
+            return
+        with _lock:
+            self.samples[self._key(labels)] = value
+
+    @contextmanager
+    def track(self, **labels):
+        """+1 while the block runs."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Family):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        if not ENABLED:
+            return
+        key = self._key(labels)
+        with _lock:
+            sample = self.samples.get(key)
+            if sample is None:
+                # per-bucket (non-cumulative) counts, sum, count
+                sample = self.samples[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    sample[0][i] += 1
+                    break
+            sample[1] += value
+            sample[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+
+# --- METRICS ---
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'HTTP request latency by route')
+DB_QUERIES = Counter('db_queries_total', 'Database statements executed, by statement type')
+DB_QUERY_LATENCY = Histogram('db_query_duration_seconds', 'Database statement latency by statement type',
+                             QUERY_BUCKETS)
+DB_REQUEST_QUERIES = Histogram('db_queries_per_request', 'Database statements issued per HTTP request',
+                               COUNT_BUCKETS)
+DB_REQUEST_TIME = Histogram('db_time_per_request_seconds', 'Time spent in the database per HTTP request')
+PDF_PHASE = Histogram('pdf_phase_duration_seconds', 'Sheet generation phases (open, fill, save, convert)')
+PDF_SIZE = Histogram('pdf_output_bytes', 'Size of the generated sheets, by sheet and stage (unoptimized, saved)',
+                     SIZE_BUCKETS)
+IMPORT_ROWS = Counter('import_rows_total', 'Member rows imported')
+IMPORT_TIME = Histogram('import_duration_seconds', 'Duration of data imports')
+PDF_JOBS = Gauge('pdf_job_queue_depth', 'PDF generation requests waiting for a render slot')
+PDF_ACTIVE = Gauge('pdf_jobs_in_progress', 'PDF renders running')
+PDF_REJECTED = Counter('pdf_jobs_rejected_total', 'PDF requests turned away with 429 (queue full or wait timed out)')
+PDF_COALESCED = Counter('pdf_requests_coalesced_total', 'PDF requests served by an identical render already in progress')
+HEADER_BASE = Counter('pdf_header_base_total', 'Sheet fills by header base use (hit, miss, bypass)')
+RENDER_WORKERS = Gauge('pdf_render_workers', 'Render worker processes alive')
+PDF_TIMEOUTS = Counter('pdf_jobs_timed_out_total', 'PDF renders stopped at their deadline, by stage (render, convert)')
+PDF_CANCELLED = Counter('pdf_jobs_cancelled_total', 'PDF renders abandoned because the client disconnected')
+RENDER_RECYCLED = Counter('pdf_render_workers_recycled_total', 'Render worker processes retired, by reason (jobs, rss, crash)')
+
+
+# --- RECORDING ---
+def finish_request(route, method, status, seconds, query_log=None):
+    """Record a finished request; query_log is its backend.query_log.QueryLog, if any."""
+    if not ENABLED:
+        return
+    REQUEST_LATENCY.observe(seconds, route=route, method=method, status=status)
+    if query_log is not None:
+        DB_REQUEST_QUERIES.observe(query_log.queries, route=route)
+        DB_REQUEST_TIME.observe(query_log.seconds, route=route)
+    maybe_flush()
+
+
+def observe_query(statement, seconds):
+    """Record one database statement ('SELECT', 'INSERT', ...)."""
+    if not ENABLED:
+        return
+    DB_QUERIES.inc(statement=statement)
+    DB_QUERY_LATENCY.observe(seconds, statement=statement)
+
+
+def pdf_phase(sheet, phase):
+    """Context manager timing one phase of a sheet generation."""
+    return PDF_PHASE.time(sheet=sheet, phase=phase)
+
+
+def record_import(source, rows, seconds):
+    IMPORT_ROWS.inc(rows, source=source)
+    IMPORT_TIME.observe(seconds, source=source)
+
+
+# --- RENDER WORKERS ---
+def drain():
+    """Counters and histograms recorded since the last drain, cleared afterwards.
+
+    A render worker process sends these back with each result and its parent
+    absorb()s them, so the worker's phase timings show up in the parent's view.
+    """
+    with _lock:
+        snap = {
+            name: {'kind': family.kind, 'samples': [[list(map(list, key)), value] for key, value in family.samples.items()]}
+            for name, family in _families.items() if family.kind != 'gauge' and family.samples
+        }
+        for name in snap:
+            _families[name].samples = {}
+    return snap
+
+
+def absorb(snap):
+    """Add a drain()ed snapshot of another process to this process's samples."""
+    if not ENABLED or not snap:
+        return
+    with _lock:
+        for name, family in snap.items():
+            target = _families.get(name)
+            if target is None:
+                continue
+            for key, value in family['samples']:
+                key = tuple(map(tuple, key))
+                current = target.samples.get(key)
+                if current is None:
+                    target.samples[key] = _copy(value)
+                elif isinstance(value, list):
+                    current[0] = [a + b for a, b in zip(current[0], value[0])]
+                    current[1] += value[1]
+                    current[2] += value[2]
+                else:
+                    target.samples[key] = current + value
+
+
+# --- SNAPSHOTS (multi-process) ---
+def snapshot():
+    with _lock:
+        return {
+            name: {
+                'kind': family.kind,
+                'samples': [[list(map(list, key)), _copy(value)] for key, value in family.samples.items()],
+            }
+            for name, family in _families.items()
+        }
+
+
+def _copy(value):
+    return [list(value[0]), value[1], value[2]] if isinstance(value, list) else value
+
+
+_last_flush = 0.0
+
+
+def maybe_flush():
+    """Write this worker's snapshot if REVIEW_METRICS_DIR is set and FLUSH_INTERVAL has passed."""
+    global _last_flush
+    if not METRICS_DIR or time.monotonic() - _last_flush < FLUSH_INTERVAL:
+        return
+    _last_flush = time.monotonic()
+    flush()
+
+
+def flush():
+    if not METRICS_DIR:
+        return
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        path = os.path.join(METRICS_DIR, f'{os.getpid()}.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(snapshot(), f)
+        os.replace(path + '.tmp', path)
+    except OSError as e:
+        logger.warning(f"Could not write metrics snapshot: {e}")
+
+
+def clear_dir():
+    """Remove snapshots left by a previous run (call once at server start)."""
+    if METRICS_DIR and os.path.isdir(METRICS_DIR):
+        for name in os.listdir(METRICS_DIR):
+            if name.endswith('.json'):
+                os.remove(os.path.join(METRICS_DIR, name))
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+def _merge(into, snap, include_gauges=True):
+    for name, family in snap.items():
+        if family['kind'] == 'gauge' and not include_gauges:
+            continue
+        target = into.setdefault(name, {'kind': family['kind'], 'samples': {}})['samples']
+        for key, value in family['samples']:
+            key = tuple(map(tuple, key))
+            current = target.get(key)
+            if current is None:
+                target[key] = _copy(value)
+            elif isinstance(value, list):
+                current[0] = [a + b for a, b in zip(current[0], value[0])]
+                current[1] += value[1]
+                current[2] += value[2]
+            else:
+                target[key] = current + value
+
+
+def _to_snapshot(merged):
+    return {name: {'kind': fam['kind'], 'samples': [[list(map(list, k)), v] for k, v in fam['samples'].items()]}
+            for name, fam in merged.items()}
+
+
+def _compact(archive_path, archive, dead):
+    """Fold exited workers into the archive so the directory doesn't grow."""
+    try:
+        import fcntl
+    except ImportError:  # multi-process mode is a gunicorn (POSIX) feature
+        return
+    try:
+        with open(os.path.join(METRICS_DIR, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            if not all(os.path.exists(os.path.join(METRICS_DIR, name)) for name in dead):
+                return  # another scrape compacted them first
+            tmp_path = f'{archive_path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(_to_snapshot(archive), f)
+            os.replace(tmp_path, archive_path)
+            for name in dead:
+                os.remove(os.path.join(METRICS_DIR, name))
+    except OSError as e:  # includes a held lock: leave it to the next scrape
+        logger.debug(f"Metrics snapshots not compacted: {e}")
+
+
+def collect():
+    """Merged samples of this process and, in multi-process mode, every other worker."""
+    merged = {}
+    _merge(merged, snapshot())
+    if not METRICS_DIR or not os.path.isdir(METRICS_DIR):
+        return merged
+
+    archive_path = os.path.join(METRICS_DIR, 'archive.json')
+    archive = {}
+    dead = []
+    for name in os.listdir(METRICS_DIR):
+        if not name.endswith('.json') or name == 'archive.json':
+            continue
+        pid = int(name[:-5]) if name[:-5].isdigit() else None
+        if pid is None or pid == os.getpid():
+            continue
+        try:
+            with open(os.path.join(METRICS_DIR, name)) as f:
+                snap = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if _alive(pid):
+            _merge(merged, snap)
+        else:
+            _merge(archive, snap, include_gauges=False)
+            dead.append(name)
+
+    try:
+        with open(archive_path) as f:
+            _merge(archive, json.load(f))
+    except (OSError, ValueError):
+        pass
+    if dead:
+        _compact(archive_path, archive, dead)
+    _merge(merged, _to_snapshot(archive))
+    return merged
+
+
+# --- EXPOSITION ---
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(items, extra=()):
+    items = list(items) + list(extra)
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in items) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """All metrics in the Prometheus text format (version 0.0.4)."""
+    merged = collect()
+    lines = []
+    for name, family in _families.items():
+        samples = merged.get(name, {}).get('samples', {})
+        lines.append(f'# HELP {name} {family.help}')
+        lines.append(f'# TYPE {name} {family.kind}')
+        for key, value in sorted(samples.items()):
+            if family.kind == 'histogram':
+                buckets, total, count = value
+                cumulative = 0
+                for bound, n in zip(family.buckets, buckets):
+                    cumulative += n
+                    lines.append(f'{name}_bucket{_labels(key, [("le", _number(bound))])} {cumulative}')
+                lines.append(f'{name}_bucket{_labels(key, [("le", "+Inf")])} {count}')
+                lines.append(f'{name}_sum{_labels(key)} {_number(total)}')
+                lines.append(f'{name}_count{_labels(key)} {count}')
+            else:
+                lines.append(f'{name}{_labels(key)} {_number(value)}')
+    return '\n'.join(lines) + '\n'
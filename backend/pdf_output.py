@@ -0,0 +1,133 @@
+# pdf_output.py
+#
+# Where filled review sheets are written. Every sheet generator ends with
+# save_filled_pdf() so naming and save options live in one place.
+#
+# Size optimization levels (REVIEW_PDF_OPTIMIZE, default 2):
+#   0  plain save
+#   1  drop unreferenced objects, compress streams
+#   2  + strip empty widgets, compress fonts
+#   3  + subset fonts, merge duplicate objects, compress images, clean content streams
+#
+# Existing PDFs can be optimized in place for mailing/archiving:
+#   python -m backend.pdf_output generated_pdfs/*.pdf --level 3
+
+import os
+import sys
+import logging
+import argparse
+from datetime import datetime
+import backend.metrics as metrics
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OUTPUT_DIR = os.environ.get('REVIEW_OUTPUT_DIR', os.path.join(BASE_DIR, 'generated_pdfs'))
+OPTIMIZE_LEVEL = int(os.environ.get('REVIEW_PDF_OPTIMIZE', 2))
+
+SAVE_OPTIONS = {
+    0: {},
+    1: dict(garbage=1, deflate=True),
+    2: dict(garbage=3, deflate=True, deflate_fonts=True),
+    3: dict(garbage=4, deflate=True, deflate_fonts=True, deflate_images=True, clean=True),
+}
+
+
+def output_path(prefix, group_id, extension='pdf'):
+    """Path like generated_pdfs/Review_2_Group_BIA-01_20250807_162910_123456.pdf"""
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    safe_group = str(group_id).replace(os.sep, '_').replace('/', '_')
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')  # unique per concurrent request
+    return os.path.join(OUTPUT_DIR, f"{prefix}_Group_{safe_group}_{timestamp}.{extension}")
+
+
+def strip_empty_widgets(doc):
+    """Delete form fields that carry no value; returns how many were removed."""
+    removed = 0
+    kept = []
+    for page in doc:
+        for widget in list(page.widgets()):
+            if str(widget.field_value or '').strip():
+                kept.append(widget.xref)
+            else:
+                page.delete_widget(widget)
+                removed += 1
+
+    # delete_widget leaves the field in /AcroForm /Fields, which keeps it alive through garbage collection
+    if removed:
+        catalog = doc.pdf_catalog()
+        kind, value = doc.xref_get_key(catalog, 'AcroForm')
+        if not kept:
+            doc.xref_set_key(catalog, 'AcroForm', 'null')
+        elif kind == 'xref':
+            fields = '[' + ' '.join(f'{xref} 0 R' for xref in kept) + ']'
+            doc.xref_set_key(int(value.split()[0]), 'Fields', fields)
+    return removed
+
+
+def optimize(doc, level=None):
+    """Apply the in-document part of an optimization level; returns the save options."""
+    level = OPTIMIZE_LEVEL if level is None else max(0, min(int(level), 3))
+    if level >= 2:
+        strip_empty_widgets(doc)
+    if level >= 3:
+        try:
+            doc.subset_fonts()
+        except Exception as e:  # needs fontTools; keep the full fonts otherwise
+            logger.warning(f"Font subsetting skipped: {e}")
+    return SAVE_OPTIONS[level]
+
+
+def save_filled_pdf(doc, prefix, group_id, level=None):
+    """Optimize and save a filled PyMuPDF document, close it and return the output path."""
+    path = output_path(prefix, group_id)
+    try:
+        before = len(doc.tobytes())  # unoptimized, to report what the save options removed
+        with metrics.pdf_phase(prefix, 'save'):
+            doc.save(path, **optimize(doc, level))
+    finally:
+        doc.close()
+    size = os.path.getsize(path)
+    metrics.PDF_SIZE.observe(before, sheet=prefix, stage='unoptimized')
+    metrics.PDF_SIZE.observe(size, sheet=prefix, stage='saved')
+    logger.info(f"Saved {path}: {before} -> {size} bytes")
+    return path
+
+
+def optimize_file(path, level=None):
+    """Rewrite an existing PDF at the given level; returns (bytes_before, bytes_after)."""
+    import fitz
+    before = os.path.getsize(path)
+    doc = fitz.open(path)
+    try:
+        data = doc.tobytes(**optimize(doc, level))
+    finally:
+        doc.close()
+    if len(data) < before:
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return before, len(data)
+    return before, before
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Shrink generated review sheets in place")
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--level', type=int, default=3, choices=sorted(SAVE_OPTIONS))
+    args = parser.parse_args()
+
+    total_before = total_after = 0
+    for file_path in args.files:
+        try:
+            before, after = optimize_file(file_path, args.level)
+        except Exception as e:
+            print(f"❌ {file_path}: {e}", file=sys.stderr)
+            continue
+        total_before += before
+        total_after += after
+        print(f"{file_path}: {before:,} -> {after:,} bytes")
+
+    if total_before:
+        print(f"Total: {total_before:,} -> {total_after:,} bytes ({100 * (1 - total_after / total_before):.1f}% smaller)")
@@ -0,0 +1,159 @@
+# prefetch.py
+#
+# /fetch/<group_id>: everything a review page needs about a group in one
+# response (project, members, panel assignment, evaluators and the marks
+# already stored for it). /fetch?group_ids=a,b,c returns several groups in
+# one round trip. Missing entries are loaded with one query per table for
+# the whole batch and cached per group in shared_cache. Group IDs match
+# case-insensitively, as in the database: results are returned under the
+# ID asked for and cached under cache_key(group_id).
+
+from flask import Blueprint, request, jsonify
+import logging
+import backend.sheet1 as sheet1  # For database connection
+import backend.shared_cache as shared_cache
+import backend.review_marks as review_marks
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint('prefetch', __name__)
+
+MAX_BATCH = 200
+PANEL_FIELDS = ('track', 'panel_professors', 'location', 'guide', 'reviewer1', 'reviewer2', 'reviewer3')
+
+
+def _in_clause(values):
+    return ','.join(['%s'] * len(values))
+
+
+def cache_key(group_id):
+    return group_id.upper()
+
+
+def _query_groups(group_ids):
+    """Load uncached groups: one query per table for the whole batch; {cache_key: group}."""
+    placeholders = _in_clause(group_ids)
+    conn = sheet1.connect_db()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(f"SELECT * FROM projects WHERE group_id IN ({placeholders})", tuple(group_ids))
+        projects = {row['group_id']: row for row in cursor.fetchall()}
+        if not projects:
+            return {}
+        found = tuple(projects)
+        placeholders = _in_clause(found)
+
+        cursor.execute(
+            f"SELECT group_id, roll_no, student_name, contact_details FROM members WHERE group_id IN ({placeholders}) "
+            "ORDER BY group_id, id",
+            found
+        )
+        members = cursor.fetchall()
+
+        try:
+            cursor.execute(
+                f"SELECT group_id, {', '.join(PANEL_FIELDS)} FROM panel_assignments WHERE group_id IN ({placeholders})",
+                found
+            )
+            panels = {row['group_id']: row for row in cursor.fetchall()}
+        except Exception as e:  # no schedule imported yet
+            logger.warning(f"Panel assignments unavailable: {e}")
+            panels = {}
+
+        review_marks.ensure_table(cursor)
+        cursor.execute(
+            f"SELECT group_id, review_no, member_no, criterion, marks FROM review_marks WHERE group_id IN ({placeholders})",
+            found
+        )
+        marks = cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+    groups = {}
+    for group_id, project in projects.items():
+        group = {key: ('' if value is None else value) for key, value in project.items()}
+        panel = panels.get(group_id)
+        group.update({
+            "members": [],
+            "panel": {field: panel.get(field) or '' for field in PANEL_FIELDS} if panel else None,
+            "evaluators": [name for name in (project.get('evaluator1_name'), project.get('evaluator2_name')) if name],
+            "marks": {},
+            "totals": {},
+        })
+        groups[cache_key(group_id)] = group
+
+    for member in members:
+        groups[cache_key(member['group_id'])]['members'].append({
+            "roll_no": member['roll_no'] or '',
+            "student_name": member['student_name'] or '',
+            "contact_details": member['contact_details'] or '',
+        })
+
+    # marks[review][member][criterion], totals[review][member]
+    for row in marks:
+        group = groups[cache_key(row['group_id'])]
+        review, member, value = str(row['review_no']), str(row['member_no']), float(row['marks'])
+        group['marks'].setdefault(review, {}).setdefault(member, {})[row['criterion']] = value
+        review_totals = group['totals'].setdefault(review, {})
+        review_totals[member] = review_totals.get(member, 0.0) + value
+
+    return groups
+
+
+def get_groups(group_ids):
+    """{group_id as given: prefetch data} for the groups that exist, cached per group."""
+    result = {}
+    missing = []
+    for group_id in group_ids:
+        cached = shared_cache.get('prefetch', cache_key(group_id))
+        if cached is None:
+            missing.append(group_id)
+        else:
+            result[group_id] = cached
+
+    if missing:
+        loaded = _query_groups(missing)
+        for key, group in loaded.items():
+            shared_cache.set('prefetch', key, group)
+        for group_id in missing:
+            if cache_key(group_id) in loaded:
+                result[group_id] = loaded[cache_key(group_id)]
+    return result
+
+
+# --- COMBINED PREFETCH ---
+@bp.route('/fetch/<group_id>', methods=['GET'])
+def fetch_group(group_id):
+    try:
+        group_id = group_id.strip()
+        group = get_groups([group_id]).get(group_id)
+        if group is None:
+            return jsonify({'success': False, 'error': f'Group ID not found: {group_id}'}), 404
+        return jsonify(group)
+    except Exception as e:
+        logger.error(f"Prefetch failed for {group_id}: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@bp.route('/fetch', methods=['GET', 'POST'])
+def fetch_groups():
+    try:
+        if request.method == 'POST':
+            group_ids = (request.get_json(silent=True) or {}).get('group_ids') or []
+        else:
+            group_ids = request.args.get('group_ids', '').split(',')
+        # de-duplicate, keep request order
+        group_ids = list(dict.fromkeys(str(g).strip() for g in group_ids if str(g).strip()))
+        if not group_ids or len(group_ids) > MAX_BATCH:
+            return jsonify({'success': False, 'error': f'Provide 1-{MAX_BATCH} group_ids'}), 400
+
+        groups = get_groups(group_ids)
+        return jsonify({
+            'success': True,
+            'groups': groups,
+            'missing': [g for g in group_ids if g not in groups],
+        })
+    except Exception as e:
+        logger.error(f"Batch prefetch failed: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
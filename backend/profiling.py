@@ -0,0 +1,197 @@
+# profiling.py
+#
+# On-demand profiling of single requests. A request sent with the header
+# "X-Profile: 1" (or ?profile=1) from an allowed address is sampled every
+# REVIEW_PROFILE_INTERVAL_MS by a background thread that walks the stacks of
+# the request thread, of every SafeThread it starts and, in the render
+# worker processes, of the renders it runs (see render_pool). The result is a
+# collapsed-stack report ("frame;frame;frame count" per line), the input
+# format of flamegraph.pl, speedscope and similar tools:
+#
+#   X-Profile: 1       response as usual; report saved in REVIEW_PROFILE_DIR,
+#                      its name returned in the X-Profile-Report header and
+#                      downloadable from /api/profiles/<name>
+#   X-Profile: inline  the report replaces the response body
+#
+# Only clients in REVIEW_PROFILE_ALLOW (comma-separated addresses or
+# networks, e.g. "127.0.0.1,10.0.0.0/8") may profile, and when
+# REVIEW_PROFILE_TOKEN is set the X-Profile-Token header must match it.
+# With no allowlist (the default) profiling is off and costs nothing.
+
+import os
+import re
+import sys
+import hmac
+import time
+import logging
+import ipaddress
+import threading
+import contextvars
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROFILE_DIR = os.environ.get('REVIEW_PROFILE_DIR', os.path.join(BASE_DIR, 'cache', 'profiles'))
+INTERVAL = float(os.environ.get('REVIEW_PROFILE_INTERVAL_MS', 5)) / 1000
+TOKEN = os.environ.get('REVIEW_PROFILE_TOKEN', '')
+
+
+def _parse_allowlist(value):
+    networks = []
+    for item in value.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        try:
+            networks.append(ipaddress.ip_network(item, strict=False))
+        except ValueError:
+            logger.warning(f"Ignoring invalid REVIEW_PROFILE_ALLOW entry {item!r}")
+    return networks
+
+
+ALLOW = _parse_allowlist(os.environ.get('REVIEW_PROFILE_ALLOW', ''))
+ENABLED = bool(ALLOW)
+
+_REPORT_NAME = re.compile(r'^[\w.-]+\.collapsed$')
+
+
+def requested(request):
+    """The profile mode ('1' or 'inline') the request asks for and may use, or None."""
+    mode = request.headers.get('X-Profile') or request.args.get('profile')
+    if not mode or mode == '0':
+        return None
+    if not allowed(request):
+        logger.warning(f"Profiling refused for {request.remote_addr}")
+        return None
+    return 'inline' if mode == 'inline' else '1'
+
+
+def allowed(request):
+    if not ENABLED:
+        return False
+    try:
+        address = ipaddress.ip_address(request.remote_addr or '')
+    except ValueError:
+        return False
+    if not any(address in network for network in ALLOW):
+        return False
+    return not TOKEN or hmac.compare_digest(request.headers.get('X-Profile-Token', ''), TOKEN)
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Session:
+    """Samples the stacks of the threads taking part in one request."""
+
+    def __init__(self, interval=INTERVAL):
+        self.interval = interval
+        self.threads = {}  # ident -> thread name, root of its stacks
+        self.stacks = Counter()
+        self.samples = 0
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._run, name='profiler', daemon=True)
+
+    def add_thread(self, name=None):
+        """Sample the calling thread; its stacks are rooted at `name` (default: its class)."""
+        thread = threading.current_thread()
+        with self._lock:
+            self.threads[thread.ident] = name or type(thread).__name__
+
+    def remove_thread(self):
+        with self._lock:
+            self.threads.pop(threading.get_ident(), None)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._lock:
+                threads = list(self.threads.items())
+            for ident, name in threads:
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                if stack:
+                    stack.append(name)
+                    self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._sampler.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._sampler.join()
+        self.seconds = time.perf_counter() - self.started
+
+    def report(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+
+_session = contextvars.ContextVar('profile_session', default=None)
+
+
+def start():
+    """Profile the current thread and threads run through call() from its context."""
+    session = Session()
+    session.add_thread(name='request')
+    _session.set(session)
+    return session.start()
+
+
+def current():
+    """The profile session of the current context, or None."""
+    return _session.get()
+
+
+def absorb(stacks):
+    """Add collapsed stacks sampled elsewhere (a render worker) to the current session."""
+    session = _session.get()
+    if session is not None and stacks:
+        with session._lock:
+            session.stacks.update(stacks)
+
+
+def finish(session, route):
+    """Stop sampling; save the report and return (name, report text)."""
+    session.stop()
+    _session.set(None)
+    report = session.report()
+    slug = re.sub(r'[^\w]+', '_', route).strip('_') or 'root'
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{slug}-{os.getpid()}-{threading.get_ident() % 10000}.collapsed"
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        with open(os.path.join(PROFILE_DIR, name), 'w') as f:
+            f.write(report)
+    except OSError as e:
+        logger.warning(f"Could not save profile {name}: {e}")
+    logger.info(f"Profiled {route}: {session.samples} samples over {session.seconds * 1000:.0f} ms -> {name}")
+    return name, report
+
+
+def call(fn, *args, **kwargs):
+    """Run fn; if a profiled request started this work, sample this thread too."""
+    session = _session.get()
+    if session is None:
+        return fn(*args, **kwargs)
+    session.add_thread()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        session.remove_thread()
+
+
+def report_path(name):
+    """Path of a saved report, or None for names that are not reports."""
+    if not _REPORT_NAME.match(name):
+        return None
+    path = os.path.join(PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
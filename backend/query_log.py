@@ -0,0 +1,170 @@
+# query_log.py
+#
+# What the database is asked, per request. storage.Cursor reports every
+# statement here; each one is reduced to a fingerprint (literals and
+# placeholders become '?', IN lists collapse), so "one query per row" loops
+# show up as a single fingerprint with a large count.
+#
+#   - Per-request logs: the server opens one in before_request; the totals
+#     feed /metrics and a fingerprint repeated REVIEW_QUERY_REPEAT_WARN times
+#     in one request is logged as a likely N+1.
+#   - Slow queries: statements slower than REVIEW_SLOW_QUERY_MS are logged
+#     with the database's EXPLAIN output.
+#   - Query budgets: query_budget() fails a block (e.g. a test-client call)
+#     that issues more statements than allowed:
+#
+#         with query_log.query_budget(5):
+#             client.get('/api/projects')
+
+import os
+import re
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.environ.get('REVIEW_SLOW_QUERY_MS', 250))
+REPEAT_WARN = int(os.environ.get('REVIEW_QUERY_REPEAT_WARN', 20))
+
+_STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_NUMBER = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b')
+_PARAM = re.compile(r'%s|\?')
+_IN_LIST = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.I)
+_VALUES_LIST = re.compile(r'(\(\s*\?(?:\s*,\s*\?)*\s*\))(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))+')
+_SPACE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(sql):
+    """Normalized statement text: literals and placeholders as '?', one line."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PARAM.sub('?', sql)
+    sql = _IN_LIST.sub('IN (?+)', sql)
+    sql = _VALUES_LIST.sub(r'\1, ...', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+class QueryLog:
+    """Statement counts and time by fingerprint for one request (or budget block)."""
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.queries = 0
+        self.seconds = 0.0
+        self.by_fingerprint = {}  # fingerprint -> [count, seconds]
+        self._lock = threading.Lock()  # PDF worker threads share the request's log
+
+    def add(self, key, seconds, count=1):
+        with self._lock:
+            self.queries += count
+            self.seconds += seconds
+            entry = self.by_fingerprint.get(key)
+            if entry is None:
+                self.by_fingerprint[key] = [count, seconds]
+            else:
+                entry[0] += count
+                entry[1] += seconds
+
+    def top(self, n=5):
+        """The n most frequent fingerprints as (fingerprint, count, seconds)."""
+        ranked = sorted(self.by_fingerprint.items(), key=lambda item: item[1][0], reverse=True)
+        return [(key, count, seconds) for key, (count, seconds) in ranked[:n]]
+
+
+_current = contextvars.ContextVar('query_log', default=None)
+_warned = set()
+
+
+def current():
+    return _current.get()
+
+
+def record(sql, seconds):
+    """Count one statement in every open log; True if it was slow."""
+    log = _current.get()
+    if log is not None:
+        key = fingerprint(sql)
+        while log is not None:
+            log.add(key, seconds)
+            log = log.parent
+    return seconds * 1000 >= SLOW_QUERY_MS
+
+
+@contextmanager
+def capture():
+    """A log of the block's statements, not part of any request's (a render
+    worker's job; the caller merges it with absorb())."""
+    log = QueryLog()
+    token = _current.set(log)
+    try:
+        yield log
+    finally:
+        _current.reset(token)
+
+
+def absorb(by_fingerprint):
+    """Count statements run in another process for this context, in every open log."""
+    log = _current.get()
+    while log is not None:
+        for key, (count, seconds) in by_fingerprint.items():
+            log.add(key, seconds, count)
+        log = log.parent
+
+
+def log_slow(sql, seconds, plan):
+    detail = '\n'.join(f"    {' | '.join(map(str, row.values() if isinstance(row, dict) else row))}"
+                       for row in plan or ())
+    logger.warning(f"Slow query ({seconds * 1000:.1f} ms): {fingerprint(sql)}" + (f"\n{detail}" if detail else ''))
+
+
+def start_request():
+    """Open a log for the current request (threads started with its context share it)."""
+    log = QueryLog(parent=_current.get())
+    _current.set(log)
+    return log
+
+
+def finish_request(route):
+    """Close the request's log, warn about repeated statements and return it."""
+    log = _current.get()
+    if log is None:
+        return None
+    _current.set(log.parent)
+    for key, count, seconds in log.top(3):
+        if count < REPEAT_WARN:
+            break
+        # Once per route and statement; the counts stay visible in /metrics
+        level = logging.DEBUG if (route, key) in _warned else logging.WARNING
+        _warned.add((route, key))
+        logger.log(level, f"{route}: {count} x {key} ({seconds * 1000:.1f} ms), likely one query per row")
+    return log
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def query_budget(max_queries, max_repeats=None):
+    """Fail if the block issues more than max_queries statements, or any one
+    fingerprint more than max_repeats times. Yields the block's QueryLog."""
+    log = QueryLog(parent=_current.get())
+    token = _current.set(log)
+    try:
+        yield log
+    finally:
+        _current.reset(token)
+
+    problems = []
+    if log.queries > max_queries:
+        problems.append(f"{log.queries} queries (budget {max_queries})")
+    if max_repeats is not None:
+        problems += [f"{count} x {key} (max {max_repeats})" for key, count, _ in log.top(len(log.by_fingerprint))
+                     if count > max_repeats]
+    if problems:
+        busiest = '\n'.join(f"  {count:>5} x {key}" for key, count, _ in log.top())
+        raise QueryBudgetExceeded('; '.join(problems) + f"\nMost frequent statements:\n{busiest}")
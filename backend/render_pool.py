@@ -0,0 +1,363 @@
+# render_pool.py
+#
+# Process-isolated render workers. Filling PyMuPDF documents and building
+# ReportLab stories grows the heap of the process doing it, and memory freed
+# by Python is rarely returned to the OS, so renders in the server's own
+# threads leave the server bigger after every busy hour. Here each render
+# runs in a worker process instead; a worker is retired after MAX_JOBS
+# renders, or as soon as its resident memory passes MAX_RSS, and a fresh one
+# takes its place, so growth is bounded by what a single worker can reach.
+#
+# Workers are forked from a forkserver that has already imported the sheet
+# modules, so starting one is cheap. Idle workers are kept for reuse (up to
+# MAX_IDLE); the number running at once is bounded by backend.admission.
+#
+# Each server process has its own pool and forkserver. The forkserver is
+# started fresh (not forked from the gunicorn master), so it doesn't share
+# the master's preloaded pages: under gunicorn a host runs GUNICORN_WORKERS x
+# (1 forkserver + MAX_IDLE idle workers) processes, plus the renders in
+# progress. REVIEW_RENDER_IDLE_WORKERS is therefore a budget for the host,
+# split between the GUNICORN_WORKERS processes (gunicorn.conf.py sets it);
+# where the share is 0, every render starts a worker from the forkserver.
+#
+# A worker's metric samples travel back with each result, and so do, when
+# the caller has them open, its queries for the request's query log and the
+# stacks sampled for the request's profile. The batch renders of the
+# CLI and dossier cohorts run on the same workers (process_pool()).
+# Once a worker has exited, EXIT_HOOKS remove what it left on disk (its
+# LibreOffice profiles).
+#
+#   REVIEW_RENDER_ISOLATION=thread   render in a thread of the server process (old behavior)
+#   REVIEW_RENDER_MAX_JOBS           renders per worker before it is replaced (default 200)
+#   REVIEW_RENDER_MAX_RSS_MB         resident memory that retires a worker (default 512)
+#   REVIEW_RENDER_IDLE_WORKERS       idle workers kept on the host (default 2)
+#
+# Every render has a deadline, and a caller can ask for it to be cancelled
+# (the client went away). Either way the worker is killed together with
+# anything it started (its own process group, and the group of a converter
+# it registered with child_group()), and the caller gets RenderTimeout (a
+# TimeoutError) or RenderCancelled. In thread mode the caller stops waiting, but the thread
+# can't be stopped and finishes in the background.
+#
+#   REVIEW_PDF_TIMEOUT               seconds a render may take (default 60)
+#   REVIEW4_PDF_TIMEOUT              the same for Review IV / LibreOffice (default 100)
+
+import os
+import sys
+import time
+import importlib
+import signal
+import logging
+import threading
+import multiprocessing
+import backend.metrics as metrics
+import backend.profiling as profiling
+import backend.query_log as query_log
+from contextlib import contextmanager, nullcontext
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get('REVIEW_RENDER_ISOLATION', 'process') == 'process'
+MAX_JOBS = int(os.environ.get('REVIEW_RENDER_MAX_JOBS', 200))
+MAX_RSS = int(os.environ.get('REVIEW_RENDER_MAX_RSS_MB', 512)) * 1024 * 1024
+SERVER_PROCESSES = max(1, int(os.environ.get('GUNICORN_WORKERS', 1)))
+MAX_IDLE = int(os.environ.get('REVIEW_RENDER_IDLE_WORKERS', 2)) // SERVER_PROCESSES  # this process's share
+DEFAULT_TIMEOUT = float(os.environ.get('REVIEW_PDF_TIMEOUT', 60))
+TIMEOUTS = {4: float(os.environ.get('REVIEW4_PDF_TIMEOUT', 100))}
+POLL_INTERVAL = 0.25  # how often a waiting caller checks its deadline and should_cancel
+
+# Imported once in the forkserver; every worker starts with them loaded
+PRELOAD = ['backend.sheet1', 'backend.sheet2', 'backend.sheet3', 'backend.sheet4', 'backend.sheet5']
+
+# Called with a worker's pid once it has exited, to remove what it leaves behind
+EXIT_HOOKS = [('backend.sheet4', 'remove_libreoffice_profiles')]
+
+
+_context = None
+_context_lock = threading.Lock()
+_child_group = None  # in a worker: shared with the pool, the group of the converter the job is running
+
+
+def get_context():
+    """The multiprocessing context workers start from (forkserver where available)."""
+    global _context
+    with _context_lock:
+        if _context is None:
+            if 'forkserver' in multiprocessing.get_all_start_methods():
+                _context = multiprocessing.get_context('forkserver')
+                _context.set_forkserver_preload(PRELOAD)
+            else:
+                _context = multiprocessing.get_context('spawn')
+        return _context
+
+
+class RenderTimeout(TimeoutError):
+    pass
+
+
+class RenderCancelled(Exception):
+    pass
+
+
+def timeout_for(review_num):
+    return TIMEOUTS.get(review_num, DEFAULT_TIMEOUT)
+
+
+def rss():
+    """Resident memory of this process in bytes (peak RSS where /proc is missing)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+# --- WORKER PROCESS ---
+@contextmanager
+def child_group(pgid):
+    """While in the block, a kill of this render worker also kills process group
+    pgid (a converter started in its own session). Does nothing outside a worker."""
+    if _child_group is None:
+        yield
+        return
+    _child_group.value = pgid
+    try:
+        yield
+    finally:
+        _child_group.value = 0
+
+
+def _serve(conn, max_jobs, max_rss, child_pgid):
+    """Run jobs from the pipe until told to stop or over a limit."""
+    global _child_group
+    _child_group = child_pgid
+    if hasattr(os, 'setpgrp'):
+        os.setpgrp()  # so a kill reaches the processes a job starts
+    # SIGTERM unwinds the job, so its finally blocks stop converters and remove partial files
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(1))
+    jobs = 0
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        fn, args, kwargs, (profile_interval, log_queries) = job
+        session = None
+        if profile_interval:
+            session = profiling.Session(profile_interval)
+            session.add_thread(name='render-worker')
+            session.start()
+        with query_log.capture() if log_queries else nullcontext() as log:
+            try:
+                status, value = 'ok', fn(*args, **kwargs)
+            except Exception as e:
+                status, value = 'error', e
+        if session is not None:
+            session.stop()
+        trace = {'stacks': dict(session.stacks) if session else None,
+                 'queries': log.by_fingerprint if log is not None else None}
+        jobs += 1
+        memory = rss()
+        retire = 'jobs' if jobs >= max_jobs else 'rss' if memory > max_rss else None
+        try:
+            conn.send((status, value, memory, retire, metrics.drain(), trace))
+        except Exception as e:  # an exception that doesn't pickle
+            conn.send(('error', RuntimeError(f"{type(value).__name__}: {value}" if status == 'error' else str(e)),
+                       memory, retire, {}, trace))
+        if retire:
+            return
+
+
+class WorkerDied(RuntimeError):
+    pass
+
+
+class Worker:
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.child_pgid = context.RawValue('i', 0)
+        self.process = context.Process(target=_serve, args=(child_conn, MAX_JOBS, MAX_RSS, self.child_pgid),
+                                       name='render-worker', daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+        metrics.RENDER_WORKERS.inc()
+
+    def call(self, fn, args, kwargs, timeout=None, should_cancel=None):
+        """Run fn in the worker; returns (status, value, rss, retire).
+
+        Raises RenderTimeout after `timeout` seconds and RenderCancelled once
+        should_cancel() is true; the worker must then be killed.
+        """
+        # Trace the job for the caller's profile and query log, if it has them
+        session = profiling.current()
+        self.conn.send((fn, args, kwargs, (session.interval if session else None, query_log.current() is not None)))
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.conn.poll(POLL_INTERVAL):
+            if deadline is not None and time.monotonic() >= deadline:
+                raise RenderTimeout(f"render timed out after {timeout:g} s")
+            if should_cancel is not None and should_cancel():
+                raise RenderCancelled("render cancelled")
+        try:
+            status, value, memory, retire, samples, trace = self.conn.recv()
+        except (EOFError, OSError):
+            raise WorkerDied(f"Render worker {self.process.pid} exited unexpectedly "
+                             f"(exit code {self.process.exitcode})")
+        self.jobs += 1
+        metrics.absorb(samples)
+        if trace['queries']:
+            query_log.absorb(trace['queries'])
+        if trace['stacks']:
+            profiling.absorb(trace['stacks'])
+        return status, value, memory, retire
+
+    def stop(self, timeout=5):
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+        metrics.RENDER_WORKERS.dec()
+        _after_exit(self.process.pid)
+
+    def kill(self, grace=2):
+        """Stop a busy worker: SIGTERM lets the job clean up, then SIGKILL for
+        the worker's process group and a converter's group it left behind."""
+        self.process.terminate()
+        self.process.join(grace)
+        converter = self.child_pgid.value  # still set if the job didn't get to stop it
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except (AttributeError, OSError):  # no process groups, or already gone
+            if self.process.is_alive():
+                self.process.kill()
+        if converter:
+            try:
+                os.killpg(converter, signal.SIGKILL)
+            except OSError:
+                pass
+        self.process.join()
+        self.conn.close()
+        metrics.RENDER_WORKERS.dec()
+        _after_exit(self.process.pid)
+
+
+def _after_exit(pid):
+    for module_name, function_name in EXIT_HOOKS:
+        try:
+            getattr(importlib.import_module(module_name), function_name)(pid)
+        except Exception as e:
+            logger.warning(f"Cleanup after render worker {pid} failed ({module_name}.{function_name}): {e}")
+
+
+# --- POOL ---
+class Pool:
+    def __init__(self, max_idle=MAX_IDLE):
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _checkout(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return Worker(get_context())
+
+    def _checkin(self, worker):
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(worker)
+                return
+        worker.stop()
+
+    def run(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) in a worker process and return its result."""
+        return self.call(fn, args, kwargs)
+
+    def call(self, fn, args=(), kwargs=None, timeout=None, should_cancel=None):
+        """Run fn(*args, **kwargs) in a worker process and return its result.
+
+        fn and its arguments must pickle (module-level functions, plain data);
+        fn's exceptions are re-raised here. See Worker.call() for timeout and
+        should_cancel.
+        """
+        worker = self._checkout()
+        try:
+            status, value, memory, retire = worker.call(fn, args, kwargs or {}, timeout, should_cancel)
+        except WorkerDied:
+            metrics.RENDER_RECYCLED.inc(reason='crash')
+            worker.stop()
+            raise
+        except (RenderTimeout, RenderCancelled) as e:
+            logger.warning(f"Killing render worker {worker.process.pid}: {e}")
+            worker.kill()
+            raise
+        except BaseException:
+            worker.kill()  # the pipe may hold a half-read reply
+            raise
+
+        if retire:
+            logger.info(f"Retiring render worker {worker.process.pid} after {worker.jobs} jobs "
+                        f"at {memory / 2 ** 20:.0f} MB ({retire} limit)")
+            metrics.RENDER_RECYCLED.inc(reason=retire)
+            worker.stop()
+        else:
+            self._checkin(worker)
+
+        if status == 'error':
+            raise value
+        return value
+
+    def shutdown(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.stop()
+
+
+_pool = Pool()
+
+
+class Executor:
+    """A concurrent.futures-style executor whose tasks run in recycled worker
+    processes, for the batch renders of the CLI and dossier cohorts."""
+
+    def __init__(self, workers):
+        from concurrent.futures import ThreadPoolExecutor
+        self._pool = Pool(max_idle=workers)
+        self._threads = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='render')
+
+    def submit(self, fn, *args, **kwargs):
+        return self._threads.submit(self._pool.run, fn, *args, **kwargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._threads.shutdown(cancel_futures=exc_info[0] is not None)
+        self._pool.shutdown()
+
+
+def process_pool(workers):
+    return Executor(workers)
+
+
+def run(fn, *args, **kwargs):
+    """Run fn in this process's render pool."""
+    return _pool.run(fn, *args, **kwargs)
+
+
+def call(fn, args=(), kwargs=None, timeout=None, should_cancel=None):
+    return _pool.call(fn, args, kwargs, timeout, should_cancel)
+
+
+def shutdown():
+    _pool.shutdown()
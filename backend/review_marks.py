@@ -0,0 +1,221 @@
+# review_marks.py
+#
+# Marks entered on the review pages, persisted when a sheet is generated so
+# totals no longer live only in the browser's sessionStorage.
+#
+# One row per (group, review, member, criterion). Member is the column on the
+# sheet (1-4). Totals are summed by the database in one grouped query and
+# the per-group rollup is cached in shared_cache until marks change.
+
+import re
+import logging
+import threading
+import backend.sheet1 as sheet1
+import backend.shared_cache as shared_cache
+
+logger = logging.getLogger(__name__)
+
+# Not tied to projects by a foreign key: save_projects() rewrites the
+# projects table wholesale and must not cascade into recorded marks.
+REVIEW_MARKS_DDL = """
+    CREATE TABLE IF NOT EXISTS review_marks (
+        group_id VARCHAR(50) NOT NULL,
+        review_no TINYINT NOT NULL,
+        member_no TINYINT NOT NULL,
+        criterion VARCHAR(20) NOT NULL,
+        marks DECIMAL(6,2) NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (group_id, review_no, member_no, criterion)
+    )
+"""
+
+# Form field -> (member, criterion) for the mark cells of each review page.
+# Totals (*.s1, f8x) are derived, review 5 only shows the other reviews' totals.
+MARK_FIELD_PATTERNS = {
+    1: re.compile(r'^1\.([1-4])\.(\d+)$'),
+    2: re.compile(r'^2\.([1-4])\.(\d+)$'),
+    3: re.compile(r'^f([3-6])([1-4])$'),
+    4: re.compile(r'^f4\.([1-4])\.(\d+)$'),
+}
+
+# review-3.html names the criterion 4 cells f42, f41, f43, f44 for members 1-4
+REVIEW3_MEMBER_OVERRIDES = {'f41': 2, 'f42': 1}
+REVIEW3_FIELD_OVERRIDES = {(field[1], member_no): field for field, member_no in REVIEW3_MEMBER_OVERRIDES.items()}
+
+# Per-member total cell of each review page, filled by the page's script
+TOTAL_FIELDS = {1: '1.{member}.s1', 2: '2.{member}.s1', 3: 'f8{member}', 4: 'f4.{member}.s1'}
+
+MAX_MEMBERS = 4
+
+_table_ready = threading.Event()
+
+
+def ensure_table(cursor):
+    if not _table_ready.is_set():
+        cursor.execute(REVIEW_MARKS_DDL)
+        _table_ready.set()
+
+
+def extract_marks(review_num, form_data):
+    """Return [(member_no, criterion, marks)] for the numeric mark cells in a submission.
+
+    Non-numeric cells (the Y/N rows of Review II) and blanks are skipped.
+    """
+    pattern = MARK_FIELD_PATTERNS.get(review_num)
+    if pattern is None:
+        return []
+
+    marks = []
+    for field, value in form_data.items():
+        match = pattern.match(field)
+        if not match:
+            continue
+        try:
+            value = float(str(value).strip())
+        except (TypeError, ValueError):
+            continue
+
+        if review_num == 3:
+            criterion, member_no = match.group(1), int(match.group(2))
+            member_no = REVIEW3_MEMBER_OVERRIDES.get(field, member_no)
+        else:
+            member_no, criterion = int(match.group(1)), match.group(2)
+        marks.append((member_no, criterion, value))
+    return marks
+
+
+def mark_field(review_num, member_no, criterion):
+    """Form field of one mark cell; the inverse of extract_marks()."""
+    if review_num == 3:
+        return REVIEW3_FIELD_OVERRIDES.get((criterion, member_no), f"f{criterion}{member_no}")
+    prefix = 'f4' if review_num == 4 else str(review_num)
+    return f"{prefix}.{member_no}.{criterion}"
+
+
+def save_marks(review_num, form_data):
+    """Replace the stored marks of one group's review with those in `form_data`.
+
+    Returns the number of mark cells stored.
+    """
+    group_id = form_data.get('group_id')
+    if not group_id or review_num not in MARK_FIELD_PATTERNS:
+        return 0
+
+    marks = extract_marks(review_num, form_data)
+    conn = sheet1.connect_db()
+    cursor = conn.cursor()
+    try:
+        ensure_table(cursor)
+        conn.start_transaction()
+        cursor.execute(
+            "DELETE FROM review_marks WHERE group_id = %s AND review_no = %s",
+            (group_id, review_num)
+        )
+        if marks:
+            cursor.executemany(
+                """INSERT INTO review_marks (group_id, review_no, member_no, criterion, marks)
+                   VALUES (%s, %s, %s, %s, %s)""",
+                [(group_id, review_num, member_no, criterion, value) for member_no, criterion, value in marks]
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+    shared_cache.delete('review_totals', group_id)
+    shared_cache.delete('prefetch', str(group_id).upper())  # prefetch.cache_key
+    shared_cache.bump_version('data')
+    logger.info(f"Stored {len(marks)} review {review_num} marks for {group_id}")
+    return len(marks)
+
+
+def get_review_totals(group_id):
+    """Per-member totals of every review for a group, cached until its marks change."""
+    return shared_cache.get_or_set('review_totals', group_id, lambda: _query_review_totals(group_id))
+
+
+def get_mark_fields(group_id):
+    """The recorded marks of a group as review form fields, {review_no: {field: value}},
+    with the per-member totals the pages would have computed."""
+    conn = sheet1.connect_db()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        ensure_table(cursor)
+        cursor.execute(
+            "SELECT review_no, member_no, criterion, marks FROM review_marks WHERE group_id = %s",
+            (group_id,)
+        )
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+    forms = {}
+    totals = {}
+    for row in rows:
+        review_no, member_no, value = int(row['review_no']), int(row['member_no']), float(row['marks'])
+        forms.setdefault(review_no, {})[mark_field(review_no, member_no, str(row['criterion']))] = f"{value:g}"
+        totals[review_no, member_no] = totals.get((review_no, member_no), 0.0) + value
+    for (review_no, member_no), total in totals.items():
+        forms[review_no][TOTAL_FIELDS[review_no].format(member=member_no)] = f"{total:g}"
+    return forms
+
+
+def _query_review_totals(group_id):
+    conn = sheet1.connect_db()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        ensure_table(cursor)
+        cursor.execute("""
+            SELECT review_no, member_no, SUM(marks) AS total, COUNT(*) AS criteria
+            FROM review_marks
+            WHERE group_id = %s
+            GROUP BY review_no, member_no
+        """, (group_id,))
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+    reviews = {}
+    for row in rows:
+        reviews.setdefault(str(row['review_no']), {})[str(row['member_no'])] = float(row['total'])
+    return _summarize_totals(group_id, reviews)
+
+
+def totals_with(group_id, forms):
+    """get_review_totals() as it will be once the marks of `forms` ({review_no:
+    form data}) are saved; nothing is written."""
+    reviews = {review: dict(members) for review, members in get_review_totals(group_id)['reviews'].items()}
+    for review_num, form_data in forms.items():
+        members = {}
+        for member_no, _, value in extract_marks(review_num, form_data):
+            members[str(member_no)] = members.get(str(member_no), 0.0) + value
+        if members:  # save_marks replaces the review's marks
+            reviews[str(review_num)] = members
+    return _summarize_totals(group_id, reviews)
+
+
+def _summarize_totals(group_id, reviews):
+    final = {member_no: 0.0 for member_no in range(1, MAX_MEMBERS + 1)}
+    for members in reviews.values():
+        for member_no, total in members.items():
+            final[int(member_no)] = final.get(int(member_no), 0.0) + total
+
+    # Same names as the Review V form (review1_1 ... final_4) so the page can fill itself
+    fields = {}
+    for review_no in range(1, 5):
+        for member_no in range(1, MAX_MEMBERS + 1):
+            fields[f"review{review_no}_{member_no}"] = reviews.get(str(review_no), {}).get(str(member_no), 0.0)
+    for member_no, total in final.items():
+        fields[f"final_{member_no}"] = total
+
+    return {
+        "group_id": group_id,
+        "reviews": reviews,
+        "final": {str(member_no): total for member_no, total in final.items()},
+        "fields": fields,
+    }
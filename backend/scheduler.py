@@ -3,21 +3,18 @@
 from flask import Blueprint, render_template, request, jsonify, send_file
 import logging
 import io
-import pandas as pd
+import json
+import hashlib
 from datetime import datetime
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4, landscape
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib import colors
-from reportlab.lib.units import inch
-from reportlab.platypus.tableofcontents import TableOfContents
 import backend.sheet1 as sheet1  # For database connection
+import backend.shared_cache as shared_cache
 
 logger = logging.getLogger(__name__)
 
 bp = Blueprint('scheduler', __name__, template_folder='templates')
 
+SCHEDULE_PDF_TTL = 120  # seconds; the PDF is keyed to the minute it prints
+
 # --- SCHEDULER UI PAGE ---
 @bp.route('/scheduler')
 def scheduler_page():
@@ -214,6 +211,7 @@ def generate_smart_schedule():
         conn.commit()
         cursor.close()
         conn.close()
+        shared_cache.invalidate_project_data()
 
         return jsonify({
             'success': True,
@@ -324,6 +322,7 @@ def sync_evaluator_data():
         conn.commit()
         cursor.close()
         conn.close()
+        shared_cache.invalidate_project_data()
         
         return jsonify({
             'success': True,
@@ -337,6 +336,13 @@ def sync_evaluator_data():
 # --- ENHANCED PDF WITH DYNAMIC CELL HEIGHT AND BATCH TERMINOLOGY ---
 @bp.route('/api/generate-schedule-pdf', methods=['POST'])
 def generate_schedule_pdf():
+    # ReportLab is only needed here; importing it at module level slows server start
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib import colors
+    from reportlab.lib.units import inch
+
     try:
         # Get schedule data using EXACT working database query
         conn = sheet1.connect_db()
@@ -369,6 +375,21 @@ def generate_schedule_pdf():
         if not schedule_data:
             return jsonify({'success': False, 'error': 'No schedule data available'}), 400
 
+        # Same rows in the same minute -> same PDF (it prints the generation time
+        # to the minute); any worker may already have rendered it
+        generated_at = datetime.now().strftime('%B %d, %Y at %I:%M %p')
+        artifact_key = 'schedule:' + hashlib.sha256(
+            json.dumps([generated_at, schedule_data], sort_keys=True, default=str).encode('utf-8')
+        ).hexdigest()
+        cached_pdf = shared_cache.get('artifact', artifact_key)
+        if cached_pdf is not None:
+            return send_file(
+                io.BytesIO(cached_pdf),
+                as_attachment=True,
+                download_name=f'batch_schedule_dynamic_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf',
+                mimetype='application/pdf'
+            )
+
         # Create PDF with enhanced dynamic cell sizing
         buffer = io.BytesIO()
         doc = SimpleDocTemplate(
@@ -403,7 +424,7 @@ def generate_schedule_pdf():
             alignment=1,
             textColor=colors.Color(0.4, 0.4, 0.4)
         )
-        story.append(Paragraph(f"Generated on {datetime.now().strftime('%B %d, %Y at %I:%M %p')} | Total Groups: {len(schedule_data)} | Dynamic Cell Sizing Enabled", subtitle_style))
+        story.append(Paragraph(f"Generated on {generated_at} | Total Groups: {len(schedule_data)} | Dynamic Cell Sizing Enabled", subtitle_style))
         story.append(Spacer(1, 15))
 
         # Helper function to wrap text for Paragraphs in cells
@@ -659,7 +680,7 @@ def generate_schedule_pdf():
         • <b>Division B:</b> {div_b_total} groups<br/>
         • <b>Total Batches:</b> {len(sorted_batches)}<br/>
         <br/>
-        <b>Generated:</b> {datetime.now().strftime('%B %d, %Y at %I:%M %p')}
+        <b>Generated:</b> {generated_at}
         """
         
         summary_content_style = ParagraphStyle(
@@ -681,6 +702,7 @@ def generate_schedule_pdf():
             # Fallback: try building with simpler table structure
             return jsonify({'success': False, 'error': f'PDF generation failed: {str(build_error)}'}), 500
             
+        shared_cache.set('artifact', artifact_key, buffer.getvalue(), ttl=SCHEDULE_PDF_TTL)
         buffer.seek(0)
 
         return send_file(
@@ -0,0 +1,169 @@
+# search_index.py
+#
+# In-memory typeahead index over group IDs, roll numbers, student names and
+# project titles, built from one bulk query. Each kind of key lives in its
+# own sorted array, so a prefix lookup is a bisect plus a walk of at most
+# `limit` entries. Names and titles are indexed from each of their words to
+# the end, so "pat" finds "Riya Patil" and "health distrib" finds "Health
+# Distributed Ledger" as well as "Smart Health Distributed ...". When nothing matches the prefix, IDs and roll numbers
+# one typo away are found through a table of single-character deletions.
+#
+# Each process keeps its own index and rebuilds it when the shared
+# 'projects' data version changes (imports and project saves bump it).
+
+import re
+import time
+import bisect
+import logging
+import threading
+import backend.sheet1 as sheet1  # For database connection
+import backend.shared_cache as shared_cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+KINDS = ('group', 'roll', 'student', 'title')  # result order
+FUZZY_KINDS = ('group', 'roll')
+FUZZY_MIN_LENGTH = 4
+
+_NON_ALNUM = re.compile(r'[^0-9a-z]+')
+
+
+def normalize(text):
+    """Lowercase and drop separators, so 'BIA-01', 'bia 01' and 'bia01' agree."""
+    return _NON_ALNUM.sub('', str(text or '').lower())
+
+
+def _word_suffixes(text):
+    """Normalized keys of the text from each word on: 'Riya S Patil' -> riyaspatil, spatil, patil."""
+    words = [normalize(word) for word in text.split()]
+    return {''.join(words[i:]) for i in range(len(words))}
+
+
+def _deletions(key):
+    return {key[:i] + key[i + 1:] for i in range(len(key))}
+
+
+class SearchIndex:
+    def __init__(self, rows=()):
+        entries = {kind: set() for kind in KINDS}  # kind -> {(key, value, group_id, label)}
+        for row in rows:
+            group_id = str(row['group_id'])
+            title = str(row.get('project_title') or '')
+            entries['group'].add((normalize(group_id), group_id, group_id, title))
+            for key in _word_suffixes(title):
+                entries['title'].add((key, title, group_id, title))
+            roll_no = str(row.get('roll_no') or '')
+            name = str(row.get('student_name') or '')
+            if roll_no:
+                entries['roll'].add((normalize(roll_no), roll_no, group_id, name))
+            for key in _word_suffixes(name):
+                entries['student'].add((key, name, group_id, roll_no))
+
+        self.entries = {kind: sorted(e for e in items if e[0]) for kind, items in entries.items()}
+        self.keys = {kind: [e[0] for e in items] for kind, items in self.entries.items()}
+
+        # deletion variant -> keys it came from; two keys one edit apart share a variant
+        self.typos = {}
+        for kind in FUZZY_KINDS:
+            for key in set(self.keys[kind]):
+                if len(key) >= FUZZY_MIN_LENGTH:
+                    for variant in _deletions(key) | {key}:
+                        self.typos.setdefault(variant, set()).add(key)
+
+    def __len__(self):
+        return sum(len(items) for items in self.entries.values())
+
+    def _walk(self, kind, key, limit, exact=False):
+        """Up to `limit` entries of one kind whose key starts with (or equals) `key`."""
+        keys = self.keys[kind]
+        lo = bisect.bisect_left(keys, key)
+        hi = lo
+        while hi < len(keys) and hi - lo < limit and (keys[hi] == key if exact else keys[hi].startswith(key)):
+            hi += 1
+        return self.entries[kind][lo:hi]
+
+    def _collect(self, keys, limit, fuzzy):
+        results = []
+        seen = set()
+        for kind in KINDS:
+            for key in keys:
+                for _, value, group_id, label in self._walk(kind, key, limit, exact=fuzzy):
+                    if (kind, value, group_id) in seen:
+                        continue
+                    seen.add((kind, value, group_id))
+                    results.append({'kind': kind, 'value': value, 'group_id': group_id,
+                                    'label': label, 'fuzzy': fuzzy})
+                    if len(results) >= limit:
+                        return results
+        return results
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        key = normalize(query)
+        if not key:
+            return []
+        results = self._collect((key,), limit, fuzzy=False)
+        if results or len(key) < FUZZY_MIN_LENGTH:
+            return results
+
+        close = set()
+        for variant in _deletions(key) | {key}:
+            close |= self.typos.get(variant, set())
+        return self._collect(sorted(close), limit, fuzzy=True)
+
+
+_index = None
+_index_version = None
+_lock = threading.Lock()
+
+
+def _load_rows():
+    conn = sheet1.connect_db()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("""
+            SELECT p.group_id, p.project_title, m.roll_no, m.student_name
+            FROM projects p
+            LEFT JOIN members m ON m.group_id = p.group_id
+        """)
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _build(version):
+    global _index, _index_version
+    start = time.perf_counter()
+    _index, _index_version = SearchIndex(_load_rows()), version
+    logger.info(f"Search index rebuilt: {len(_index)} keys in {(time.perf_counter() - start) * 1000:.1f} ms")
+    return _index
+
+
+def rebuild():
+    """Rebuild this process's index from the database."""
+    with _lock:
+        return _build(shared_cache.get_version('projects'))
+
+
+def refresh():
+    """Rebuild after an import; a failure only defers the rebuild to the next search."""
+    try:
+        rebuild()
+    except Exception as e:
+        logger.warning(f"Search index rebuild failed: {e}")
+
+
+def get_index():
+    """The current index, rebuilt first if project data changed since it was built."""
+    version = shared_cache.get_version('projects')
+    if _index is None or _index_version != version:
+        with _lock:  # one rebuild at a time; later callers reuse it
+            if _index is None or _index_version != version:
+                _build(version)
+    return _index
+
+
+def search(query, limit=DEFAULT_LIMIT):
+    return get_index().search(query, max(1, min(int(limit), MAX_LIMIT)))
@@ -0,0 +1,149 @@
+# shared_cache.py
+#
+# Small SQLite-backed key/value cache shared by every worker process on the
+# box (a local stand-in for Redis). Used for project details and generated
+# artifacts so a multi-process deployment does not redo the same work per
+# worker. Values are pickled; every entry belongs to a namespace and may
+# carry a TTL.
+
+import os
+import time
+import pickle
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DB_PATH = os.environ.get('REVIEW_CACHE_DB', os.path.join(BASE_DIR, 'cache', 'shared_cache.sqlite3'))
+
+# Default lifetimes (seconds) per namespace; None means no expiry
+DEFAULT_TTLS = {
+    'project': 300,
+    'project_docx': 300,
+    'artifact': 24 * 3600,
+    'review_totals': 3600,  # also dropped whenever the group's marks are saved
+    'prefetch': 300,
+    'header_base': 7 * 24 * 3600,  # content-addressed; see header_layer.py
+}
+
+# Namespaces derived from projects/members/panel_assignments rows (header_base
+# is keyed by the header values themselves, so it survives a data change)
+PROJECT_NAMESPACES = ('project', 'project_docx', 'prefetch')
+
+_local = threading.local()
+
+
+def _connect():
+    """One connection per thread and per process (connections must not cross fork)."""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.pid == os.getpid():
+        return conn
+
+    os.makedirs(os.path.dirname(CACHE_DB_PATH), exist_ok=True)
+    conn = sqlite3.connect(CACHE_DB_PATH, timeout=10, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS cache (
+            namespace TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value BLOB NOT NULL,
+            expires_at REAL,
+            PRIMARY KEY (namespace, key)
+        )
+    """)
+    _local.conn = conn
+    _local.pid = os.getpid()
+    return conn
+
+
+def get(namespace, key, default=None):
+    """Return the cached value or `default` if missing/expired."""
+    try:
+        row = _connect().execute(
+            "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?",
+            (namespace, str(key))
+        ).fetchone()
+    except sqlite3.Error as e:
+        logger.warning(f"Shared cache read failed: {e}")
+        return default
+
+    if row is None:
+        return default
+    value, expires_at = row
+    if expires_at is not None and expires_at < time.time():
+        delete(namespace, key)
+        return default
+    return pickle.loads(value)
+
+
+def set(namespace, key, value, ttl=None):
+    """Store a value; ttl defaults to DEFAULT_TTLS for the namespace."""
+    if ttl is None:
+        ttl = DEFAULT_TTLS.get(namespace)
+    expires_at = time.time() + ttl if ttl else None
+    try:
+        _connect().execute(
+            "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (namespace, str(key), sqlite3.Binary(pickle.dumps(value, pickle.HIGHEST_PROTOCOL)), expires_at)
+        )
+    except sqlite3.Error as e:
+        logger.warning(f"Shared cache write failed: {e}")
+
+
+def delete(namespace, key):
+    try:
+        _connect().execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (namespace, str(key)))
+    except sqlite3.Error as e:
+        logger.warning(f"Shared cache delete failed: {e}")
+
+
+def get_or_set(namespace, key, loader, ttl=None):
+    """Return the cached value, calling loader() and caching its result on a miss."""
+    missing = object()
+    value = get(namespace, key, missing)
+    if value is missing:
+        value = loader()
+        set(namespace, key, value, ttl)
+    return value
+
+
+def invalidate(*namespaces):
+    """Drop every entry in the given namespaces."""
+    try:
+        conn = _connect()
+        for namespace in namespaces:
+            conn.execute("DELETE FROM cache WHERE namespace = ?", (namespace,))
+    except sqlite3.Error as e:
+        logger.warning(f"Shared cache invalidate failed: {e}")
+
+
+def invalidate_project_data():
+    """Call after projects/members/panel assignments change."""
+    invalidate(*PROJECT_NAMESPACES)
+    bump_version('data')
+    bump_version('projects')
+
+
+def get_version(name):
+    """Current token of a named data version (0 until first bumped)."""
+    return get('version', name, 0)
+
+
+def bump_version(name):
+    """Start a new data version; results cached under the old token stop matching."""
+    set('version', name, time.time_ns())
+
+
+def purge_expired():
+    """Delete expired entries; returns the number removed."""
+    try:
+        cursor = _connect().execute(
+            "DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),)
+        )
+        return cursor.rowcount
+    except sqlite3.Error as e:
+        logger.warning(f"Shared cache purge failed: {e}")
+        return 0
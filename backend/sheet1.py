@@ -1,26 +1,24 @@
-import fitz  # PyMuPDF
 import os
-import mysql.connector
 import logging
 from datetime import datetime
+import backend.shared_cache as shared_cache
+import backend.storage as storage
+import backend.template_cache as template_cache
+import backend.pdf_output as pdf_output
+import backend.flatten as flatten
+import backend.header_layer as header_layer
 
 logger = logging.getLogger(__name__)
 
 def connect_db():
-    """Database connection with error handling."""
-    try:
-        return mysql.connector.connect(
-            host="localhost",
-            user="root", 
-            password="1234",
-            database="project_review",
-            autocommit=True,
-        )
-    except mysql.connector.Error as e:
-        logger.error(f"Database connection error: {e}")
-        raise
+    """Database connection (MySQL or SQLite, see backend/storage.py)."""
+    return storage.connect()
 
 def fetch_project_details(group_id):
+    """Fetch project and members info, cached across workers; raise error if not found."""
+    return shared_cache.get_or_set('project', group_id, lambda: _query_project_details(group_id))
+
+def _query_project_details(group_id):
     """Fetch project and members info from DB; raise error if not found."""
     conn = connect_db()
     cursor = conn.cursor()
@@ -38,14 +36,14 @@ def fetch_project_details(group_id):
         
         # Fetch member details
         cursor.execute(
-            "SELECT roll_no, student_name, contact_details FROM members WHERE group_id=%s", (group_id,)
+            "SELECT roll_no, student_name, contact_details FROM members WHERE group_id=%s ORDER BY id", (group_id,)
         )
         members = cursor.fetchall()
         
         if not members:
             raise ValueError(f"No members found for group_id: {group_id}")
         
-    except mysql.connector.Error as e:
+    except storage.Error as e:
         logger.error(f"Database error: {e}")
         raise
     finally:
@@ -64,8 +62,11 @@ def fetch_project_details(group_id):
         "members": members,
     }
 
-def process_fields(doc, data):
-    """Fill all form fields with data, make transparent and read-only."""
+def process_fields(doc, data, only=None):
+    """Fill all form fields with data, make transparent and read-only.
+
+    With `only`, widgets whose name is not in it are left as they are.
+    """
     filled_count = 0
     
     for page_num in range(len(doc)):
@@ -76,6 +77,8 @@ def process_fields(doc, data):
             field_name = getattr(widget, "field_name", None)
             if not field_name:
                 continue
+            if only is not None and field_name not in only:
+                continue
 
             # Make transparent
             try:
@@ -134,28 +137,10 @@ def process_fields(doc, data):
 
     return filled_count
 
-def generate_fillable_pdf(form_data, template_path=None):
-    if template_path is None:
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        template_path = os.path.join(base_dir, "pdf_templates", "Review-I-Sheet.pdf")
-    """Generate PDF with filled form fields."""
-    if not form_data:
-        raise ValueError("form_data cannot be empty")
-        
-    group_id = form_data.get("group_id")
-    if not group_id:
-        raise ValueError("group_id is required")
-
-    if not os.path.isfile(template_path):
-        raise FileNotFoundError(f"PDF template not found: {template_path}")
-
-    # This will raise an error if group_id is not found
-    project_info = fetch_project_details(group_id)
-    
-    # Build field values dictionary
+def header_fields(project_info):
+    """Sheet fields that come from the project record (the same on every evaluation)."""
     field_values = {
         "group_id": str(project_info.get("group_id") or ""),
-        "date": str(form_data.get("date") or ""),
         "project_title": str(project_info.get("project_title") or ""),
         "guide_name": str(project_info.get("guide_name") or ""),
         "mentor_name": str(project_info.get("mentor_name") or ""),
@@ -176,6 +161,30 @@ def generate_fillable_pdf(form_data, template_path=None):
             field_values[f"student_{idx}"] = str(member[1] or "")
             field_values[f"contact_{idx}"] = str(member[2] or "")
 
+    return field_values
+
+def generate_fillable_pdf(form_data, template_path=None):
+    if template_path is None:
+        template_path = template_cache.REVIEW_TEMPLATES[1]
+    """Generate PDF with filled form fields."""
+    if not form_data:
+        raise ValueError("form_data cannot be empty")
+        
+    group_id = form_data.get("group_id")
+    if not group_id:
+        raise ValueError("group_id is required")
+
+    if not os.path.isfile(template_path):
+        raise FileNotFoundError(f"PDF template not found: {template_path}")
+
+    # This will raise an error if group_id is not found
+    project_info = fetch_project_details(group_id)
+    
+    # Project header: group, guide, mentor, reviewers and members
+    field_values = header_fields(project_info)
+    header = dict(field_values)
+    field_values["date"] = str(form_data.get("date") or "")
+
     # Map form responses
     que_to_pdf_field_map = {
         'que_1.1.1': '1.1.1id', 'que_1.1.2': '1.1.2id', 'que_1.1.3': '1.1.3id',
@@ -191,9 +200,12 @@ def generate_fillable_pdf(form_data, template_path=None):
         pdf_key = que_to_pdf_field_map.get(key, key)
         field_values[pdf_key] = val_str
 
-    # Process PDF
-    doc = fitz.open(template_path)
-    filled_count = process_fields(doc, field_values)
+    # Process PDF (on the group's pre-filled header base when one is cached)
+    doc, filled_count = header_layer.fill(1, 'Review_1', template_path, header, field_values,
+                                         flatten.render_mode(form_data), process_fields)
+    logger.info(f"Filled {filled_count} fields for {group_id}")
+
+    return pdf_output.save_filled_pdf(doc, "Review_1", group_id)
 
 
 if __name__ == "__main__":
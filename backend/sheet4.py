@@ -1,21 +1,39 @@
-import mysql.connector
-from docx import Document
 import os
+import glob
+import shutil
+import signal
+import pathlib
+import logging
+import tempfile
+import threading
 import subprocess
+from contextlib import contextmanager
+import backend.shared_cache as shared_cache
+import backend.storage as storage
+import backend.template_cache as template_cache
+import backend.pdf_output as pdf_output
+import backend.metrics as metrics
+import backend.docx_template as docx_template
+import backend.render_pool as render_pool
+
+logger = logging.getLogger(__name__)
+
+# Seconds a LibreOffice conversion may take; below the Review IV render
+# deadline (REVIEW4_PDF_TIMEOUT) so a hung converter is cleaned up here first
+LIBREOFFICE_TIMEOUT = float(os.environ.get('REVIEW_LIBREOFFICE_TIMEOUT', 90))
+
+class ConversionTimeout(TimeoutError):
+    pass
 
 def connect_db():
-    """Connect to the MySQL database."""
-    try:
-        return mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password="1234",
-            database="project_review"
-        )
-    except mysql.connector.Error as err:
-        raise Exception(f"Database connection error: {err}")
+    """Database connection (MySQL or SQLite, see backend/storage.py)."""
+    return storage.connect()
 
 def fetch_project_details(group_id):
+    """Fetch project and members' details by group_id, cached across workers."""
+    return shared_cache.get_or_set('project_docx', group_id, lambda: _query_project_details(group_id))
+
+def _query_project_details(group_id):
     """Fetch project and members' details from the database by group_id."""
     conn = connect_db()
     if conn is None:
@@ -26,7 +44,7 @@ def fetch_project_details(group_id):
         cursor.execute("SELECT * FROM projects WHERE group_id = %s", (group_id,))
         project = cursor.fetchone()
 
-        cursor.execute("SELECT roll_no, student_name, contact_details FROM members WHERE group_id = %s", (group_id,))
+        cursor.execute("SELECT roll_no, student_name, contact_details FROM members WHERE group_id = %s ORDER BY id", (group_id,))
         members = cursor.fetchall()
 
         if project:
@@ -46,14 +64,14 @@ def fetch_project_details(group_id):
                 ]
             }
         raise Exception("Group ID not found")
-    except mysql.connector.Error as err:
+    except storage.Error as err:
         raise Exception(f"Database query error: {err}")
     finally:
         cursor.close()
         conn.close()
 
 def replace_placeholders(doc, placeholders):
-    """Replace placeholders in the Word document."""
+    """Replace placeholders in the Word document (REVIEW_DOCX_ENGINE=python-docx)."""
     for paragraph in doc.paragraphs:
         for placeholder, value in placeholders.items():
             if placeholder in paragraph.text:
@@ -66,32 +84,71 @@ def replace_placeholders(doc, placeholders):
                     if placeholder in cell.text:
                         cell.text = cell.text.replace(placeholder, str(value))
 
+# LibreOffice profiles in use. Conversions sharing one profile (a dossier, a
+# process pool) block on its lock or fail, so each running conversion gets
+# its own; profiles are reused by later conversions of the same process and
+# removed when a render worker exits (remove_libreoffice_profiles).
+PROFILE_DIR = os.path.join(tempfile.gettempdir(), "review-libreoffice-{pid}-{slot}")
+_free_profiles = []
+_profile_count = 0
+_profile_lock = threading.Lock()
+
+@contextmanager
+def libreoffice_profile():
+    global _profile_count
+    with _profile_lock:
+        if _free_profiles:
+            slot = _free_profiles.pop()
+        else:
+            _profile_count += 1
+            slot = _profile_count
+    try:
+        yield PROFILE_DIR.format(pid=os.getpid(), slot=slot)
+    finally:
+        with _profile_lock:
+            _free_profiles.append(slot)
+
+def remove_libreoffice_profiles(pid):
+    """Delete the profiles of a process that has exited."""
+    for path in glob.glob(PROFILE_DIR.format(pid=pid, slot='*')):
+        shutil.rmtree(path, ignore_errors=True)
+
 def convert_to_pdf_libreoffice(docx_path, output_dir):
     """Convert DOCX to PDF using LibreOffice in Ubuntu."""
-    try:
-        subprocess.run([
+    with libreoffice_profile() as profile_dir:
+        command = [
             "libreoffice",
+            f"-env:UserInstallation={pathlib.Path(profile_dir).as_uri()}",
             "--headless",
             "--convert-to", "pdf",
             "--outdir", output_dir,
             docx_path
-        ], check=True)
-    except subprocess.CalledProcessError as e:
-        raise Exception(f"LibreOffice PDF conversion failed: {str(e)}")
-
-def generate_review4_pdf(data):
-    """Generate Review-IV PDF and return the file path."""
-    group_id = data.get('group_id')
-    project_data = fetch_project_details(group_id)
-    if not project_data:
-        raise Exception("Group ID not found or database error")
+        ]
+        # Own process group: the launcher forks soffice.bin, which must go down with it.
+        # In a render worker the pool is told the group, so killing the worker reaches it too.
+        process = subprocess.Popen(command, start_new_session=True)
+        with render_pool.child_group(process.pid):
+            try:
+                returncode = process.wait(timeout=LIBREOFFICE_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                metrics.PDF_TIMEOUTS.inc(review=4, stage='convert')
+                raise ConversionTimeout(f"LibreOffice conversion timed out after {LIBREOFFICE_TIMEOUT:g} s")
+            finally:
+                if process.poll() is None:  # timed out, or the render is being cancelled
+                    kill_process_group(process)
+                    shutil.rmtree(profile_dir, ignore_errors=True)  # may be left locked
+        if returncode != 0:
+            raise Exception(f"LibreOffice PDF conversion failed: {subprocess.CalledProcessError(returncode, command)}")
 
-    template_path = os.path.abspath('Review-IV Sheet.docx')
-    if not os.path.exists(template_path):
-        raise Exception("Template file not found")
-
-    doc = Document(template_path)
+def kill_process_group(process):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (AttributeError, OSError):
+        process.kill()
+    process.wait()
 
+def review4_placeholders(project_data, data):
+    """Template placeholders ("{{date}}") and their values for one sheet."""
     placeholders = {
         "{{group_id}}": project_data["group_id"],
         "{{date}}": data.get('date', ''),
@@ -143,17 +200,61 @@ def generate_review4_pdf(data):
         placeholders[f"{{{{student_{i}}}}}"] = ""
         placeholders[f"{{{{contact_{i}}}}}"] = ""
 
-    replace_placeholders(doc, placeholders)
+    return placeholders
+
+def generate_review4_pdf(data):
+    """Generate Review-IV PDF and return the file path."""
+    group_id = data.get('group_id')
+    project_data = fetch_project_details(group_id)
+    if not project_data:
+        raise Exception("Group ID not found or database error")
+
+    template_path = template_cache.REVIEW_TEMPLATES[4]
+    if not os.path.exists(template_path):
+        raise Exception("Template file not found")
 
-    filled_doc_path = os.path.abspath('Filled_Form_Review_IV.docx')
-    doc.save(filled_doc_path)
+    with metrics.pdf_phase('Review_4', 'open'):
+        if docx_template.ENABLED:
+            template = docx_template.get_template(template_path)  # compiled once per template version
+        else:
+            from docx import Document  # python-docx is only needed on this route
+            doc = Document(template_path)
+
+    placeholders = review4_placeholders(project_data, data)
+
+    filled_doc_path = pdf_output.output_path('Review_4', group_id, 'docx')
+    if docx_template.ENABLED:
+        with metrics.pdf_phase('Review_4', 'fill'):
+            content = template.render(placeholders)
+        with metrics.pdf_phase('Review_4', 'save'):
+            with open(filled_doc_path, 'wb') as f:
+                f.write(content)
+    else:
+        with metrics.pdf_phase('Review_4', 'fill'):
+            replace_placeholders(doc, placeholders)
+        with metrics.pdf_phase('Review_4', 'save'):
+            doc.save(filled_doc_path)
 
     # Convert DOCX to PDF using LibreOffice
     output_dir = os.path.dirname(filled_doc_path)
-    convert_to_pdf_libreoffice(filled_doc_path, output_dir)
+    pdf_output_path = os.path.splitext(filled_doc_path)[0] + '.pdf'
+    try:
+        with metrics.pdf_phase('Review_4', 'convert'):
+            convert_to_pdf_libreoffice(filled_doc_path, output_dir)
+    except BaseException:
+        # Failed, timed out or cancelled: leave no half-written files behind
+        for path in (filled_doc_path, pdf_output_path):
+            if os.path.exists(path):
+                os.remove(path)
+        raise
 
-    pdf_output_path = os.path.join(output_dir, 'Filled_Form_Review_IV.pdf')
     if not os.path.exists(pdf_output_path):
         raise Exception("PDF generation failed")
 
+    with metrics.pdf_phase('Review_4', 'optimize'):
+        before, after = pdf_output.optimize_file(pdf_output_path)
+    metrics.PDF_SIZE.observe(before, sheet='Review_4', stage='unoptimized')
+    metrics.PDF_SIZE.observe(after, sheet='Review_4', stage='saved')
+    logger.info(f"Optimized {pdf_output_path}: {before} -> {after} bytes")
+
     return pdf_output_path
@@ -0,0 +1,74 @@
+# single_flight.py
+#
+# Coalesces identical concurrent work. The first caller for a key runs the
+# function; callers arriving with the same key while it runs wait for it
+# and get the same result (or the same exception). Nothing is kept once the
+# call finishes; repeat requests after that are the artifact cache's job.
+#
+#     flights = single_flight.Group()
+#     result, shared = flights.do(key, render)
+#
+# An error that only concerns the caller that ran the function (e.g. its
+# client went away) is listed in `retry`: the waiting callers then don't get
+# it but try again, and one of them runs the function.
+
+import threading
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.waiters = 0
+        self.result = None
+        self.error = None
+
+
+class Group:
+    def __init__(self, retry=()):
+        self.retry = tuple(retry)  # errors of a run that its waiting callers don't share
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, *args, **kwargs):
+        """Run fn once per key at a time; returns (result, shared) where shared
+        is True for callers that reused another caller's run."""
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+                else:
+                    call.waiters += 1
+            if leader:
+                break
+
+            call.done.wait()
+            if call.error is None:
+                return call.result, True
+            if not isinstance(call.error, self.retry):
+                raise call.error
+            # the run failed for its own caller only: run it (or join the next run)
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def waiting(self, key):
+        """How many callers are waiting on the run of `key` besides the one running it."""
+        with self._lock:
+            call = self._calls.get(key)
+            return call.waiters if call else 0
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
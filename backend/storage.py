@@ -0,0 +1,557 @@
+# storage.py
+#
+# Database access for every module. connect() returns a connection with the
+# small mysql.connector-style surface the code uses (cursor(dictionary=...),
+# %s placeholders, executemany, description/rowcount, commit/rollback/
+# start_transaction) on top of one of two backends:
+#
+#   mysql   the MySQL server (default); REVIEW_DB_HOST/PORT/USER/PASSWORD/NAME
+#   sqlite  an embedded SQLite file in WAL mode (REVIEW_SQLITE_PATH), for
+#           laptops, CI and benchmarks; no server, no network round trips
+#
+# Chosen with REVIEW_DB_BACKEND. The SQL in the modules stays MySQL; the
+# SQLite backend rewrites the MySQL-only parts (INSERT IGNORE, ON DUPLICATE
+# KEY UPDATE, REPLACE, CAST AS UNSIGNED, REGEXP, UPDATE ... JOIN, FOR UPDATE
+# and MySQL DDL) once per distinct statement. Driver errors surface as
+# storage.Error / storage.IntegrityError whichever backend is in use.
+#
+# Connecting never changes an existing schema. A database set up before a
+# schema change is brought up to date explicitly, and says so in the log:
+#
+#   python -m backend.storage --migrate
+#   REVIEW_DB_MIGRATE=1                 migrate at server start (wsgi.py, server.py)
+
+import os
+import re
+import time
+import logging
+import threading
+from datetime import datetime
+from functools import lru_cache
+import backend.metrics as metrics
+import backend.query_log as query_log
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BACKEND = os.environ.get('REVIEW_DB_BACKEND', 'mysql').lower()
+BACKENDS = ('mysql', 'sqlite')
+MIGRATE_ON_START = os.environ.get('REVIEW_DB_MIGRATE', '0') == '1'
+
+MYSQL_CONFIG = {
+    'host': os.environ.get('REVIEW_DB_HOST', 'localhost'),
+    'port': int(os.environ.get('REVIEW_DB_PORT', 3306)),
+    'user': os.environ.get('REVIEW_DB_USER', 'root'),
+    'password': os.environ.get('REVIEW_DB_PASSWORD', '1234'),
+    'database': os.environ.get('REVIEW_DB_NAME', 'project_review'),
+}
+
+SQLITE_PATH = os.environ.get('REVIEW_SQLITE_PATH', os.path.join(BASE_DIR, 'data', 'project_review.sqlite3'))
+
+# Tables that create_database.sql / the MySQL server provide; created on
+# first use in SQLite mode (in MySQL syntax, through the same translation)
+SQLITE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS projects (
+        group_id VARCHAR(50) PRIMARY KEY,
+        division VARCHAR(5),
+        project_domain VARCHAR(255),
+        project_title VARCHAR(500),
+        sponsor_company VARCHAR(255),
+        guide_name VARCHAR(100),
+        mentor_name VARCHAR(100),
+        mentor_email VARCHAR(100),
+        mentor_mobile VARCHAR(20),
+        evaluator1_name VARCHAR(100),
+        evaluator2_name VARCHAR(100)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS members (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        group_id VARCHAR(50),
+        roll_no VARCHAR(50),
+        student_name VARCHAR(100),
+        contact_details VARCHAR(100),
+        FOREIGN KEY (group_id) REFERENCES projects(group_id) ON DELETE CASCADE,
+        UNIQUE KEY unique_roll (roll_no),
+        KEY idx_members_group (group_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS panel_assignments (
+        group_id VARCHAR(50) PRIMARY KEY,
+        track VARCHAR(10),
+        panel_professors TEXT,
+        location VARCHAR(100),
+        guide VARCHAR(100),
+        reviewer1 VARCHAR(100),
+        reviewer2 VARCHAR(100),
+        reviewer3 VARCHAR(100)
+    )
+    """,
+]
+
+
+# members.id keeps a group's members in sheet order; databases created
+# without it get it from migrate() (existing rows numbered in stored order)
+MEMBERS_ID_DDL = "ALTER TABLE members ADD COLUMN id INT AUTO_INCREMENT PRIMARY KEY FIRST"
+
+
+class Error(Exception):
+    """A database error from either backend (the driver's exception is the __cause__)."""
+
+
+class IntegrityError(Error):
+    """Duplicate key, foreign key or NOT NULL violation."""
+
+
+# --- SQLITE DIALECT ---
+_PLACEHOLDER = re.compile(r'%s')
+_INSERT_IGNORE = re.compile(r'\bINSERT\s+IGNORE\b', re.I)
+_REPLACE_INTO = re.compile(r'^(\s*)REPLACE\s+INTO\b', re.I)
+_CAST_UNSIGNED = re.compile(r'\bAS\s+(?:UNSIGNED|SIGNED)(?:\s+INTEGER)?\b', re.I)
+_ON_DUPLICATE = re.compile(r'\bON\s+DUPLICATE\s+KEY\s+UPDATE\b', re.I)
+_VALUES_REF = re.compile(r'\bVALUES\s*\(\s*(\w+)\s*\)', re.I)
+_FOR_UPDATE = re.compile(r'\s+FOR\s+UPDATE\s*$', re.I)
+_UPDATE_JOIN = re.compile(
+    r'^\s*UPDATE\s+(\w+)\s+(?:AS\s+)?(\w+)\s+(?:INNER\s+)?JOIN\s+(\w+)\s+(?:AS\s+)?(\w+)\s+ON\s+(.+?)'
+    r'\s+SET\s+(.+?)(?:\s+WHERE\s+(.+?))?\s*$',
+    re.I | re.S
+)
+_CREATE_TABLE = re.compile(r'^\s*CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)', re.I)
+_AUTO_INCREMENT = re.compile(r'\bINT(?:EGER)?\s+(?:PRIMARY\s+KEY\s+AUTO_INCREMENT|AUTO_INCREMENT\s+PRIMARY\s+KEY)\b', re.I)
+_ON_UPDATE_NOW = re.compile(r'(\w+)\s+(?:TIMESTAMP|DATETIME)([^,\n]*?)\s+ON\s+UPDATE\s+CURRENT_TIMESTAMP', re.I)
+_UNIQUE_KEY = re.compile(r'\bUNIQUE\s+(?:KEY|INDEX)\s+\w+\s*\(', re.I)
+_PLAIN_KEY = re.compile(r',\s*(?:KEY|INDEX)\s+(\w+)\s*\(([^)]*)\)', re.I)
+_ENUM = re.compile(r'\bENUM\s*\([^)]*\)', re.I)
+_TABLE_OPTIONS = re.compile(r'\)\s*(?:ENGINE|DEFAULT\s+CHARSET|CHARSET)\b[^)]*$', re.I)
+_TEXT_COLUMN = re.compile(r'\b((?:VAR)?CHAR\s*\(\s*\d+\s*\)|TEXT)(?!\s+COLLATE)', re.I)
+
+
+def _translate_ddl(sql, table):
+    """MySQL CREATE TABLE -> SQLite; returns (statement, follow-up statements)."""
+    extra = []
+    sql = _AUTO_INCREMENT.sub('INTEGER PRIMARY KEY AUTOINCREMENT', sql)
+    for column in _ON_UPDATE_NOW.findall(sql):
+        column = column[0]
+        extra.append(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_{column}_touch AFTER UPDATE ON {table} "
+            f"FOR EACH ROW WHEN NEW.{column} IS OLD.{column} "
+            f"BEGIN UPDATE {table} SET {column} = CURRENT_TIMESTAMP WHERE rowid = NEW.rowid; END"
+        )
+    sql = re.sub(r'\s+ON\s+UPDATE\s+CURRENT_TIMESTAMP', '', sql, flags=re.I)
+    sql = _UNIQUE_KEY.sub('UNIQUE (', sql)
+    for name, columns in _PLAIN_KEY.findall(sql):
+        extra.append(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+    sql = _PLAIN_KEY.sub('', sql)
+    sql = _ENUM.sub('TEXT', sql)
+    sql = _TABLE_OPTIONS.sub(')', sql)
+    # MySQL's default collation compares strings case-insensitively
+    sql = _TEXT_COLUMN.sub(r'\1 COLLATE NOCASE', sql)
+    return sql, tuple(extra)
+
+
+def _translate_update_join(match):
+    target, alias, joined, joined_alias, on, assignments, where = match.groups()
+    # SQLite's SET takes bare column names of the target table
+    assignments = re.sub(rf'\b{alias}\.(\w+)\s*=', r'\1 =', assignments)
+    condition = f"({on})" + (f" AND ({where})" if where else '')
+    return f"UPDATE {target} AS {alias} SET {assignments} FROM {joined} AS {joined_alias} WHERE {condition}"
+
+
+@lru_cache(maxsize=1024)
+def translate_sqlite(sql):
+    """Rewrite one MySQL statement for SQLite; returns (statement, follow-up statements)."""
+    extra = ()
+    create = _CREATE_TABLE.match(sql)
+    if create:
+        sql, extra = _translate_ddl(sql, create.group(1))
+
+    update_join = _UPDATE_JOIN.match(sql)
+    if update_join:
+        sql = _translate_update_join(update_join)
+
+    sql = _PLACEHOLDER.sub('?', sql).replace('%%', '%')
+    sql = _INSERT_IGNORE.sub('INSERT OR IGNORE', sql)
+    sql = _REPLACE_INTO.sub(r'\1INSERT OR REPLACE INTO', sql)
+    sql = _CAST_UNSIGNED.sub('AS INTEGER', sql)
+    sql = _FOR_UPDATE.sub('', sql)  # start_transaction() already holds the write lock
+
+    duplicate = _ON_DUPLICATE.search(sql)
+    if duplicate:
+        updates = _VALUES_REF.sub(r'excluded.\1', sql[duplicate.end():])
+        sql = sql[:duplicate.start()] + 'ON CONFLICT DO UPDATE SET' + updates
+    return sql, extra
+
+
+@lru_cache(maxsize=256)
+def _compile_regexp(pattern):
+    return re.compile(pattern)
+
+
+def _regexp(pattern, value):
+    if pattern is None or value is None:
+        return None
+    return 1 if _compile_regexp(pattern).search(str(value)) else 0
+
+
+def _parse_timestamp(value):
+    return datetime.fromisoformat(value.decode())
+
+
+EXPLAINABLE = ('SELECT', 'UPDATE', 'DELETE', 'INSERT', 'REPLACE')
+
+
+@lru_cache(maxsize=1024)
+def statement_type(sql):
+    """'SELECT', 'INSERT', ... for metrics labels."""
+    words = sql.split(None, 1)
+    return words[0].upper() if words else ''
+
+
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+# --- CONNECTION / CURSOR ---
+class Cursor:
+    """Wraps a driver cursor: dialect translation, error mapping and query accounting."""
+
+    def __init__(self, raw, backend):
+        self._raw = raw
+        self._backend = backend
+
+    def _observe(self, sql, statement, params, seconds):
+        kind = statement_type(sql)
+        metrics.observe_query(kind, seconds)
+        if query_log.record(sql, seconds):
+            plan = self._backend.explain(statement, params) if kind in EXPLAINABLE else None
+            query_log.log_slow(sql, seconds, plan)
+
+    def execute(self, sql, params=()):
+        statement, extra = self._backend.translate(sql)
+        start = time.perf_counter()
+        try:
+            self._raw.execute(statement, params or ())
+            for follow_up in extra:
+                self._raw.execute(follow_up)
+        except self._backend.errors as e:
+            raise self._backend.wrap_error(e) from e
+        finally:
+            self._observe(sql, statement, params, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_params):
+        statement, _ = self._backend.translate(sql)
+        if not isinstance(seq_of_params, (list, tuple)):
+            seq_of_params = list(seq_of_params)  # the first row is needed again for EXPLAIN
+        start = time.perf_counter()
+        try:
+            self._raw.executemany(statement, seq_of_params)
+        except self._backend.errors as e:
+            raise self._backend.wrap_error(e) from e
+        finally:
+            # a slow batch is explained with its first row
+            self._observe(sql, statement, seq_of_params[0] if seq_of_params else None,
+                          time.perf_counter() - start)
+
+    def fetchone(self):
+        return self._raw.fetchone()
+
+    def fetchall(self):
+        return self._raw.fetchall()
+
+    def fetchmany(self, size=1):
+        return self._raw.fetchmany(size)
+
+    @property
+    def description(self):
+        return self._raw.description
+
+    @property
+    def rowcount(self):
+        return self._raw.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._raw.lastrowid
+
+    def close(self):
+        self._raw.close()
+
+    def __iter__(self):
+        return iter(self._raw)
+
+
+class Connection:
+    """Wraps a driver connection; cursors come back wrapped as well."""
+
+    def __init__(self, raw, backend):
+        self._raw = raw
+        self._backend = backend
+
+    @property
+    def backend(self):
+        return self._backend.name
+
+    def cursor(self, dictionary=False):
+        return Cursor(self._backend.cursor(self._raw, dictionary), self._backend)
+
+    def _call(self, method, *args):
+        try:
+            return method(*args)
+        except self._backend.errors as e:
+            raise self._backend.wrap_error(e) from e
+
+    def start_transaction(self):
+        self._call(self._backend.begin, self._raw)
+
+    def commit(self):
+        self._call(self._raw.commit)
+
+    def rollback(self):
+        self._call(self._raw.rollback)
+
+    def close(self):
+        self._raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _explain(backend, sql, params):
+    """Plan rows for a slow statement, on a fresh connection so the caller's
+    cursor (and any unread result on it) is left alone."""
+    try:
+        raw = backend.connect()
+        try:
+            cursor = raw.cursor()
+            cursor.execute(sql, params or ())
+            return cursor.fetchall()
+        finally:
+            raw.close()
+    except backend.errors as e:
+        return [(f"EXPLAIN failed: {e}",)]
+
+
+class MySQLBackend:
+    name = 'mysql'
+
+    def __init__(self):
+        import mysql.connector  # loaded on first DB access, not at server start
+        self._driver = mysql.connector
+        self.errors = mysql.connector.Error
+        self._ready = threading.Event()
+        self._ready_lock = threading.Lock()
+
+    def connect(self, check=True):
+        raw = self._driver.connect(autocommit=True, **MYSQL_CONFIG)
+        if not self._ready.is_set():
+            self._prepare(raw, check)
+        return raw
+
+    def _prepare(self, raw, check):
+        """Check the schema, once per process."""
+        with self._ready_lock:
+            if self._ready.is_set():
+                return
+            try:
+                if check:
+                    _warn_pending(self.pending_migrations(raw))
+            except self.errors as e:  # no members table yet (create_database.sql adds it with id)
+                logger.warning(f"Could not check the schema: {e}")
+            self._ready.set()
+
+    def pending_migrations(self, raw):
+        cursor = raw.cursor()
+        try:
+            cursor.execute("SHOW COLUMNS FROM members LIKE 'id'")
+            return [] if cursor.fetchall() else ['members.id']
+        finally:
+            cursor.close()
+
+    def apply_migration(self, raw, name):
+        cursor = raw.cursor()
+        try:
+            cursor.execute(MEMBERS_ID_DDL)
+        finally:
+            cursor.close()
+
+    def cursor(self, raw, dictionary):
+        return raw.cursor(dictionary=dictionary)
+
+    def begin(self, raw):
+        raw.start_transaction()
+
+    def translate(self, sql):
+        return sql, ()
+
+    def explain(self, statement, params):
+        return _explain(self, 'EXPLAIN ' + statement, params)
+
+    def wrap_error(self, e):
+        cls = IntegrityError if isinstance(e, self._driver.IntegrityError) else Error
+        return cls(str(e))
+
+
+class SQLiteBackend:
+    name = 'sqlite'
+
+    def __init__(self, path=SQLITE_PATH):
+        import sqlite3
+        self._driver = sqlite3
+        self.path = path
+        self.errors = sqlite3.Error
+        self._ready = threading.Event()
+        self._ready_lock = threading.Lock()
+        sqlite3.register_converter('TIMESTAMP', _parse_timestamp)
+        sqlite3.register_converter('DATETIME', _parse_timestamp)
+
+    def connect(self, check=True):
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # isolation_level=None: autocommit like the MySQL connections, explicit BEGIN for transactions
+        raw = self._driver.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False,
+                                   detect_types=self._driver.PARSE_DECLTYPES)
+        raw.execute("PRAGMA foreign_keys=ON")
+        raw.execute("PRAGMA synchronous=NORMAL")
+        raw.create_function('REGEXP', 2, _regexp, deterministic=True)
+        if not self._ready.is_set():
+            self._prepare(raw, check)
+        return raw
+
+    def _prepare(self, raw, check):
+        """WAL mode and the missing base tables, once per process; check the schema."""
+        with self._ready_lock:
+            if self._ready.is_set():
+                return
+            raw.execute("PRAGMA journal_mode=WAL")
+            for ddl in SQLITE_SCHEMA:
+                statement, extra = self.translate(ddl)
+                for sql in (statement,) + extra:
+                    raw.execute(sql)
+            if check:
+                _warn_pending(self.pending_migrations(raw))
+            self._ready.set()
+
+    def pending_migrations(self, raw):
+        columns = [row[1] for row in raw.execute("PRAGMA table_info(members)")]
+        return [] if 'id' in columns else ['members.id']
+
+    def apply_migration(self, raw, name):
+        """SQLite can't add a primary key column: rebuild members, keeping the row order."""
+        statement, extra = self.translate(next(ddl for ddl in SQLITE_SCHEMA if ' members (' in ddl))
+        columns = 'group_id, roll_no, student_name, contact_details'
+        raw.execute("BEGIN IMMEDIATE")
+        try:
+            raw.execute("ALTER TABLE members RENAME TO members_without_id")
+            raw.execute(statement)
+            raw.execute(f"INSERT INTO members ({columns}) SELECT {columns} FROM members_without_id ORDER BY rowid")
+            raw.execute("DROP TABLE members_without_id")  # and its indexes, so they can be created again
+            for sql in extra:
+                raw.execute(sql)
+            raw.execute("COMMIT")
+        except BaseException:
+            raw.execute("ROLLBACK")
+            raise
+
+    def cursor(self, raw, dictionary):
+        cursor = raw.cursor()
+        if dictionary:
+            cursor.row_factory = _dict_row
+        return cursor
+
+    def begin(self, raw):
+        # IMMEDIATE takes the write lock now, standing in for SELECT ... FOR UPDATE
+        if not raw.in_transaction:
+            raw.execute("BEGIN IMMEDIATE")
+
+    def translate(self, sql):
+        return translate_sqlite(sql)
+
+    def explain(self, statement, params):
+        return _explain(self, 'EXPLAIN QUERY PLAN ' + statement, params)
+
+    def wrap_error(self, e):
+        cls = IntegrityError if isinstance(e, self._driver.IntegrityError) else Error
+        return cls(str(e))
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if BACKEND not in BACKENDS:
+                    raise ValueError(f"REVIEW_DB_BACKEND must be one of {BACKENDS}, not {BACKEND!r}")
+                _backend = SQLiteBackend() if BACKEND == 'sqlite' else MySQLBackend()
+    return _backend
+
+
+def driver_module():
+    """The DB driver module to pre-import at warm-up."""
+    return 'sqlite3' if BACKEND == 'sqlite' else 'mysql.connector'
+
+
+def connect():
+    """Open a connection to the configured backend (autocommit on)."""
+    backend = get_backend()
+    try:
+        return Connection(backend.connect(), backend)
+    except backend.errors as e:
+        logger.error(f"Database connection error ({backend.name}): {e}")
+        raise backend.wrap_error(e) from e
+
+
+# --- MIGRATIONS ---
+def _warn_pending(pending):
+    if pending:
+        logger.error(f"Database schema out of date (missing {', '.join(pending)}); "
+                     f"run `python -m backend.storage --migrate` or start with REVIEW_DB_MIGRATE=1")
+
+
+def migrate():
+    """Apply the pending schema changes to the configured database; returns their names."""
+    backend = get_backend()
+    raw = backend.connect(check=False)
+    try:
+        pending = backend.pending_migrations(raw)
+        for name in pending:
+            logger.warning(f"Migrating {backend.name} database: adding {name}")
+            start = time.perf_counter()
+            backend.apply_migration(raw, name)
+            logger.warning(f"Migrated {name} in {time.perf_counter() - start:.1f} s")
+        return pending
+    except backend.errors as e:
+        raise backend.wrap_error(e) from e
+    finally:
+        raw.close()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(prog='python -m backend.storage',
+                                     description="Check or update the schema of the configured database")
+    parser.add_argument('--migrate', action='store_true', help="apply the pending changes")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    if args.migrate:
+        applied = migrate()
+        print(f"Applied: {', '.join(applied)}" if applied else "Schema up to date")
+    else:
+        backend = get_backend()
+        raw = backend.connect(check=False)
+        try:
+            pending = backend.pending_migrations(raw)
+        finally:
+            raw.close()
+        print(f"Pending: {', '.join(pending)} (run with --migrate)" if pending else "Schema up to date")
@@ -0,0 +1,69 @@
+# template_cache.py
+#
+# Keeps the review sheet templates in memory so each fill opens the PDF from
+# bytes instead of re-reading and re-parsing the file from disk. When the
+# server is preloaded before forking (see wsgi.py) the bytes live in pages
+# shared copy-on-write by every worker.
+
+import os
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATE_DIR = os.path.join(BASE_DIR, 'pdf_templates')
+
+REVIEW_TEMPLATES = {
+    1: os.path.join(TEMPLATE_DIR, 'Review-I-Sheet.pdf'),
+    2: os.path.join(TEMPLATE_DIR, 'Review-II-Sheet.pdf'),
+    3: os.path.join(TEMPLATE_DIR, 'Review-III-Sheet.pdf'),
+    4: os.path.join(BASE_DIR, 'backend', 'Review-IV Sheet.docx'),
+    5: os.path.join(TEMPLATE_DIR, 'Review-V-Sheet.pdf'),
+}
+
+_templates = {}
+_lock = threading.Lock()
+
+
+def get_template_bytes(path):
+    """Return the template file contents, re-reading only if the file changed."""
+    path = os.path.abspath(path)
+    mtime = os.path.getmtime(path)
+    entry = _templates.get(path)
+    if entry is not None and entry[0] == mtime:
+        return entry[1]
+
+    with _lock:
+        entry = _templates.get(path)
+        if entry is None or entry[0] != mtime:
+            with open(path, 'rb') as f:
+                data = f.read()
+            entry = (mtime, data, hashlib.sha256(data).hexdigest()[:16])
+            _templates[path] = entry
+    return entry[1]
+
+
+def get_template_version(path):
+    """Short content hash of the template; changes whenever the file does."""
+    get_template_bytes(path)
+    return _templates[os.path.abspath(path)][2]
+
+
+def open_template(path):
+    """Open a PDF template with PyMuPDF from the in-memory copy."""
+    import fitz  # PyMuPDF
+    return fitz.open("pdf", get_template_bytes(path))
+
+
+def preload_templates():
+    """Read every review template into memory; returns the number loaded."""
+    loaded = 0
+    for review_num, path in REVIEW_TEMPLATES.items():
+        if os.path.isfile(path):
+            get_template_bytes(path)
+            loaded += 1
+        else:
+            logger.warning(f"Review {review_num} template missing: {path}")
+    return loaded
@@ -0,0 +1,74 @@
+# warmup.py
+#
+# The heavy libraries (pandas, PyMuPDF, ReportLab, python-docx, the
+# database driver) are imported lazily by the routes that need them so the
+# server starts quickly. warm_up() imports them ahead of time: wsgi.py calls
+# it synchronously before forking, server.py can run it in a background
+# thread right after start-up.
+
+import os
+import time
+import logging
+import importlib
+import threading
+import backend.storage as storage
+
+logger = logging.getLogger(__name__)
+
+HEAVY_MODULES = [
+    storage.driver_module(),
+    'fitz',
+    'pandas',
+    'reportlab.platypus',
+    'docx',
+    'backend.sheet1',
+    'backend.sheet2',
+    'backend.sheet3',
+    'backend.sheet4',
+    'backend.sheet5',
+]
+
+_started = threading.Event()
+
+
+def warm_up(modules=None, templates=True):
+    """Import the heavy modules and (optionally) read the templates into memory.
+
+    Returns {module: seconds} for each module that was imported.
+    """
+    timings = {}
+    for name in modules or HEAVY_MODULES:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logger.warning(f"Warm-up skipped {name}: {e}")
+            continue
+        timings[name] = time.perf_counter() - start
+
+    if templates:
+        import backend.template_cache as template_cache
+        template_cache.preload_templates()
+
+        import backend.docx_template as docx_template
+        if docx_template.ENABLED and os.path.isfile(template_cache.REVIEW_TEMPLATES[4]):
+            docx_template.get_template(template_cache.REVIEW_TEMPLATES[4])
+
+        import backend.flatten as flatten
+        if flatten.DEFAULT_MODE == 'flatten':
+            for path in template_cache.REVIEW_TEMPLATES.values():
+                if path.endswith('.pdf'):
+                    flatten.get_manifest(path)
+
+    logger.info(f"Warm-up finished in {sum(timings.values()):.2f}s")
+    return timings
+
+
+def start_background_warm_up():
+    """Run warm_up() once in a daemon thread; later calls are no-ops."""
+    if _started.is_set():
+        return None
+    _started.set()
+    thread = threading.Thread(target=warm_up, name='warm-up', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Review IV placeholder fill: python-docx loop vs the compiled template.
+
+For sheets of a synthetic cohort (filled with the same placeholders
+generate_review4_pdf uses) this times
+  - python-docx: open the template, sheet4.replace_placeholders, save,
+  - compiled:    backend.docx_template render (fill and zip), after one
+                 compile of the template (timed separately),
+and checks the two produce the same text, and that the compiled one keeps
+every run's formatting. The LibreOffice conversion that follows is the same
+for both and not part of it. Needs no database. Run from the repository root:
+
+    python benchmarks/docx_placeholders.py
+    python benchmarks/docx_placeholders.py --groups 100 --runs 3 --json docx.json
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import logging
+import zipfile
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+for path in (ROOT, BENCH_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from run_benchmarks import summarize
+
+
+def make_sheets(groups, seed):
+    """[placeholders] of one Review IV sheet per synthetic group."""
+    import synthetic
+    import backend.sheet4 as sheet4
+    cohort = synthetic.make_cohort(groups, seed)
+    members = {}
+    for member in cohort['members']:
+        members.setdefault(member['group_id'], []).append(member)
+    sheets = []
+    for project in cohort['projects']:
+        project_data = {key: project[key] for key in ('group_id', 'project_title', 'guide_name', 'mentor_name',
+                                                      'mentor_email', 'mentor_mobile')}
+        project_data['members'] = members.get(project['group_id'], [])
+        form = synthetic.review_form(4, project['group_id'], seed)
+        sheets.append(sheet4.review4_placeholders(project_data, form))
+    return sheets
+
+
+def fill_python_docx(template_path, placeholders):
+    from docx import Document
+    import backend.sheet4 as sheet4
+    doc = Document(template_path)
+    sheet4.replace_placeholders(doc, placeholders)
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def document_text(content):
+    from docx import Document
+    doc = Document(io.BytesIO(content))
+    texts = [paragraph.text for paragraph in doc.paragraphs]
+    texts.extend(cell.text for table in doc.tables for row in table.rows for cell in row.cells)
+    return '\n'.join(texts)
+
+
+def run_properties(content):
+    return zipfile.ZipFile(io.BytesIO(content)).read('word/document.xml').count(b'<w:rPr>')
+
+
+def timed(fn, sheets, runs):
+    samples = []
+    for _ in range(runs):
+        for placeholders in sheets:
+            start = time.perf_counter()
+            fn(placeholders)
+            samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--groups', type=int, default=35)
+    parser.add_argument('--runs', type=int, default=1, help='passes over the groups')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', dest='json_path')
+    args = parser.parse_args()
+    logging.getLogger('backend').setLevel(logging.ERROR)
+
+    import backend.docx_template as docx_template
+    import backend.template_cache as template_cache
+    template_path = template_cache.REVIEW_TEMPLATES[4]
+    sheets = make_sheets(args.groups, args.seed)
+
+    start = time.perf_counter()
+    template = docx_template.compile_template(template_cache.get_template_bytes(template_path))
+    compile_ms = (time.perf_counter() - start) * 1000
+    places = sum(len(slots) for _, slots in template.compiled.values())
+
+    old = summarize(timed(lambda placeholders: fill_python_docx(template_path, placeholders), sheets, args.runs))
+    new = summarize(timed(template.render, sheets, args.runs), compile_ms=compile_ms)
+
+    mismatched = sum(document_text(fill_python_docx(template_path, placeholders))
+                     != document_text(template.render(placeholders)) for placeholders in sheets)
+    original_rpr = run_properties(template_cache.get_template_bytes(template_path))
+    kept_rpr = run_properties(template.render(sheets[0]))
+
+    print(f"{len(sheets)} sheets x {args.runs} runs, {len(sheets[0])} placeholders per sheet, "
+          f"{len(template.placeholders)} in the template at {places} places")
+    print(f"{'engine':<12} {'median ms':>10} {'p95 ms':>10} {'mean ms':>10}")
+    for name, result in (('python-docx', old), ('compiled', new)):
+        print(f"{name:<12} {result['median_ms']:>10.2f} {result['p95_ms']:>10.2f} {result['mean_ms']:>10.2f}")
+    print(f"Compile once per template: {compile_ms:.1f} ms; speed-up {old['median_ms'] / new['median_ms']:.0f}x")
+    print(f"Same text: {len(sheets) - mismatched}/{len(sheets)} sheets; run formatting kept: "
+          f"{kept_rpr}/{original_rpr} w:rPr")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({
+                'groups': len(sheets),
+                'runs': args.runs,
+                'placeholders': len(template.placeholders),
+                'places': places,
+                'python_docx': old,
+                'compiled': new,
+                'text_mismatches': mismatched,
+                'run_properties': [kept_rpr, original_rpr],
+            }, f, indent=2)
+    sys.exit(1 if mismatched else 0)
+
+
+if __name__ == '__main__':
+    main()
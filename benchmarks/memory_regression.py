@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Memory regression check for the review sheet generators.
+
+Simulates a review day: every PDF sheet of a synthetic cohort, rendered for
+several rounds with fresh marks each round. The first round fills the
+template, header base and project caches; after it, further rounds should
+leave the Python heap where it was. With tracemalloc on, the heap after the
+warm-up round is compared with the heap after the last round. Growth above
+--max-growth-kb per sheet fails the check (exit code 1), and the allocation
+sites that grew are listed.
+
+tracemalloc only sees Python allocations, not PyMuPDF's native ones. So the
+same day is then rendered through backend.render_pool. The server
+process's RSS growing by more than --max-rss-growth-mb fails the check too,
+and so do more render workers left running than the pool keeps idle
+(render_pool.MAX_IDLE). Retired workers are reported.
+
+Runs on a temporary SQLite database and cache directory. Review IV is
+skipped when LibreOffice isn't installed. Run from the repository root:
+
+    python benchmarks/memory_regression.py
+    python benchmarks/memory_regression.py --groups 100 --rounds 5 --max-growth-kb 2 --max-rss-growth-mb 16 --json mem.json
+"""
+
+import os
+import gc
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import tracemalloc
+import multiprocessing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+for path in (ROOT, BENCH_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+def render_round(render, jobs):
+    for review_num, form in jobs:
+        path = render(review_num, form)
+        os.remove(path)
+
+
+def make_jobs(group_ids, reviews, round_no):
+    import synthetic
+    return [(review_num, synthetic.review_form(review_num, group_id, seed=round_no))
+            for group_id in group_ids for review_num in reviews]
+
+
+def heap_growth(before, after, top):
+    stats = after.compare_to(before, 'lineno')
+    growth = sum(stat.size_diff for stat in stats)
+    grew = [stat for stat in stats if stat.size_diff > 0][:top]
+    return growth, grew
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--groups', type=int, default=35)
+    parser.add_argument('--rounds', type=int, default=3, help='rounds after the warm-up round')
+    parser.add_argument('--max-growth-kb', type=float, default=4.0,
+                        help='allowed Python heap growth per sheet after warm-up')
+    parser.add_argument('--max-rss-growth-mb', type=float, default=32.0,
+                        help='allowed server RSS growth while rendering through worker processes')
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', dest='json_path')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='review-mem-')
+    os.environ['REVIEW_CACHE_DB'] = os.path.join(workdir, 'shared_cache.sqlite3')
+    os.environ['REVIEW_OUTPUT_DIR'] = os.path.join(workdir, 'output')
+    os.environ['REVIEW_ARTIFACT_DIR'] = os.path.join(workdir, 'artifacts')
+    os.environ['REVIEW_DB_BACKEND'] = 'sqlite'
+    os.environ['REVIEW_SQLITE_PATH'] = os.path.join(workdir, 'project_review.sqlite3')
+    os.environ['WARMUP_ON_START'] = '0'
+
+    try:
+        import synthetic
+        import backend.storage as storage
+        import backend.dossier as dossier
+        import backend.metrics as metrics
+        import backend.render_pool as render_pool
+        logging.getLogger('backend').setLevel(logging.ERROR)
+
+        cohort = synthetic.make_cohort(args.groups, args.seed)
+        conn = storage.connect()
+        try:
+            synthetic.seed_database(conn, cohort)
+        finally:
+            conn.close()
+        group_ids = [project['group_id'] for project in cohort['projects']]
+        reviews = [n for n in dossier.GENERATORS if n != 4 or shutil.which('libreoffice')]
+        sheets = len(group_ids) * len(reviews) * args.rounds
+        print(f"{len(group_ids)} groups x reviews {reviews}: warm-up round + {args.rounds} rounds "
+              f"({sheets} sheets measured)")
+
+        # --- in process, tracemalloc ---
+        tracemalloc.start()
+        render_round(dossier.generate, make_jobs(group_ids, reviews, 0))
+        gc.collect()
+        before = tracemalloc.take_snapshot()
+        start = time.perf_counter()
+        for round_no in range(1, args.rounds + 1):
+            render_round(dossier.generate, make_jobs(group_ids, reviews, round_no))
+        seconds = time.perf_counter() - start
+        gc.collect()
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+        growth, grew = heap_growth(before, after, args.top)
+        per_sheet_kb = growth / sheets / 1024
+        heap_passed = per_sheet_kb <= args.max_growth_kb
+        print(f"\nIn process: {sheets / seconds:.1f} sheets/s, Python heap "
+              f"{'+' if growth >= 0 else ''}{growth / 1024:.0f} KB after warm-up "
+              f"({per_sheet_kb:.2f} KB per sheet, limit {args.max_growth_kb}) -> {'OK' if heap_passed else 'FAIL'}")
+        if not heap_passed:
+            print("Largest growth:")
+            for stat in grew:
+                print(f"  {stat}")
+
+        # --- worker processes, RSS ---
+        rss_before = render_pool.rss()
+        start = time.perf_counter()
+        for round_no in range(args.rounds + 1):
+            render_round(lambda review_num, form: render_pool.run(dossier.generate, review_num, form),
+                         make_jobs(group_ids, reviews, round_no))
+        pool_seconds = time.perf_counter() - start
+        rss_after = render_pool.rss()
+        workers_left = len(multiprocessing.active_children())
+        retired = {dict(key).get('reason'): count for key, count in metrics.RENDER_RECYCLED.samples.items()}
+        render_pool.shutdown()
+        rss_growth_mb = (rss_after - rss_before) / 2 ** 20
+        pool_passed = rss_growth_mb <= args.max_rss_growth_mb and workers_left <= render_pool.MAX_IDLE
+        print(f"Render workers: {(args.rounds + 1) * len(group_ids) * len(reviews) / pool_seconds:.1f} sheets/s, "
+              f"server RSS {rss_before / 2 ** 20:.0f} -> {rss_after / 2 ** 20:.0f} MB "
+              f"(limit +{args.max_rss_growth_mb:.0f}), {workers_left} workers left "
+              f"(limit {render_pool.MAX_IDLE}) -> {'OK' if pool_passed else 'FAIL'}")
+        print(f"Workers retired {retired or 'none'} "
+              f"(limits: {render_pool.MAX_JOBS} jobs, {render_pool.MAX_RSS / 2 ** 20:.0f} MB)")
+        passed = heap_passed and pool_passed
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({
+                'groups': len(group_ids),
+                'reviews': reviews,
+                'rounds': args.rounds,
+                'sheets': sheets,
+                'heap_growth_bytes': growth,
+                'heap_growth_per_sheet_kb': per_sheet_kb,
+                'max_growth_kb': args.max_growth_kb,
+                'passed': passed,
+                'top_growth': [str(stat) for stat in grew],
+                'server_rss_before': rss_before,
+                'server_rss_after': rss_after,
+                'max_rss_growth_mb': args.max_rss_growth_mb,
+                'workers_left': workers_left,
+                'max_idle_workers': render_pool.MAX_IDLE,
+                'workers_retired': retired,
+            }, f, indent=2)
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmarks on synthetic cohorts.
+
+For each cohort size (35, 500 and 5000 groups by default) this
+  - imports the DIV A / DIV B / SCHEDULE workbook through /api/import-excel,
+  - seeds the database with the same cohort (with full panel assignments),
+  - times GET /api/projects, /fetch/<group_id> (as typed, lower case),
+    every review generator, /api/generate-schedule and
+    /api/generate-schedule-pdf,
+and writes the timings as JSON so two versions can be compared.
+
+The run REPLACES projects, members and panel assignments in the configured
+database; pass --reset-db to confirm. With --backend sqlite it uses a
+throwaway SQLite database instead and needs no MySQL server. Caches and
+generated files go to a temporary directory. Run from the repository root:
+
+    python benchmarks/run_benchmarks.py --backend sqlite
+    python benchmarks/run_benchmarks.py --reset-db
+    python benchmarks/run_benchmarks.py --reset-db --sizes 35,500 --runs 3 --json new.json --compare old.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+for path in (ROOT, BENCH_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+DEFAULT_SIZES = (35, 500, 5000)
+GENERATORS = {
+    1: ('backend.sheet1', 'generate_fillable_pdf'),
+    2: ('backend.sheet2', 'generate_2_pdf'),
+    3: ('backend.sheet3', 'generate_3_pdf'),
+    4: ('backend.sheet4', 'generate_review4_pdf'),
+    5: ('backend.sheet5', 'generate_5_pdf'),
+}
+
+
+def summarize(samples, **extra):
+    ordered = sorted(samples)
+    result = {
+        'runs': len(samples),
+        'median_ms': statistics.median(ordered),
+        'mean_ms': statistics.fmean(ordered),
+        'min_ms': ordered[0],
+        'max_ms': ordered[-1],
+        'p95_ms': ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))],
+    }
+    result.update(extra)
+    return {key: round(value, 3) if isinstance(value, float) else value for key, value in result.items()}
+
+
+def measure(fn, runs, setup=None):
+    """Run fn `runs` times (setup before each, untimed); return timings in ms."""
+    samples = []
+    for _ in range(runs):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def check(response):
+    if response.status_code != 200:
+        raise RuntimeError(f"{response.request.path} -> {response.status_code}: {response.get_data(as_text=True)[:500]}")
+    return response
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_size(client, size, args):
+    import synthetic
+    import backend.sheet1 as sheet1
+    import backend.shared_cache as shared_cache
+    import importlib
+
+    cohort = synthetic.make_cohort(size, args.seed)
+    results = {}
+    print(f"\n== {size} groups ({len(cohort['members'])} members, {len(cohort['schedule'])} tracks) ==")
+
+    def record(name, samples, **extra):
+        results[name] = summarize(samples, **extra)
+        print(f"{name:<28} median {results[name]['median_ms']:>9.1f} ms  (min {results[name]['min_ms']:.1f}, "
+              f"max {results[name]['max_ms']:.1f}, n={len(samples)})")
+
+    # Import through the HTTP route, exactly as the data manager page uploads it
+    workbook = synthetic.build_workbook(cohort).getvalue()
+
+    def import_workbook():
+        from io import BytesIO
+        check(client.post('/api/import-excel', data={'excel': (BytesIO(workbook), 'cohort.xlsx')},
+                          content_type='multipart/form-data'))
+
+    samples = measure(import_workbook, args.runs)
+    rows = len(cohort['members'])
+    record('import_excel', samples, rows=rows, workbook_bytes=len(workbook),
+           rows_per_sec=round(rows / (statistics.median(samples) / 1000), 1))
+
+    # Seed the full cohort directly; the import only schedules IDs its parser recognizes
+    conn = sheet1.connect_db()
+    try:
+        record('seed_database', measure(lambda: synthetic.seed_database(conn, cohort), 1))
+    finally:
+        conn.close()
+    shared_cache.invalidate_project_data()
+
+    record('api_projects', measure(lambda: check(client.get('/api/projects')), args.runs))
+
+    sample = [p['group_id'] for p in cohort['projects'][:args.sample]]
+
+    # The review pages send the ID as typed; it matches whatever its case
+    record('prefetch_group', measure(lambda: check(client.get(f'/fetch/{sample[0].lower()}')), args.runs))
+    batch = check(client.get('/fetch?group_ids=' + ','.join(g.lower() for g in sample))).get_json()
+    if batch['missing']:
+        raise RuntimeError(f"/fetch missed lower-case group IDs: {batch['missing']}")
+    for review_num, (module_name, function_name) in GENERATORS.items():
+        name = f'generate_review{review_num}'
+        if review_num == 4 and not shutil.which('libreoffice'):
+            results[name] = {'skipped': 'libreoffice not found'}
+            print(f"{name:<28} skipped (libreoffice not found)")
+            continue
+        generate = getattr(importlib.import_module(module_name), function_name)
+        forms = [synthetic.review_form(review_num, gid, args.seed) for gid in sample]
+        first = measure(lambda: generate(forms[0]), 1)  # template open and project lookup are cold
+        samples = []
+        for i in range(args.runs):
+            samples += measure(lambda: generate(forms[i % len(forms)]), 1)
+        record(name, samples, first_call_ms=round(first[0], 3), groups_sampled=len(forms))
+
+    def unschedule():
+        conn = sheet1.connect_db()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("DELETE FROM panel_assignments")
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+
+    record('generate_smart_schedule',
+           measure(lambda: check(client.post('/api/generate-schedule')), args.runs, setup=unschedule))
+
+    # The schedule PDF is cached by content; drop it so every run renders
+    record('generate_schedule_pdf',
+           measure(lambda: check(client.post('/api/generate-schedule-pdf')), args.runs,
+                   setup=lambda: shared_cache.invalidate('artifact')))
+    return results
+
+
+def compare(current, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nCompared with {baseline_path} ({baseline.get('commit')}):")
+    for size, benches in current['sizes'].items():
+        for name, result in benches.items():
+            old = baseline.get('sizes', {}).get(size, {}).get(name, {})
+            if 'median_ms' not in result or 'median_ms' not in old:
+                continue
+            change = (result['median_ms'] - old['median_ms']) / old['median_ms'] * 100 if old['median_ms'] else 0.0
+            print(f"{size:>5} {name:<28} {old['median_ms']:>9.1f} -> {result['median_ms']:>9.1f} ms  ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help='comma-separated cohort sizes (groups)')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--sample', type=int, default=10, help='groups to cycle through per generator')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', dest='json_path')
+    parser.add_argument('--compare', help='earlier results JSON to diff against')
+    parser.add_argument('--backend', choices=('configured', 'sqlite'), default='configured',
+                        help='database to benchmark: the configured one, or a temporary SQLite file')
+    parser.add_argument('--reset-db', action='store_true',
+                        help='confirm that the configured database may be overwritten')
+    args = parser.parse_args()
+
+    if args.backend == 'configured' and not args.reset_db:
+        parser.error('the benchmark overwrites projects, members and panel assignments; pass --reset-db')
+
+    # Keep caches and outputs away from the real ones; must be set before backend imports
+    workdir = tempfile.mkdtemp(prefix='review-bench-')
+    os.environ['REVIEW_CACHE_DB'] = os.path.join(workdir, 'shared_cache.sqlite3')
+    os.environ['REVIEW_OUTPUT_DIR'] = os.path.join(workdir, 'output')
+    os.environ['REVIEW_ARTIFACT_DIR'] = os.path.join(workdir, 'artifacts')
+    os.environ['WARMUP_ON_START'] = '0'
+    if args.backend == 'sqlite':
+        os.environ['REVIEW_DB_BACKEND'] = 'sqlite'
+        os.environ['REVIEW_SQLITE_PATH'] = os.path.join(workdir, 'project_review.sqlite3')
+
+    import server
+    logging.getLogger('backend').setLevel(logging.ERROR)  # the import logs a line per row and track
+    client = server.app.test_client()
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+
+    import backend.storage as storage
+    results = {
+        'commit': git_commit(),
+        'backend': storage.BACKEND,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'runs': args.runs,
+        'sizes': {},
+    }
+    try:
+        for size in sizes:
+            results['sizes'][str(size)] = bench_size(client, size, args)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    json_path = args.json_path or os.path.join(
+        BENCH_DIR, 'results', f"{datetime.now():%Y%m%d-%H%M%S}-{results['commit'] or 'local'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(json_path)), exist_ok=True)
+    with open(json_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {json_path}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark: how long does `import server` take?
+
+Runs `python -X importtime -c "import server"` a few times in fresh
+interpreters and reports the median cumulative import time plus the most
+expensive modules. Run from the repository root:
+
+    python benchmarks/startup_importtime.py
+    python benchmarks/startup_importtime.py --module wsgi --runs 3 --json out.json
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_importtime(stderr):
+    """Return [(module, self_us, cumulative_us)] from -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((name.rstrip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def run_once(module):
+    env = dict(os.environ, WARMUP_ON_START='0')
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    return parse_importtime(proc.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='server')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--json', dest='json_path')
+    args = parser.parse_args()
+
+    totals = []
+    last = []
+    for _ in range(args.runs):
+        last = run_once(args.module)
+        top_level = [row for row in last if row[0] == args.module]
+        totals.append(top_level[-1][2] if top_level else sum(row[1] for row in last))
+
+    median_ms = statistics.median(totals) / 1000
+    heaviest = sorted(last, key=lambda row: -row[2])[:args.top]
+    heavy_libs = {name.strip(): cumulative / 1000 for name, _, cumulative in last
+                  if name.strip() in ('pandas', 'fitz', 'reportlab.platypus', 'docx', 'mysql.connector')}
+
+    print(f"import {args.module}: median {median_ms:.1f} ms over {args.runs} runs "
+          f"(min {min(totals) / 1000:.1f}, max {max(totals) / 1000:.1f})")
+    print(f"heavy libraries imported at startup: {sorted(heavy_libs) or 'none'}")
+    print(f"\n{'cumulative ms':>14}  {'self ms':>8}  module")
+    for name, self_us, cumulative_us in heaviest:
+        print(f"{cumulative_us / 1000:>14.1f}  {self_us / 1000:>8.1f}  {name}")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({
+                'module': args.module,
+                'runs': args.runs,
+                'median_ms': median_ms,
+                'samples_ms': [t / 1000 for t in totals],
+                'heavy_libraries_ms': heavy_libs,
+                'top_modules': [
+                    {'module': name.strip(), 'self_ms': s / 1000, 'cumulative_ms': c / 1000}
+                    for name, s, c in heaviest
+                ],
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
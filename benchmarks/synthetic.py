@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Deterministic synthetic cohorts for benchmarks.
+
+A cohort is a list of groups split evenly over divisions A and B, each with
+3-4 members, a guide, a panel track and two evaluators. The same size and
+seed always give the same names, titles, roll numbers and schedule. From a
+cohort you can build the DIV A / DIV B / SCHEDULE workbook that
+/api/import-excel reads, seed the database directly, or make filled review
+forms for the sheet generators.
+
+    python benchmarks/synthetic.py --groups 500 --workbook cohort-500.xlsx
+"""
+
+import os
+import sys
+import math
+import random
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+GROUPS_PER_TRACK = 5
+PANEL_SIZE = 3
+
+FIRST_NAMES = ['Aarav', 'Aditi', 'Ananya', 'Arjun', 'Diya', 'Ishaan', 'Kabir', 'Kavya', 'Meera', 'Neha',
+               'Omkar', 'Pranav', 'Priya', 'Rahul', 'Riya', 'Rohan', 'Sakshi', 'Sneha', 'Tanvi', 'Vikram']
+LAST_NAMES = ['Bhosale', 'Deshmukh', 'Gupta', 'Iyer', 'Jadhav', 'Joshi', 'Kulkarni', 'Kumar', 'Mehta', 'Nair',
+              'Patil', 'Pawar', 'Rao', 'Shah', 'Sharma', 'Shinde']
+DOMAINS = ['Machine Learning', 'Web Development', 'IoT', 'Blockchain', 'Cyber Security', 'Cloud Computing',
+           'Computer Vision', 'NLP']
+TITLE_WORDS = ['Smart', 'Automated', 'Intelligent', 'Secure', 'Real-time', 'Distributed', 'Crop', 'Traffic',
+               'Health', 'Attendance', 'Inventory', 'Energy', 'Monitoring', 'Prediction', 'Recommendation',
+               'System', 'Platform', 'Assistant', 'Analytics', 'Tracker']
+COMPANIES = ['', '', 'Infosys', 'TCS', 'Persistent', 'Siemens', 'Bosch', 'Zensar']
+
+
+def group_id(division, number):
+    """BIA-07 style IDs; cohorts above 99 groups per division get 3 digits."""
+    return f"BI{division}-{number:02d}"
+
+
+def make_cohort(groups, seed=42):
+    """Build a cohort of `groups` groups as a dict of projects, members and schedule rows."""
+    rng = random.Random(seed)
+    faculty = [f"Prof. {first} {last}" for first in FIRST_NAMES for last in LAST_NAMES]
+    rng.shuffle(faculty)
+    faculty = faculty[:max(PANEL_SIZE * 2, math.ceil(groups / 2))]
+
+    projects = []
+    members = []
+    roll = 0
+    per_division = {'A': 0, 'B': 0}
+    for i in range(groups):
+        division = 'AB'[i % 2]
+        per_division[division] += 1
+        gid = group_id(division, per_division[division])
+        projects.append({
+            'group_id': gid,
+            'division': division,
+            'project_domain': rng.choice(DOMAINS),
+            'project_title': ' '.join(rng.sample(TITLE_WORDS, 4)),
+            'sponsor_company': rng.choice(COMPANIES),
+            'guide_name': rng.choice(faculty),
+            'mentor_name': f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            'mentor_email': f"mentor{i + 1}@example.com",
+            'mentor_mobile': f"9{rng.randrange(10 ** 8, 10 ** 9)}",
+            'evaluator1_name': '',
+            'evaluator2_name': '',
+        })
+        for _ in range(rng.choice((3, 4, 4))):
+            roll += 1
+            members.append({
+                'group_id': gid,
+                'roll_no': f"{division}{roll:05d}",
+                'student_name': f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                'contact_details': f"8{rng.randrange(10 ** 8, 10 ** 9)}",
+            })
+
+    # Tracks of GROUPS_PER_TRACK groups, each with a panel of three faculty
+    schedule = []
+    panels = []
+    for track, start in enumerate(range(0, groups, GROUPS_PER_TRACK), start=1):
+        panel = rng.sample(faculty, PANEL_SIZE)
+        track_groups = projects[start:start + GROUPS_PER_TRACK]
+        schedule.append({
+            'track': track,
+            'panel_professors': '\n'.join(panel),
+            'location': f"Room {100 + track}",
+            'group_ids': [p['group_id'] for p in track_groups],
+        })
+        for offset, project in enumerate(track_groups):
+            guide, evaluator1, evaluator2 = (panel[(offset + k) % PANEL_SIZE] for k in range(3))
+            project['evaluator1_name'] = evaluator1
+            project['evaluator2_name'] = evaluator2
+            panels.append({
+                'group_id': project['group_id'], 'track': track, 'panel_professors': '\n'.join(panel),
+                'location': f"Room {100 + track}", 'guide': guide,
+                'reviewer1': evaluator1, 'reviewer2': evaluator2, 'reviewer3': None,
+            })
+
+    return {'seed': seed, 'projects': projects, 'members': members, 'schedule': schedule, 'panels': panels}
+
+
+def build_workbook(cohort):
+    """The cohort as an import workbook (BytesIO), in the canonical export layout."""
+    import backend.excel_mapping as excel_mapping
+
+    projects = {p['group_id']: p for p in cohort['projects']}
+    rows = [dict(projects[m['group_id']], **m) for m in cohort['members']]
+    return excel_mapping.build_export_template(rows, cohort['schedule'])
+
+
+def seed_database(conn, cohort):
+    """Replace projects, members and panel assignments with the cohort (bulk inserts)."""
+    project_columns = ['group_id', 'division', 'project_domain', 'project_title', 'sponsor_company', 'guide_name',
+                       'mentor_name', 'mentor_email', 'mentor_mobile', 'evaluator1_name', 'evaluator2_name']
+    member_columns = ['group_id', 'roll_no', 'student_name', 'contact_details']
+    panel_columns = ['group_id', 'track', 'panel_professors', 'location', 'guide', 'reviewer1', 'reviewer2',
+                     'reviewer3']
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DELETE FROM panel_assignments")
+        cursor.execute("DELETE FROM members")
+        cursor.execute("DELETE FROM projects")
+        for table, columns, rows in (
+            ('projects', project_columns, cohort['projects']),
+            ('members', member_columns, cohort['members']),
+            ('panel_assignments', panel_columns, cohort['panels']),
+        ):
+            cursor.executemany(
+                f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})",
+                [tuple(row[c] for c in columns) for row in rows]
+            )
+        conn.commit()
+    finally:
+        cursor.close()
+
+
+def review_form(review_num, gid, seed=0):
+    """A fully filled review form for one group, as the review pages post it."""
+    rng = random.Random(f"{seed}:{review_num}:{gid}")
+    form = {'group_id': gid, 'date': '2024-04-15'}
+    if review_num == 1:
+        for m in range(1, 5):
+            marks = [rng.randint(1, 5) for _ in range(5)]
+            form.update({f"1.{m}.{c}": str(v) for c, v in enumerate(marks, start=1)})
+            form[f"1.{m}.s1"] = str(sum(marks))
+        form['c1'] = 'Problem statement is clear; literature survey needs more depth.'
+    elif review_num == 2:
+        for m in range(1, 5):
+            marks = [rng.randint(1, 5) for _ in range(2, 8)]
+            form.update({f"2.{m}.{c}": str(v) for c, v in enumerate(marks, start=2)})
+            form[f"2.{m}.1"] = rng.choice('YN')
+            form[f"2.{m}.8"] = rng.choice('YN')
+            form[f"2.{m}.s1"] = str(sum(marks))
+        form.update({f"que_2.1.{q}": rng.choice('YN') for q in range(1, 17)})
+        form['c2'] = 'Design is reasonable; module interfaces should be documented.'
+    elif review_num == 3:
+        for m in range(1, 5):
+            marks = [rng.randint(1, 10) for _ in range(3, 7)]
+            form.update({f"f{c}{m}": str(v) for c, v in enumerate(marks, start=3)})
+            form[f"f8{m}"] = str(sum(marks))
+        form['c3'] = 'Implementation is on track.'
+    elif review_num == 4:
+        for m in range(1, 5):
+            marks = [rng.randint(1, 10) for _ in range(5)]
+            form.update({f"f4.{m}.{c}": str(v) for c, v in enumerate(marks, start=1)})
+            form[f"f4.{m}.s1"] = str(sum(marks))
+        form.update({f"que_4.1.{q}": rng.choice('YN') for q in range(1, 7)})
+        form['c4'] = 'Testing coverage should be improved before the final review.'
+    elif review_num == 5:
+        for m in range(1, 5):
+            reviews = [rng.randint(10, 25) for _ in range(4)]
+            form.update({f"review{r}_{m}": str(v) for r, v in enumerate(reviews, start=1)})
+            form[f"final_{m}"] = str(sum(reviews))
+        form['c5'] = 'Good overall progress.'
+    return form
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--groups', type=int, default=35)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workbook', required=True, help='path of the .xlsx to write')
+    args = parser.parse_args()
+
+    cohort = make_cohort(args.groups, args.seed)
+    with open(args.workbook, 'wb') as f:
+        f.write(build_workbook(cohort).getvalue())
+    print(f"Wrote {args.workbook}: {len(cohort['projects'])} groups, {len(cohort['members'])} members, "
+          f"{len(cohort['schedule'])} tracks")
+
+
+if __name__ == '__main__':
+    main()
@@ -7,6 +7,8 @@ USE project_review;
 DROP TABLE IF EXISTS batch_assignments;
 DROP TABLE IF EXISTS faculty_workload;
 DROP TABLE IF EXISTS review_batches;
+DROP TABLE IF EXISTS review_drafts;
+DROP TABLE IF EXISTS review_marks;
 DROP TABLE IF EXISTS members;
 DROP TABLE IF EXISTS projects;
 DROP TABLE IF EXISTS faculty;
@@ -23,8 +25,12 @@ CREATE TABLE projects (
     mentor_mobile TEXT
 );
 
--- Create the members table
+-- Create the members table. id keeps the members in sheet (import) order;
+-- on an existing database:
+--   python -m backend.storage --migrate
+-- (ALTER TABLE members ADD COLUMN id INT AUTO_INCREMENT PRIMARY KEY FIRST;)
 CREATE TABLE members (
+    id INT AUTO_INCREMENT PRIMARY KEY,
     group_id VARCHAR(50),
     roll_no VARCHAR(50),
     student_name TEXT,
@@ -33,6 +39,31 @@ CREATE TABLE members (
     UNIQUE KEY unique_roll (roll_no)
 );
 
+-- Marks per review cell, stored when a review sheet is generated.
+-- No foreign key: the data manager rewrites projects wholesale and must not
+-- cascade into recorded marks.
+CREATE TABLE review_marks (
+    group_id VARCHAR(50) NOT NULL,
+    review_no TINYINT NOT NULL,
+    member_no TINYINT NOT NULL,
+    criterion VARCHAR(20) NOT NULL,
+    marks DECIMAL(6,2) NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (group_id, review_no, member_no, criterion)
+);
+
+-- In-progress review forms, one per group and review.
+-- payload is zlib-compressed JSON of the non-empty fields.
+CREATE TABLE review_drafts (
+    draft_id CHAR(32) NOT NULL PRIMARY KEY,
+    group_id VARCHAR(50) NOT NULL,
+    review_no TINYINT NOT NULL,
+    payload MEDIUMBLOB NOT NULL,
+    version INT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    UNIQUE KEY unique_draft (group_id, review_no)
+);
+
 -- ================== SCHEDULER TABLES ==================
 
 -- Create faculty table for scheduler
@@ -0,0 +1,61 @@
+# gunicorn.conf.py
+#
+# Review-day deployment profile:  gunicorn -c gunicorn.conf.py wsgi:app
+# Every setting can be overridden through the environment.
+
+import os
+import multiprocessing
+
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', 5000)}")
+
+# PDF fills are CPU bound; one worker per core, a couple of threads each to
+# overlap the MySQL round trips. Renders are bounded for the host as a whole
+# (REVIEW_PDF_CONCURRENCY, REVIEW4_PDF_CONCURRENCY; see backend/admission.py),
+# not per worker: workers x threads requests can reach the gates at once.
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.environ.get('GUNICORN_THREADS', 2))
+# backend.render_pool splits its idle render workers between the workers
+os.environ['GUNICORN_WORKERS'] = str(workers)
+worker_class = 'gthread'
+
+# Load wsgi.py (PyMuPDF, ReportLab, pandas, templates) in the master before
+# forking so the workers share those pages copy-on-write.
+preload_app = True
+
+# Review IV goes through LibreOffice and can take a while
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then so fragmented heaps are returned to the OS
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 500))
+max_requests_jitter = 50
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'warning')
+
+# Workers write metric snapshots here so /metrics can report all of them;
+# must be set before the app (and backend.metrics) is loaded
+os.environ.setdefault('REVIEW_METRICS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                         'cache', 'metrics'))
+
+
+def when_ready(server):
+    # Drop stale entries once per start; the cache is shared by all workers
+    import backend.shared_cache as shared_cache
+    removed = shared_cache.purge_expired()
+    server.log.info(f"Shared cache ready ({removed} expired entries purged)")
+
+    import backend.metrics as metrics
+    metrics.clear_dir()
+
+
+def worker_exit(server, worker):
+    # Keep the counts of a recycled worker (max_requests) in the merged view
+    import backend.metrics as metrics
+    metrics.flush()
+
+    # Render worker processes belong to the exiting worker
+    import backend.render_pool as render_pool
+    render_pool.shutdown()
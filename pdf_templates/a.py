@@ -1,18 +1,33 @@
 #!/usr/bin/env python3
 """
 PDF Placeholder → Invisible Form Fields (removes ALL placeholder text)
+
+Single pass with PyMuPDF: placeholders are located from the character
+boxes of each text span, redacted and replaced by widgets on the same
+in-memory document, and the result is saved once.
+
+    python a.py input.pdf output.pdf
+    python a.py --batch [template_dir] [--jobs N]
+
+Batch mode regenerates every Review-*-Sheet.pdf in the directory from its
+Review-*-Sheet-Fillable.pdf source, one process per template.
 """
 
-import sys
 import re
+import sys
+import time
+import logging
+import argparse
 from pathlib import Path
-from PyPDF2 import PdfReader, PdfWriter
-from PyPDF2.generic import (
-    DictionaryObject, ArrayObject, TextStringObject,
-    NameObject, NumberObject
-)
+from concurrent.futures import ProcessPoolExecutor
 import fitz  # PyMuPDF
 
+logger = logging.getLogger(__name__)
+
+PLACEHOLDER_PATTERN = re.compile(r'\{\{([^}]+)\}\}')
+SOURCE_SUFFIX = '-Fillable'
+MULTILINE = fitz.PDF_TX_FIELD_IS_MULTILINE
+
 
 class PDFFormConverter:
     def __init__(self, src, dst):
@@ -20,7 +35,7 @@ class PDFFormConverter:
         self.dst = Path(dst)
 
     def get_field_dimensions(self, field_name, original_rect):
-        """Customize field dimensions based on field type"""
+        """Customize field dimensions based on field type (PDF coordinates, origin bottom-left)"""
         x0, y0, x1, y1 = original_rect
         original_width = x1 - x0
         original_height = y1 - y0
@@ -30,196 +45,147 @@ class PDFFormConverter:
             return [x0, y0-3, x0 + max(500, original_width * 2), y0 + max(15, original_height)]
 
         # Comment fields - keep them within reasonable bounds
-        elif 'comment' in field_name.lower() or field_name == '2.c':
+        elif self.is_multiline(field_name) and not self.is_name(field_name):
             return [x0, y0, x1 + 400, y1 + 20]
 
         # Name fields - make them 2 lines (increased height)
-        elif any(pattern in field_name for pattern in ['r1_name', 'r2_name', 'guide_name']):
-          return [x0+5, y1-160, x1 +40, y1 +10]# Increased height for 2 lines
+        elif self.is_name(field_name):
+            return [x0+5, y1-160, x1 +40, y1 +10]  # Increased height for 2 lines
 
         # Marks fields in table - keep original width, center aligned
-        elif any(pattern in field_name for pattern in ['2.1', '2.2', '2.3', '2.4']):
+        elif self.is_centered(field_name):
             return [x0, y0-3, x1, y0 + max(15, original_height)]
 
         # Default case - standard sizing
         else:
             return [x0, y0-3, x0 + max(100, original_width), y0 + max(15, original_height)]
 
+    @staticmethod
+    def is_name(field_name):
+        return any(pattern in field_name for pattern in ['r1_name', 'r2_name', 'guide_name'])
+
+    @classmethod
+    def is_multiline(cls, field_name):
+        return 'comment' in field_name.lower() or field_name == '2.c' or cls.is_name(field_name)
+
+    @staticmethod
+    def is_centered(field_name):
+        return any(pattern in field_name for pattern in ['2.1', '2.2', '2.3', '2.4'])
+
+    def find_placeholders(self, page):
+        """Return [(field_name, rect)] for every {{placeholder}} on the page.
+
+        Each match is boxed by the union of its own character boxes, so a
+        placeholder sharing a span with other text gets only its own area.
+        """
+        found = []
+        for block in page.get_text("rawdict")["blocks"]:
+            for line in block.get("lines", ()):
+                for span in line["spans"]:
+                    chars = span["chars"]
+                    text = ''.join(ch["c"] for ch in chars)
+                    for match in PLACEHOLDER_PATTERN.finditer(text):
+                        rect = fitz.Rect()
+                        for ch in chars[match.start():match.end()]:
+                            rect |= ch["bbox"]
+                        found.append((match.group(1), rect))
+        return found
+
+    def add_field(self, page, name, rect):
+        h = page.rect.height
+        # get_field_dimensions works bottom-up like the PDF spec; widgets take top-down rects
+        x0, y0, x1, y1 = self.get_field_dimensions(name, [rect.x0, h - rect.y1, rect.x1, h - rect.y0])
+
+        widget = fitz.Widget()
+        widget.field_type = fitz.PDF_WIDGET_TYPE_TEXT
+        widget.field_name = name
+        widget.rect = fitz.Rect(x0, h - y1, x1, h - y0)
+        widget.field_flags = MULTILINE if self.is_multiline(name) else 0
+        widget.text_font = 'Helv'
+        widget.text_fontsize = 12
+        widget.text_color = (0, 0, 0)
+        widget.text_format = 1 if self.is_centered(name) else 0  # /Q alignment
+        widget.border_width = 0  # Invisible border
+        widget.border_color = None
+        widget.fill_color = None  # Invisible background
+        page.add_widget(widget)
 
-
-    def find_all_placeholders(self):
-        """Dynamically find ALL placeholders in the PDF using regex"""
-        doc = fitz.open(str(self.src))
-        positions = []
-        
-        # Regex pattern to find ANY text between {{ and }}
-        placeholder_pattern = r'\{\{([^}]+)\}\}'
-        
-        for pno in range(len(doc)):
-            page = doc[pno]
-            
-            # Get all text from the page
-            text_dict = page.get_text("dict")
-            
-            for block in text_dict["blocks"]:
-                if "lines" in block:
-                    for line in block["lines"]:
-                        for span in line["spans"]:
-                            text = span["text"]
-                            
-                            # Find all placeholder matches in this text span
-                            matches = re.finditer(placeholder_pattern, text)
-                            
-                            for match in matches:
-                                placeholder_full = match.group(0)  # Full {{placeholder}}
-                                field_name = match.group(1)        # Just the name inside
-                                
-                                # Search for this specific placeholder on the page
-                                text_instances = page.search_for(placeholder_full)
-                                
-                                for rect in text_instances:
-                                    # Convert to PDF coordinates
-                                    h = page.rect.height
-                                    x1, y1 = rect.x0, h - rect.y1
-                                    x2, y2 = rect.x1, h - rect.y0
-                                    
-                                    positions.append((pno, field_name, [x1, y1, x2, y2], placeholder_full))
-                                    print(f"Found placeholder: {placeholder_full} → field: {field_name}")
-        
-        doc.close()
-        return positions
-
-    def remove_placeholder_text(self, positions):
-        """Remove ALL placeholder text by redacting it"""
-        temp_path = self.src.with_suffix('.temp.pdf')
+    def convert(self):
+        start = time.perf_counter()
         doc = fitz.open(str(self.src))
-        
-        removed_count = 0
-        for pno, name, rect, full_placeholder in positions:
-            page = doc[pno]
-            # Find and redact all instances of this placeholder
-            text_instances = page.search_for(full_placeholder)
-            
-            for text_rect in text_instances:
-                # Add redaction annotation (removes text)
-                page.add_redact_annot(text_rect, text="")
-                removed_count += 1
-                print(f"Removing: {full_placeholder}")
-        
-        # Apply all redactions
-        for pno in range(len(doc)):
-            doc[pno].apply_redactions()
-        
-        doc.save(str(temp_path))
-        doc.close()
-        
-        print(f"✅ Removed {removed_count} placeholder instances")
-        return temp_path
-
-    def insert_fields(self, temp_path, positions):
-        reader = PdfReader(str(temp_path))
-        writer = PdfWriter()
-        bypage = {}
-        for pno, name, rect, _ in positions:
-            bypage.setdefault(pno, []).append((name, rect))
-
         field_count = 0
-        for i, page in enumerate(reader.pages):
-            annots = page.get("/Annots", ArrayObject())
-            if i in bypage:
-                for name, original_rect in bypage[i]:
-                    # Get customized dimensions for this field
-                    rect = self.get_field_dimensions(name, original_rect)
-                    
-                    # In the insert_fields method, replace the widget creation with:
-                    widget = DictionaryObject({
-                        NameObject("/Type"):     NameObject("/Annot"),
-                        NameObject("/Subtype"):  NameObject("/Widget"),
-                        NameObject("/FT"):       NameObject("/Tx"),
-                        NameObject("/T"):        TextStringObject(name),
-                        NameObject("/Rect"):     ArrayObject([NumberObject(v) for v in rect]),
-                        # NameObject("/Ff"):       NumberObject(0),
-                        NameObject("/Ff"): NumberObject(4096) if ('comment' in name.lower() or name == '2.c' or 
-                                         any(pattern in name for pattern in ['r1_name', 'r2_name', 'guide_name'])) else NumberObject(0),
-                         
-                        NameObject("/DA"):       TextStringObject("0 0 0 rg /Helv 12 Tf"),
-                        # Center alignment for marks fields
-                        NameObject("/Q"):        NumberObject(1) if any(pattern in name for pattern in ['2.1', '2.2', '2.3', '2.4']) else NumberObject(0),
-                        # Invisible border
-                        NameObject("/BS"):       DictionaryObject({
-                            NameObject("/W"): NumberObject(0),
-                            NameObject("/S"): NameObject("/S")
-                        }),
-                        # Invisible background
-                        NameObject("/MK"):       DictionaryObject({
-                            NameObject("/BC"): ArrayObject([]),
-                            NameObject("/BG"): ArrayObject([])
-                        })
-                    })
-                    annots.append(writer._add_object(widget))
-                    field_count += 1
-                    print(f"Added field: {name} with dimensions: {rect}")
-            
-            if annots:
-                page[NameObject("/Annots")] = annots
-            writer.add_page(page)
-
-        # Create AcroForm so fields show up
-        widgets = []
-        for obj in writer._objects:
-            if isinstance(obj, DictionaryObject) and obj.get("/Subtype") == "/Widget":
-                widgets.append(writer._add_object(obj))
-        
-        if widgets:
-            writer._root_object[NameObject("/AcroForm")] = writer._add_object(
-                DictionaryObject({
-                    NameObject("/Fields"): ArrayObject(widgets),
-                    NameObject("/NeedAppearances"): NumberObject(1),
-                    NameObject("/DA"): TextStringObject("0 0 0 rg /Helv 12 Tf")
-                })
-            )
-
-        with open(self.dst, "wb") as f:
-            writer.write(f)
-        
-        print(f"✅ Added {field_count} transparent form fields")
-
-    def convert(self):
-        print("🔍 Scanning PDF for ALL placeholders...")
-        positions = self.find_all_placeholders()
-        
-        if not positions:
-            print("❌ No {{placeholders}} found in the PDF!")
-            return False
-        
-        print(f"\n📋 Found {len(positions)} unique placeholders:")
-        unique_fields = set(pos[1] for pos in positions)
-        for field in sorted(unique_fields):
-            print(f"   - {field}")
-        
-        print(f"\n🗑️  Removing placeholder text...")
-        temp_path = self.remove_placeholder_text(positions)
-        
-        print(f"\n📝 Inserting transparent form fields...")
-        self.insert_fields(temp_path, positions)
-        
-        # Clean up temp file
-        temp_path.unlink()
-        
-        print(f"\n✅ Conversion completed!")
-        print(f"📄 Output: {self.dst}")
+        try:
+            for page in doc:
+                placeholders = self.find_placeholders(page)
+                if not placeholders:
+                    continue
+
+                for _, rect in placeholders:
+                    page.add_redact_annot(rect, text="")
+                page.apply_redactions(images=fitz.PDF_REDACT_IMAGE_NONE)
+
+                for name, rect in placeholders:
+                    self.add_field(page, name, rect)
+                    logger.debug(f"{self.src.name} p{page.number}: {name} at {rect}")
+                field_count += len(placeholders)
+
+            if not field_count:
+                logger.error(f"❌ No {{{{placeholders}}}} found in {self.src}")
+                return False
+
+            doc.save(str(self.dst), garbage=3, deflate=True)
+        finally:
+            doc.close()
+
+        logger.info(f"✅ {self.src.name} → {self.dst.name}: {field_count} fields in {time.perf_counter() - start:.2f}s")
         return True
 
 
+def batch_pairs(template_dir):
+    """(source, output) for each Review-*-Sheet.pdf that has a -Fillable source."""
+    template_dir = Path(template_dir)
+    pairs = []
+    for src in sorted(template_dir.glob(f'Review-*-Sheet{SOURCE_SUFFIX}.pdf')):
+        pairs.append((src, src.with_name(src.name.replace(SOURCE_SUFFIX, ''))))
+    return pairs
+
+
+def _convert_pair(pair):
+    return PDFFormConverter(*pair).convert()
+
+
+def convert_all(template_dir, jobs=None):
+    """Convert every template in parallel; returns {output_name: success}."""
+    pairs = batch_pairs(template_dir)
+    if not pairs:
+        logger.error(f"No Review-*-Sheet{SOURCE_SUFFIX}.pdf sources in {template_dir}")
+        return {}
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        results = dict(zip((dst.name for _, dst in pairs), pool.map(_convert_pair, pairs)))
+    logger.info(f"Converted {sum(results.values())}/{len(pairs)} templates in {time.perf_counter() - start:.2f}s")
+    return results
+
+
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python pdf_converter.py input.pdf output.pdf")
-        sys.exit(1)
-    
-    converter = PDFFormConverter(sys.argv[1], sys.argv[2])
-    success = converter.convert()
-    
-    if success:
-        print("\n🎉 Success! All placeholders converted to invisible form fields.")
-    else:
-        print("\n❌ Conversion failed.")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Turn {{placeholders}} into invisible form fields")
+    parser.add_argument('paths', nargs='*', help="input.pdf output.pdf, or the template directory with --batch")
+    parser.add_argument('--batch', action='store_true', help="regenerate every Review-*-Sheet.pdf")
+    parser.add_argument('--jobs', type=int, default=None, help="worker processes for --batch")
+    parser.add_argument('-v', '--verbose', action='store_true', help="log every field")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format='%(message)s')
+
+    if args.batch:
+        if len(args.paths) > 1:
+            parser.error("--batch takes at most one directory")
+        results = convert_all(args.paths[0] if args.paths else Path(__file__).parent, args.jobs)
+        sys.exit(0 if results and all(results.values()) else 1)
+
+    if len(args.paths) != 2:
+        parser.error("expected input.pdf output.pdf")
+
+    success = PDFFormConverter(*args.paths).convert()
+    sys.exit(0 if success else 1)
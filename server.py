@@ -1,16 +1,30 @@
-from flask import Flask, render_template, redirect, request, jsonify, send_file
+from flask import Flask, render_template, redirect, request, jsonify, send_file, g, Response
 from flask_cors import CORS
 import os
+import time
+import select
+import socket
 import threading
+import contextvars
+import json
+import hashlib
 import functools
+import importlib
 import logging
-import pandas as pd
-import json
-from datetime import datetime
 
 # Import blueprints only
 import backend.data_manager as data_manager
 import backend.scheduler as scheduler
+import backend.drafts as drafts
+import backend.prefetch as prefetch
+import backend.warmup as warmup
+import backend.artifact_cache as artifact_cache
+import backend.metrics as metrics
+import backend.query_log as query_log
+import backend.profiling as profiling
+import backend.admission as admission
+import backend.single_flight as single_flight
+import backend.render_pool as render_pool
 
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}})
@@ -20,52 +34,95 @@ logger = logging.getLogger(__name__)
 # Register blueprints
 app.register_blueprint(data_manager.bp)
 app.register_blueprint(scheduler.bp)
+app.register_blueprint(drafts.bp)
+app.register_blueprint(prefetch.bp)
+
+# PDF generation functions, imported on first use of their route
+# (the sheet modules pull in PyMuPDF, python-docx and mysql.connector)
+PDF_GENERATORS = {
+    1: ('backend.sheet1', 'generate_fillable_pdf'),
+    2: ('backend.sheet2', 'generate_2_pdf'),
+    3: ('backend.sheet3', 'generate_3_pdf'),
+    4: ('backend.sheet4', 'generate_review4_pdf'),
+    5: ('backend.sheet5', 'generate_5_pdf'),
+}
 
-# Import database functions
-try:
-    from backend.sheet1 import fetch_project_details, connect_db
-    DATABASE_AVAILABLE = True
-except ImportError:
-    DATABASE_AVAILABLE = False
-
-# Import PDF generation functions
-try:
-    from backend.sheet1 import generate_fillable_pdf as generate_review1_pdf
-except ImportError:
-    generate_review1_pdf = None
-
-try:
-    from backend.sheet2 import generate_2_pdf as generate_review2_pdf
-except ImportError:
-    generate_review2_pdf = None
-
-try:
-    from backend.sheet3 import generate_3_pdf as generate_review3_pdf
-except ImportError:
-    generate_review3_pdf = None
-
-try:
-    from backend.sheet4 import generate_review4_pdf
-except ImportError:
-    generate_review4_pdf = None
-
-try:
-    from backend.sheet5 import generate_5_pdf as generate_review5_pdf
-except ImportError:
-    generate_review5_pdf = None
+# Identical concurrent generation requests share one render; a render
+# cancelled for its own client is run again for the others
+pdf_flights = single_flight.Group(retry=(render_pool.RenderCancelled,))
+
+def get_pdf_function(review_num):
+    """Import and return the generator for a review, or None if unavailable."""
+    module_name, function_name = PDF_GENERATORS[review_num]
+    try:
+        return getattr(importlib.import_module(module_name), function_name)
+    except (ImportError, AttributeError) as e:
+        logger.error(f"Review {review_num} generator unavailable: {e}")
+        return None
 
 class SafeThread(threading.Thread):
     def __init__(self, target, args=(), kwargs=None):
         super().__init__(target=target, args=args, kwargs=kwargs or {})
         self.result = None
         self.exception = None
+        # Run in the request's context so the request's query log and profile include the thread
+        self.context = contextvars.copy_context()
     
     def run(self):
         try:
-            self.result = self._target(*self._args, **self._kwargs)
+            self.result = self.context.run(profiling.call, self._target, *self._args, **self._kwargs)
         except Exception as e:
             self.exception = e
 
+# ================== METRICS ==================
+
+@app.before_request
+def start_request_metrics():
+    g.request_start = time.perf_counter()
+    query_log.start_request()
+
+@app.after_request
+def record_request_metrics(response):
+    if 'request_start' in g:
+        route = request.url_rule.rule if request.url_rule else '<unmatched>'
+        log = query_log.finish_request(route)
+        metrics.finish_request(route, request.method, response.status_code, time.perf_counter() - g.request_start,
+                               log)
+    return response
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# ================== PROFILING ==================
+
+@app.before_request
+def start_profile():
+    if profiling.ENABLED:
+        mode = profiling.requested(request)
+        if mode:
+            g.profile = (profiling.start(), mode)
+
+@app.after_request
+def finish_profile(response):
+    if 'profile' in g:
+        session, mode = g.pop('profile')
+        route = request.url_rule.rule if request.url_rule else '<unmatched>'
+        name, report = profiling.finish(session, route)
+        if mode == 'inline':
+            return Response(report, mimetype='text/plain')
+        response.headers['X-Profile-Report'] = name
+    return response
+
+@app.route('/api/profiles/<name>')
+def download_profile(name):
+    if not profiling.allowed(request):
+        return jsonify({"error": "Profiling is not enabled for this client"}), 403
+    path = profiling.report_path(name)
+    if not path:
+        return jsonify({"error": "Profile not found"}), 404
+    return send_file(path, mimetype='text/plain', as_attachment=True, download_name=name)
+
 # ================== MAIN ROUTES ==================
 
 @app.route('/')
@@ -86,11 +143,12 @@ def api_project_details():
     if not group_id:
         return jsonify({"error": "group_id is required"}), 400
     try:
-        if DATABASE_AVAILABLE:
-            project_details = fetch_project_details(group_id)
-            return jsonify(project_details)
-        else:
+        try:
+            from backend.sheet1 import fetch_project_details
+        except ImportError:
             return jsonify({"error": "Database not available"}), 501
+        project_details = fetch_project_details(group_id)
+        return jsonify(project_details)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -100,75 +158,290 @@ def api_review_totals():
     if not group_id:
         return jsonify({"error": "group_id is required"}), 400
     try:
-        return jsonify({"error": "Not implemented"}), 501
+        try:
+            import backend.review_marks as review_marks
+        except ImportError:
+            return jsonify({"error": "Database not available"}), 501
+        return jsonify(review_marks.get_review_totals(group_id))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/analytics')
+def api_analytics():
+    try:
+        try:
+            import backend.analytics as analytics
+        except ImportError:
+            return jsonify({"error": "Analytics not available"}), 501
+        return jsonify(analytics.get_analytics(refresh=request.args.get('refresh') == '1'))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/search')
+def api_search():
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"results": []})
+    try:
+        try:
+            import backend.search_index as search_index
+        except ImportError:
+            return jsonify({"error": "Database not available"}), 501
+        limit = request.args.get('limit', search_index.DEFAULT_LIMIT, type=int)
+        return jsonify({"results": search_index.search(query, limit)})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 # ================== PDF GENERATION ==================
 
-def handle_pdf_generation(generate_function):
+def handle_pdf_generation(review_num):
     if request.method == 'OPTIONS':
         return '', 200
 
+    generate_function = get_pdf_function(review_num)
+    if generate_function is None:
+        return jsonify({"error": f"Review {review_num} PDF generation is not available"}), 501
+
     try:
         data = request.get_json()
         if not data or not isinstance(data, dict):
             return jsonify({"error": "Invalid JSON data"}), 400
 
+        # A saved draft can stand in for the full form
+        try:
+            data = drafts.resolve_payload(review_num, data)
+        except LookupError as e:
+            return jsonify({"error": str(e)}), 404
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
         group_id = data.get('group_id')
         if not group_id:
             return jsonify({"error": "Group ID is required"}), 400
 
-        if generate_function == generate_review1_pdf:
-             if 'template_path' in data:
-               template_path = data['template_path']
-             else:
-                base_dir = os.path.dirname(os.path.abspath(__file__))
-                template_path = os.path.join(base_dir, 'pdf_templates', 'Review-I-Sheet.pdf')
-    
-        thread = SafeThread(target=generate_function, args=(data, template_path))
+        args = (data,)
+        template_path = None
+        if review_num == 1:
+            base_dir = os.path.dirname(os.path.abspath(__file__))
+            template_path = data.get('template_path') or os.path.join(base_dir, 'pdf_templates', 'Review-I-Sheet.pdf')
+            args = (data, template_path)
+
+        cache_key = get_artifact_key(review_num, data, template_path)
+        if cache_key:
+            etag = f'"{cache_key}"'
+            if etag in request.headers.get('If-None-Match', ''):
+                store_review_marks(review_num, data)
+                return '', 304, {'ETag': etag}
+            cached_path = artifact_cache.get(cache_key)
+            if cached_path:
+                store_review_marks(review_num, data)
+                return send_pdf(cached_path, review_num, group_id, cache_key, 'HIT')
+
+        flight_key = get_flight_key(review_num, data, template_path)
+        environ = request.environ
+        # Give up on the render when its client has gone, unless other requests share it
+        should_cancel = lambda: client_disconnected(environ) and not pdf_flights.waiting(flight_key)
+        try:
+            path, shared = pdf_flights.do(
+                flight_key,
+                render_pdf, review_num, generate_function, args, cache_key, admission.priority_of(request),
+                should_cancel
+            )
+        except admission.Busy as e:
+            return (jsonify({"error": f"Server busy ({e}), please retry", "retry_after": e.retry_after}), 429,
+                    {'Retry-After': str(e.retry_after)})
+        except TimeoutError as e:
+            return jsonify({"error": f"Review {review_num} PDF generation timed out ({e})", "timeout": True}), 504
+        except render_pool.RenderCancelled:
+            return jsonify({"error": "Client disconnected"}), 499
+
+        # Only marks that made it onto a sheet are recorded
+        store_review_marks(review_num, data)
+        if shared:
+            metrics.PDF_COALESCED.inc(review=review_num)
+        return send_pdf(path, review_num, group_id, cache_key, 'SHARED' if shared else 'MISS')
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        
-        thread.start()
-        thread.join()
+def render_pdf(review_num, generate_function, args, cache_key, priority, should_cancel=None):
+    """Generate one sheet and return its path; raises on failure, TimeoutError
+    past the review's deadline and RenderCancelled once should_cancel() is true."""
+    timeout = render_pool.timeout_for(review_num)
+    with admission.slot(review_num, priority):
+        try:
+            if render_pool.ENABLED:
+                # In a worker process, so the render's heap growth doesn't stay in the server
+                result = render_pool.call(generate_function, args, timeout=timeout, should_cancel=should_cancel)
+            else:
+                result = run_in_thread(generate_function, args, timeout, should_cancel)
+        except render_pool.RenderTimeout:
+            metrics.PDF_TIMEOUTS.inc(review=review_num, stage='render')
+            raise
+        except render_pool.RenderCancelled:
+            metrics.PDF_CANCELLED.inc(review=review_num)
+            raise
+        except TimeoutError:  # the LibreOffice conversion's own deadline
+            raise
+        except Exception as e:
+            raise RuntimeError(f"PDF generation failed: {str(e)}")
 
-        if thread.exception:
-            return jsonify({"error": f"PDF generation failed: {str(thread.exception)}"}), 500
+    if not result or not os.path.exists(result):
+        raise RuntimeError("PDF generation failed - no output file")
+
+    if cache_key:
+        try:
+            result = artifact_cache.put(cache_key, result)  # moved, so the output directory doesn't grow
+        except OSError as e:
+            logger.warning(f"Could not cache review {review_num} PDF: {e}")
+    return result
+
+def run_in_thread(generate_function, args, timeout, should_cancel=None):
+    """Run a generator in a SafeThread and wait for it, up to the deadline. A
+    thread can't be stopped: on timeout or cancel it finishes in the background."""
+    thread = SafeThread(target=generate_function, args=args)
+    thread.daemon = True
+    thread.start()
+    deadline = time.monotonic() + timeout
+    while True:
+        thread.join(min(render_pool.POLL_INTERVAL, max(0.0, deadline - time.monotonic())))
+        if not thread.is_alive():
+            break
+        if time.monotonic() >= deadline:
+            raise render_pool.RenderTimeout(f"render timed out after {timeout:g} s")
+        if should_cancel is not None and should_cancel():
+            raise render_pool.RenderCancelled("render cancelled")
+    if thread.exception:
+        raise thread.exception
+    return thread.result
+
+def client_disconnected(environ):
+    """Best effort: True once the client has closed its connection (development
+    server and gunicorn expose the socket; a pipelined request doesn't count)."""
+    sock = environ.get('werkzeug.socket') or environ.get('gunicorn.socket')
+    if sock is None:
+        return False
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+        return bool(readable) and sock.recv(1, socket.MSG_PEEK) == b''
+    except (OSError, ValueError):  # closed already, or a TLS socket that can't peek
+        return False
+
+def get_flight_key(review_num, data, template_path=None):
+    """Review number plus a hash of the normalized payload; equal keys mean identical sheets."""
+    payload = json.dumps([template_path, artifact_cache.normalize_form_data(data)], sort_keys=True, default=str)
+    return f"{review_num}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+def store_review_marks(review_num, data):
+    """Persist the submitted marks; a storage failure must not block the PDF."""
+    try:
+        import backend.review_marks as review_marks
+        review_marks.save_marks(review_num, data)
+    except Exception as e:
+        logger.warning(f"Could not store review {review_num} marks for {data.get('group_id')}: {e}")
 
-        if not thread.result or not os.path.exists(thread.result):
-            return jsonify({"error": "PDF generation failed - no output file"}), 500
+def get_artifact_key(review_num, data, template_path=None):
+    """Cache key for a generation request, or None if it can't be computed."""
+    module_name, _ = PDF_GENERATORS[review_num]
+    try:
+        import backend.template_cache as template_cache
+        module = importlib.import_module(module_name)
+        template_version = template_cache.get_template_version(template_path or template_cache.REVIEW_TEMPLATES[review_num])
+        project_details = module.fetch_project_details(data['group_id'])
+        return artifact_cache.cache_key(review_num, template_version, data, project_details)
+    except Exception as e:
+        logger.warning(f"Artifact cache bypassed for review {review_num}: {e}")
+        return None
+
+def send_pdf(path, review_num, group_id, cache_key=None, cache_status=None):
+    response = send_file(
+        path,
+        as_attachment=True,
+        download_name=f"Review_{review_num}_Group_{group_id}.pdf",  # the file itself may be named by its cache key
+        mimetype='application/pdf',
+        etag=cache_key or True
+    )
+    if cache_key:
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.headers['X-Cache'] = cache_status
+    return response
+
+# ================== DOSSIER ==================
+
+@app.route('/api/dossier/<group_id>', methods=['GET', 'POST'])
+def api_dossier(group_id):
+    """Review I-V of a group in one PDF, from stored forms and marks plus any posted ones."""
+    try:
+        import backend.dossier as dossier
+    except ImportError:
+        return jsonify({"error": "Dossier generation is not available"}), 501
+
+    posted = request.get_json(silent=True) if request.method == 'POST' else None
+    if posted is not None and not isinstance(posted, dict):
+        return jsonify({"error": "Invalid JSON data"}), 400
+    # Five renders at once: bulk by default, so single sheets go first
+    priority = admission.priority_of(request, default=admission.BULK)
+    environ = request.environ
+
+    def render(review_num, form):
+        generate_function = get_pdf_function(review_num)
+        if generate_function is None:
+            raise RuntimeError(f"Review {review_num} PDF generation is not available")
+        return render_pdf(review_num, generate_function, (form,), None, priority,
+                          lambda: client_disconnected(environ))
 
-        return send_file(
-            thread.result,
-            as_attachment=True,
-            download_name=os.path.basename(thread.result),
-            mimetype='application/pdf'
-        )
+    try:
+        result = dossier.build(group_id, posted, render=render, record=False)
+        errors = result['errors']
+    except dossier.GroupNotFound as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except dossier.DossierError as e:
+        result, errors = None, e.errors
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-# ================== PDF ROUTES ==================
+    # A sheet left out for lack of a render slot is retried, not shipped missing
+    busy = [error.retry_after for error in errors.values() if isinstance(error, admission.Busy)]
+    if busy:
+        if result:
+            os.remove(result['path'])
+        return (jsonify({"error": "Server busy, please retry", "retry_after": max(busy)}), 429,
+                {'Retry-After': str(max(busy))})
+    if result is None:
+        message = '; '.join(f"Review {n}: {e}" for n, e in sorted(errors.items()))
+        if all(isinstance(error, render_pool.RenderCancelled) for error in errors.values()):
+            return jsonify({"error": "Client disconnected"}), 499
+        if any(isinstance(error, TimeoutError) for error in errors.values()):
+            return jsonify({"error": message, "timeout": True}), 504
+        return jsonify({"error": message}), 500
+
+    # Only a dossier that is sent records its posted marks
+    dossier.record_marks(result['marks'])
+    response = send_file(result['path'], as_attachment=True, download_name=f"Dossier_Group_{group_id}.pdf",
+                         mimetype='application/pdf')
+    if result['missing']:
+        response.headers['X-Dossier-Missing'] = ','.join(str(n) for n in result['missing'])
+    return response
 
-pdf_functions = {
-    1: generate_review1_pdf,
-    2: generate_review2_pdf,
-    3: generate_review3_pdf,
-    4: generate_review4_pdf,
-    5: generate_review5_pdf
-}
+# ================== PDF ROUTES ==================
 
-for i in range(1, 6):
-    pdf_function = pdf_functions.get(i)
-    if pdf_function:
-        app.add_url_rule(
-            f'/generate-pdf-review{i}',
-            f'generate_review{i}',
-            functools.partial(handle_pdf_generation, pdf_function),
-            methods=['POST', 'OPTIONS']
-        )
+for i in PDF_GENERATORS:
+    app.add_url_rule(
+        f'/generate-pdf-review{i}',
+        f'generate_review{i}',
+        functools.partial(handle_pdf_generation, i),
+        methods=['POST', 'OPTIONS']
+    )
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
+    import backend.storage as storage
+    if storage.MIGRATE_ON_START:
+        storage.migrate()
+    # Import the heavy libraries in the background so the first request is fast too
+    if os.environ.get('WARMUP_ON_START', '1') == '1':
+        warmup.start_background_warm_up()
     print("🚀 PROJECT REVIEW MANAGEMENT SYSTEM STARTED")
     print(f"📊 Server running on port {port}")
     app.run(host='0.0.0.0', port=port, debug=False, threaded=True)
@@ -181,6 +181,129 @@
   };
 })();
 
+/* ---------- Server-side draft autosave ---------- */
+(function(){
+  const DEBOUNCE_MS = 1000;
+  const drafts = {};  // formId -> autosave state
+
+  function snapshot(form) {
+    return Object.fromEntries(new FormData(form).entries());
+  }
+
+  // Fields changed since the last successful save; removed/blank ones as null
+  function diff(current, saved) {
+    const patch = {};
+    Object.entries(current).forEach(([k, v]) => {
+      if (saved[k] !== v) patch[k] = v === '' ? null : v;
+    });
+    Object.keys(saved).forEach(k => {
+      if (!(k in current)) patch[k] = null;
+    });
+    return patch;
+  }
+
+  async function flush(state) {
+    clearTimeout(state.timer);
+    state.timer = null;
+    const current = snapshot(state.form);
+    const groupId = (current.group_id || '').trim();
+    if (!groupId) return null;
+    if (groupId !== state.groupId) {
+      // A different group starts its own draft
+      state.groupId = groupId;
+      state.saved = {};
+      state.draftId = null;
+    }
+    const patch = diff(current, state.saved);
+    if (!Object.keys(patch).length) return state.draftId;
+
+    // Patches that failed to send are retried together with this one
+    state.queue.push(patch);
+    const patches = state.queue.splice(0);
+    try {
+      const resp = await fetch('/api/drafts', {
+        method: 'PATCH',
+        keepalive: true,
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ group_id: groupId, review: state.review, patches })
+      });
+      if (!resp.ok) throw new Error(await resp.text());
+      const result = await resp.json();
+      state.saved = current;
+      state.draftId = result.draft_id;
+      return state.draftId;
+    } catch (e) {
+      state.queue.unshift(...patches);
+      console.error('Draft autosave failed', e);
+      return null;
+    }
+  }
+
+  function schedule(state) {
+    clearTimeout(state.timer);
+    state.timer = setTimeout(() => flush(state), DEBOUNCE_MS);
+  }
+
+  // Fill blank fields from the group's stored draft (e.g. started on another device)
+  async function restore(state, groupId) {
+    try {
+      const resp = await fetch(`/api/drafts?group_id=${encodeURIComponent(groupId)}&review=${state.review}`);
+      if (!resp.ok) return;
+      const { draft } = await resp.json();
+      const fields = draft.fields || {};
+      Object.entries(fields).forEach(([k, v]) => {
+        const els = Array.from(state.form.querySelectorAll(`[name="${CSS.escape(k)}"]`));
+        if (!els.length) return;
+        if (els[0].type === 'radio' || els[0].type === 'checkbox') {
+          // Every option shares the name: pick the one with the draft's value
+          const match = els.find(el => el.value === String(v));
+          if (match && !els.some(el => el.checked)) match.checked = true;
+        } else if (!els[0].value) {
+          els[0].value = v;
+        }
+      });
+      state.groupId = groupId;
+      state.draftId = draft.draft_id;
+      // Only what the form now holds counts as saved; the rest of the draft is
+      // left alone instead of being sent back as removed
+      const current = snapshot(state.form);
+      state.saved = Object.fromEntries(Object.keys(fields)
+        .filter(k => k in current && current[k] === String(fields[k]))
+        .map(k => [k, current[k]]));
+      if (typeof window.calculateTotals === 'function') window.calculateTotals();
+      if (typeof window.calculateFinalTotals === 'function') window.calculateFinalTotals();
+      schedule(state);
+    } catch (e) {
+      console.error('Draft restore failed', e);
+    }
+  }
+
+  /**
+   * Autosave a review form as a server-side draft.
+   * Usage: initDraftAutosave(2, 'form-data')
+   */
+  window.initDraftAutosave = function(review, formId = 'form-data') {
+    const form = document.getElementById(formId);
+    if (!form) return;
+    const state = drafts[formId] = { review, form, groupId: null, draftId: null, saved: {}, queue: [], timer: null };
+    form.addEventListener('input', () => schedule(state));
+    form.addEventListener('change', () => schedule(state));
+    window.addEventListener('pagehide', () => { if (state.timer) flush(state); });
+
+    const groupIdEl = form.querySelector('[name="group_id"]');
+    if (groupIdEl) {
+      groupIdEl.addEventListener('change', () => restore(state, groupIdEl.value.trim()));
+      if (groupIdEl.value.trim()) restore(state, groupIdEl.value.trim());
+    }
+  };
+
+  /** Save pending changes now; resolves to the draft id or null. */
+  window.flushDraft = function(formId = 'form-data') {
+    const state = drafts[formId];
+    return state ? flush(state) : Promise.resolve(null);
+  };
+})();
+
 /* ---------- Generic PDF submit helper ---------- */
 (function(){
   /**
@@ -189,11 +312,15 @@
    *   endpoint: string (POST url),
    *   formId: string (id of form to read data from),
    *   submitBtnSelector: string (selector to disable / change text) optional,
-   *   downloadFilename: string (filename to save) optional
+   *   downloadFilename: string (filename to save) optional,
+   *   maxRetries: number (retries when the server answers 429 busy) optional
    * }
    */
+  const MAX_RETRY_WAIT = 30;
+  const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
   window.submitPDFGeneric = async function(options = {}) {
-    const { endpoint, formId='form-data', submitBtnSelector='#generate-pdf', downloadFilename } = options;
+    const { endpoint, formId='form-data', submitBtnSelector='#generate-pdf', downloadFilename, maxRetries=3 } = options;
     try {
       const submitBtn = document.querySelector(submitBtnSelector);
       if (submitBtn) {
@@ -201,14 +328,30 @@
         submitBtn.textContent = 'Generating PDF...';
       }
 
-      const form = document.getElementById(formId);
-      const formData = form ? new FormData(form) : new FormData();
-      const payload = Object.fromEntries(formData.entries());
-      const resp = await fetch(endpoint, {
-        method: 'POST',
-        body: JSON.stringify(payload),
-        headers: { 'Content-Type': 'application/json' }
-      });
+      // With an up-to-date draft the server renders from it instead of the full form
+      const draftId = await window.flushDraft(formId);
+      let payload;
+      if (draftId) {
+        payload = { draft_id: draftId };
+      } else {
+        const form = document.getElementById(formId);
+        const formData = form ? new FormData(form) : new FormData();
+        payload = Object.fromEntries(formData.entries());
+      }
+      let resp;
+      for (let attempt = 0; ; attempt++) {
+        resp = await fetch(endpoint, {
+          method: 'POST',
+          body: JSON.stringify(payload),
+          headers: { 'Content-Type': 'application/json' }
+        });
+        if (resp.status !== 429 || attempt >= maxRetries) break;
+        // Server is at capacity; wait as long as it asks (with a little jitter) and try again
+        const wait = Math.min(parseInt(resp.headers.get('Retry-After'), 10) || 2, MAX_RETRY_WAIT);
+        if (submitBtn) submitBtn.textContent = `Server busy, retrying in ${wait}s...`;
+        await sleep(wait * 1000 + Math.random() * 500);
+        if (submitBtn) submitBtn.textContent = 'Generating PDF...';
+      }
       if (!resp.ok) throw new Error(await resp.text());
       const blob = await resp.blob();
       const url = window.URL.createObjectURL(blob);
@@ -233,6 +376,48 @@
   };
 })();
 
+/* ---------- Group ID typeahead ---------- */
+(function(){
+  /**
+   * initGroupTypeahead(inputId)
+   * Suggests groups from /api/search as the user types a group ID, roll
+   * number, student name or project title; picking one fills in the group ID.
+   */
+  window.initGroupTypeahead = function(inputId = 'group_id') {
+    const input = document.getElementById(inputId);
+    if (!input || input.readOnly || input.list) return;
+    const list = document.createElement('datalist');
+    list.id = `${inputId}-suggestions`;
+    input.after(list);
+    input.setAttribute('list', list.id);
+    input.setAttribute('autocomplete', 'off');
+
+    let timer = null;
+    let lastQuery = '';
+    input.addEventListener('input', () => {
+      clearTimeout(timer);
+      timer = setTimeout(async () => {
+        const q = input.value.trim();
+        if (!q || q === lastQuery) return;
+        lastQuery = q;
+        try {
+          const resp = await fetch(`/api/search?q=${encodeURIComponent(q)}&limit=8`);
+          if (!resp.ok || q !== input.value.trim()) return;
+          const { results = [] } = await resp.json();
+          list.replaceChildren(...results.map(r => {
+            const option = document.createElement('option');
+            option.value = r.group_id;
+            option.label = (r.kind === 'group' || r.kind === 'title') ? r.label : `${r.value} (${r.label || r.kind})`;
+            return option;
+          }));
+        } catch (e) {
+          console.warn('Group search failed:', e);
+        }
+      }, 120);
+    });
+  };
+})();
+
 /* ---------- Small helpers ---------- */
 (function(){
   window.validateRequiredFields = function(ids = []) {
@@ -257,4 +442,5 @@ document.addEventListener('DOMContentLoaded', function() {
   // init scroll and menu/highlight by default
   try { window.commonInitScroll(); } catch(e) {}
   try { window.commonInitMenu(); } catch(e) {}
+  try { window.initGroupTypeahead(); } catch(e) {}
 });
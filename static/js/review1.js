@@ -19,6 +19,9 @@ document.addEventListener('DOMContentLoaded', function() {
 
   // Initial totals
   calculateTotals();
+
+  // Keep a server-side draft of the form
+  window.initDraftAutosave(1, 'form-data');
 });
 
 // Review1: calculate totals and write to .total[name="1.{i}.s1"]
@@ -23,6 +23,9 @@ document.addEventListener('DOMContentLoaded', function() {
   });
 
   calculateTotals();
+
+  // Keep a server-side draft of the form
+  window.initDraftAutosave(2, 'form-data');
 });
 
 function validateInput(input) {
@@ -8,6 +8,9 @@ document.addEventListener('DOMContentLoaded', function() {
 
   setupEventListeners();
   calculateTotals();
+
+  // Keep a server-side draft of the form
+  window.initDraftAutosave(3, 'form-data');
 });
 
 function setupEventListeners() {
@@ -6,6 +6,9 @@ document.addEventListener('DOMContentLoaded', function() {
   window.loadFormToId('review4_data', 'form-data');
   setupEventListeners();
   calculateTotals();
+
+  // Keep a server-side draft of the form
+  window.initDraftAutosave(4, 'form-data');
 });
 
 function setupEventListeners() {
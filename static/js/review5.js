@@ -5,8 +5,34 @@
 document.addEventListener('DOMContentLoaded', function() {
   loadReviewData();
   calculateFinalTotals();
+  loadStoredTotals();
+
+  // Keep a server-side draft of the form
+  window.initDraftAutosave(5, 'form-data');
 });
 
+// Fill in totals that are not in this browser's session (e.g. a review
+// entered on another device) from the marks stored at PDF generation.
+async function loadStoredTotals() {
+  const groupId = (document.getElementById('group_id') || {value:''}).value;
+  if (!groupId) return;
+  try {
+    const resp = await fetch(`/api/review-totals?group_id=${encodeURIComponent(groupId)}`);
+    if (!resp.ok) return;
+    const totals = await resp.json();
+    for (let i=1;i<=4;i++){
+      for (let j=1;j<=4;j++){
+        const el = document.getElementById(`review${i}-student${j}`);
+        const stored = (totals.fields || {})[`review${i}_${j}`];
+        if (el && !parseFloat(el.value) && stored) el.value = stored;
+      }
+    }
+    calculateFinalTotals();
+  } catch (e) {
+    console.error('loadStoredTotals error', e);
+  }
+}
+
 function loadReviewData() {
   const review1Data = window.loadSessionObject('review1_data');
   const review2Data = window.loadSessionObject('review2_data');
@@ -0,0 +1,40 @@
+# wsgi.py
+#
+# Production entry point. Heavy libraries and the review templates are loaded
+# here, at import time, so a pre-forking server (gunicorn with preload_app)
+# loads them once in the master and every worker shares those pages
+# copy-on-write.
+#
+#   gunicorn -c gunicorn.conf.py wsgi:app
+#   python wsgi.py            # waitress, for single-box Windows deployments
+
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def preload():
+    """Import PyMuPDF, ReportLab, pandas and python-docx and read all templates."""
+    import backend.warmup as warmup
+
+    timings = warmup.warm_up()
+    logger.info(f"Preloaded {len(timings)} modules and the review templates")
+
+
+preload()
+
+import backend.storage as storage  # noqa: E402
+
+if storage.MIGRATE_ON_START:
+    storage.migrate()
+
+from server import app  # noqa: E402
+
+if __name__ == '__main__':
+    from waitress import serve
+
+    port = int(os.environ.get('PORT', 5000))
+    threads = int(os.environ.get('WAITRESS_THREADS', (os.cpu_count() or 1) * 2))
+    print(f"📊 Serving on port {port} with waitress ({threads} threads)")
+    serve(app, host='0.0.0.0', port=port, threads=threads)